@@ -11,12 +11,17 @@ Rebuild graph assets, then ingest external search and vector artifacts.
 Pipeline
   1) Full graph builder
   2) Lite graph builder
-  3) Explorer assets, lite_index, adjacency, degree, graph_search_index
+  3) Explorer assets, lite_index, adjacency, adjacency.typed, degree, graph_search_index
+  3a) Graph landmarks, BFS distance oracle for path queries between nodes
+  3b) Graph clusters, community ids, cluster summary graph and per-cluster subgraph files
+  3c) Graph LOD levels, coarsened supernode graphs for zoomed out views (uses 3b clusters)
   4) Source list JSON v1, archive to source_nodes.list.json
   5) Source list DICT v2, archive to source_nodes.dict.json, and leave as default source_nodes.json
   6) sources.md page
   7) Ingest external files(Post local python processing via : csc_motw_corpus_build.ipynb (RH)) from data_externally_processed 
   into docs/data and docs/data/csc_artifacts,  overwrite existing files, report exactly what changed.
+  8) Optional (--local-chunks), incremental re-chunk of data_published into csc_artifacts/motw_chunks.parquet,
+  driven by csc_artifacts/state.json, only PDFs whose sha256 changed are re-chunked. Embedding stays in the notebook.
 
 External inbox layout, if they exist, we take these from inbox and move them to where they need to be in /docs 
 This is the enabler to ensure they're available for use within the search/graph/network etc
@@ -42,11 +47,15 @@ ARTI_DIR  = DOCS_DATA / "csc_artifacts"
 S_FULL   = ROOT / "admin_scripts" / "admin-build_cytoscape_json.py"
 S_LITE   = ROOT / "admin_scripts" / "admin-build_cytoscape_json_lite.py"
 S_EXPL   = ROOT / "admin_scripts" / "admin-build_explorer_assets.py"
+S_LMARK  = ROOT / "admin_scripts" / "admin-build_graph_landmarks.py"
+S_CLUST  = ROOT / "admin_scripts" / "admin-build_graph_clusters.py"
+S_LOD    = ROOT / "admin_scripts" / "admin-build_graph_lod.py"
 S_SRC_V1 = ROOT / "admin_scripts" / "admin-extract_JSON_form_sources_relations_v1.py"
 S_SRC_V2 = ROOT / "admin_scripts" / "admin-extract_DICT_form_sources_relations_v2.py"
 S_PAGE   = ROOT / "admin_scripts" / "admin-re-build-sources-page.py"
 if not S_PAGE.exists():
     S_PAGE = ROOT / "admin_scripts" / "admin-re_build-sources-page.py"
+S_CHUNKS = ROOT / "admin_scripts" / "search_index" / "chunk_build.py"
 ##
 
 # Our back-end data source files, underpinning front-end graphs/search etc. 
@@ -57,8 +66,13 @@ REPORT_FILES = [
     "node_details.json",
     "lite_index.json",
     "adjacency.json",
+    "adjacency.typed.json",
     "degree.json",
     "graph_search_index.json",
+    "graph_landmarks.json",
+    "clusters/summary.json",
+    "clusters/assignments.json",
+    "graph_lod_1.json",
     "search_index.json",
     "source_nodes.json",
     "source_nodes.list.json",
@@ -173,9 +187,13 @@ def main():
     ap.add_argument("--no-full", action="store_true", help="Skip full graph builder")
     ap.add_argument("--no-lite", action="store_true", help="Skip lite graph builder")
     ap.add_argument("--no-explorer", action="store_true", help="Skip explorer assets")
+    ap.add_argument("--no-landmarks", action="store_true", help="Skip graph landmark distance oracle")
+    ap.add_argument("--no-clusters", action="store_true", help="Skip graph community clustering")
+    ap.add_argument("--no-lod", action="store_true", help="Skip level of detail graphs")
     ap.add_argument("--no-sources", action="store_true", help="Skip source list JSON and DICT steps")
     ap.add_argument("--no-sources-page", action="store_true", help="Skip rebuilding sources.md")
     ap.add_argument("--no-ingest-external", action="store_true", help="Skip ingesting data_externally_processed")
+    ap.add_argument("--local-chunks", action="store_true", help="Re-chunk changed data_published PDFs into motw_chunks.parquet after ingest")
     ap.add_argument("--verify-hash", action="store_true", help="Hash before and after when ingesting, slower, precise diff")
     ap.add_argument("--type-class-style", choices=["passthrough", "short", "model"],
                     default=os.getenv("TYPE_CLASS_STYLE", "short"),
@@ -195,6 +213,15 @@ def main():
         env["TYPE_CLASS_STYLE"] = args.type_class_style
         run_py(S_EXPL, env=env, name="explorer assets")
 
+    if not args.no_landmarks:
+        run_py(S_LMARK, name="graph landmarks")
+
+    if not args.no_clusters:
+        run_py(S_CLUST, name="graph clusters")
+
+    if not args.no_lod:
+        run_py(S_LOD, name="graph LOD levels")
+
     if not args.no_sources:
         run_py(S_SRC_V1, name="source list, JSON v1")
         src_json = DOCS_DATA / "source_nodes.json"
@@ -214,6 +241,12 @@ def main():
         for m in ingest_external_files(verify_hash=args.verify_hash):
             print(" ", m)
 
+    if args.local_chunks:
+        if any((ROOT / "data_published").rglob("*.pdf")):
+            run_py(S_CHUNKS, name="incremental chunking")
+        else:
+            print(f"[skip] incremental chunking, no PDFs under {ROOT / 'data_published'}")
+
     print("\nSummary of key outputs:")
     for rel in REPORT_FILES:
         p = DOCS_DATA / rel
@@ -5,6 +5,8 @@
 # Data shape: verbose nodes and edges, plus a crosswalk, anything site or tools might need. prefers id then file stem, and it resolves relationship endpoints through the crosswalk.
 # Typical outputs: docs/data/graph_data.json [full], docs/data/crosswalk.json [lookup], other side files wired in main builder.
 # Use: local dev, QA checks, search indexing, data audits, exporting for notebooks, anything where needed all fields and maximum fidelity.
+# Edges: parallel relationship YAMLs for the same pair are merged into one edge with weight, relationship_types and source_files,
+# EDGE_MERGE=directed (default), undirected (also folds reciprocal pairs) or off, same switch as the lite builder.
     
 # example output
 # Graph JSON written: /workspaces/csc-map-of-the-world/docs/data/graph_data.json (minified, 149646 bytes)
@@ -26,6 +28,7 @@ from admin_scripts.admin_build_cytoscape_utils import (
     singularize,
     coalesce,
     search_blob,
+    consolidate_edges,
 )
 
 
@@ -41,6 +44,8 @@ CROSSWALK_PATH = OUT_DIR / "crosswalk.json"
 # slug -> { id, label, type, slug, source_path, page_url }
 CROSSWALK = {}
 
+EDGE_MERGE = os.getenv("EDGE_MERGE", "directed")  # directed, undirected, off
+
 # ---------------- helpers ----------------
 
 def _json_default(o):
@@ -231,9 +236,9 @@ def get_entities():
 
 
 
-def get_relationships(seen_nodes):
-    edges = []
-    for file in REL_DIR.glob("*.yaml"):
+def get_relationships(seen_nodes, merge: str = EDGE_MERGE):
+    raw = []
+    for file in sorted(REL_DIR.glob("*.yaml")):
         if file.name.startswith("0_template"):
             continue
         with open(file, encoding="utf-8") as f:
@@ -289,13 +294,28 @@ def get_relationships(seen_nodes):
             continue
 
         relationship_type = data.get("relationship_type", "relatesTo")
+        raw.append((source, target, relationship_type, file.name))
+
+    if merge == "off":
+        merged = [{"source": s, "target": t, "relationship_type": r, "weight": 1,
+                   "type_counts": {r: 1}, "source_files": [f]} for s, t, r, f in raw]
+    else:
+        merged = consolidate_edges(raw, directed=(merge != "undirected"))
+        if len(merged) < len(raw):
+            print(f"Merged {len(raw)} relationship files into {len(merged)} edges (EDGE_MERGE={merge})")
+
+    edges = []
+    for e in merged:
         edges.append({
             "group": "edges",
             "data": {
-                "source": source,
-                "target": target,
-                "label": relationship_type,
-                "relationship_type": relationship_type,
+                "source": e["source"],
+                "target": e["target"],
+                "label": e["relationship_type"],
+                "relationship_type": e["relationship_type"],
+                "relationship_types": list(e["type_counts"]),
+                "weight": e["weight"],
+                "source_files": e["source_files"],
                 "group": "edges"
             }
         })
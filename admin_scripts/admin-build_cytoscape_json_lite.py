@@ -3,6 +3,8 @@
 # The lite builder
 # Purpose: produce small payload for fast page loads on GitHub Pages, mobile, and low bandwidth users.
 # Data shape: tiny node objects with short keys [id, l, t, s, sb], edges as [src, tgt, rel], and one separate rich file for side panels. prefers id then file stem, and resolves relationship endpoints via a crosswalk, same as full builder.
+# Parallel edges (duplicate or reciprocal relationship YAMLs for the same pair) are merged, a merged edge is [src, tgt, rel, weight, {rel: count}]
+# with rel the most common type. EDGE_MERGE=directed (default, same direction only), undirected (also folds a->b with b->a), or off.
 
 # Outputs:
 # docs/data/graph_data.lite.json [just what Cytoscape needs to render]
@@ -11,7 +13,7 @@
 
 import os, json, yaml
 from pathlib import Path
-from admin_build_cytoscape_utils import extract_type_fields
+from admin_build_cytoscape_utils import extract_type_fields, consolidate_edges
 
 
 ROOT     = Path(__file__).resolve().parents[1]
@@ -24,6 +26,8 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 LITE_PATH    = OUT_DIR / "graph_data.lite.json"
 DETAILS_PATH = OUT_DIR / "node_details.json"
 
+EDGE_MERGE = os.getenv("EDGE_MERGE", "directed")  # directed, undirected, off
+
 
 from datetime import date, datetime
 from decimal import Decimal
@@ -183,11 +187,11 @@ def _resolve_id(x, seen_nodes, crosswalk):
         return hit
     return x
 
-def collect_edges(seen_nodes, crosswalk):
-    edges = []
+def collect_edges(seen_nodes, crosswalk, merge: str = EDGE_MERGE):
+    raw = []
     skipped = 0
     MAX_LOG = 20  # show up to 20 examples
-    for file in REL_DIR.glob("*.yaml"):
+    for file in sorted(REL_DIR.glob("*.yaml")):
         if file.name.startswith("0_template"):
             continue
         try:
@@ -211,9 +215,21 @@ def collect_edges(seen_nodes, crosswalk):
             skipped += 1
             continue
         rel = data.get("relationship_type", "relatesTo")
-        edges.append([src, tgt, rel])
+        raw.append((src, tgt, rel, file.name))
     if skipped:
         print(f"(Skipped {skipped} edges that referenced unknown nodes)")
+
+    if merge == "off":
+        return [[src, tgt, rel] for src, tgt, rel, _ in raw]
+
+    edges = []
+    for e in consolidate_edges(raw, directed=(merge != "undirected")):
+        if e["weight"] == 1:
+            edges.append([e["source"], e["target"], e["relationship_type"]])
+        else:
+            edges.append([e["source"], e["target"], e["relationship_type"], e["weight"], e["type_counts"]])
+    if len(edges) < len(raw):
+        print(f"(Merged {len(raw)} relationship files into {len(edges)} edges, EDGE_MERGE={merge})")
     return edges
 
 
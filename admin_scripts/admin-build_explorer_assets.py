@@ -4,6 +4,8 @@
 # Builds an undirected adjacency list adjacency.json, keyed by node id, for instant neighbour lookups without touching Cytoscape, for simple algorithms degree counts and BFS in plain JS
 # Builds key addressable lite map lite_index.json, object keyed by id - faster than scanning array when populating side panels or cross reference positions
 # Builds minimal search array graph_search_index.json, tiny records {id, l, t, s} to enable filters with plain JS, no heavyweight search lib
+# Builds typed, direction aware adjacency.typed.json, out and in neighbours kept apart, each entry [neighbourId, typeCode] against a shared
+# relationship_type dictionary, so edge type filtering and expansion need no second pass over the edge list
 # full and lite builders produce graph_data.json, crosswalk.json, graph_data.lite.json, and node_details.json
 
 # writes:
@@ -11,6 +13,7 @@
 # docs/data/graph_search_index.json , minimal search list
 # docs/data/adjacency.json , undirected, de duplicated, sorted
 # docs/data/degree.json , { id: degree } sorted by id
+# docs/data/adjacency.typed.json , {types: [relationship_type, ...], out: {id: [[nbr, code], ...]}, in: {...}}, nodes without entries omitted
 
 from pathlib import Path
 import json, os
@@ -23,6 +26,7 @@ OUT_SEARCH = DATA / "graph_search_index.json"   # [{id,l,t,s}, ...]
 OUT_ADJ    = DATA / "adjacency.json"      # {id: [neighborId, ...], ...}
 OUT_LITE   = DATA / "lite_index.json"     # {id: {id,l,t,s,x,y,sb?}}
 OUT_DEGREE = DATA / "degree.json"         # {id: degree}
+OUT_TYPED  = DATA / "adjacency.typed.json"  # {types: [...], out: {id: [[nbr, code], ...]}, in: {...}}
 
 TYPE_CLASS_STYLE = os.getenv("TYPE_CLASS_STYLE", "passthrough")  # passthrough, short, model
 
@@ -78,16 +82,41 @@ def main():
     adj = {k: sorted(v) for k, v in sorted(adj_sets.items(), key=lambda kv: kv[0])}
     degree = {k: len(v) for k, v in adj.items()}
 
+    # typed, directed adjacency, relationship types coded by sorted position so codes only move when types are added
+    typed_edges = set()
+    for e in edges:
+        if not isinstance(e, list) or len(e) < 2:
+            continue
+        s, t = e[0], e[1]
+        if s in adj_sets and t in adj_sets:
+            # merged edges, [src, tgt, rel, weight, {rel: count}], contribute every type they carry
+            rels = e[4] if len(e) > 4 and isinstance(e[4], dict) else [e[2] if len(e) > 2 and e[2] else "relatesTo"]
+            for rel in rels:
+                typed_edges.add((s, t, rel))
+    types = sorted({rel for _, _, rel in typed_edges})
+    code = {rel: i for i, rel in enumerate(types)}
+    out_sets, in_sets = {}, {}
+    for s, t, rel in typed_edges:
+        out_sets.setdefault(s, set()).add((t, code[rel]))
+        in_sets.setdefault(t, set()).add((s, code[rel]))
+    typed = {
+        "types": types,
+        "out": {k: [list(p) for p in sorted(v)] for k, v in sorted(out_sets.items())},
+        "in":  {k: [list(p) for p in sorted(v)] for k, v in sorted(in_sets.items())},
+    }
+
     DATA.mkdir(parents=True, exist_ok=True)
     OUT_LITE.write_text(json.dumps(lite_index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
     OUT_SEARCH.write_text(json.dumps(search_index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
     OUT_ADJ.write_text(json.dumps(adj, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
     OUT_DEGREE.write_text(json.dumps(degree, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    OUT_TYPED.write_text(json.dumps(typed, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
 
     print(f"Wrote {OUT_LITE} ({OUT_LITE.stat().st_size} bytes)")
     print(f"Wrote {OUT_SEARCH} ({OUT_SEARCH.stat().st_size} bytes)")
     print(f"Wrote {OUT_ADJ} ({OUT_ADJ.stat().st_size} bytes)")
     print(f"Wrote {OUT_DEGREE} ({OUT_DEGREE.stat().st_size} bytes)")
+    print(f"Wrote {OUT_TYPED} ({OUT_TYPED.stat().st_size} bytes, {len(types)} relationship types)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,168 @@
+# python admin_scripts/admin-build_graph_clusters.py
+# python admin_scripts/admin-build_graph_clusters.py --min-size 3 --fresh
+
+# Community detection over the lite edge list, so the network pages can render a small overview first
+# and pull in clusters on demand instead of handing Cytoscape the whole graph at once.
+# Weighted label propagation (see admin_graph_utils.label_propagation), seeded from the previous
+# assignments.json when present, so ids stay put between rebuilds when the graph barely changes.
+# Communities smaller than --min-size (isolated nodes etc) are pooled into cluster 0.
+
+# writes:
+# docs/data/clusters/assignments.json , {id: cluster_id} sorted by id
+# docs/data/clusters/summary.json , {nodes: [{id, l, n, hub, t}], edges: [[c1, c2, weight], ...]}
+# docs/data/clusters/cluster_<cid>.json , {id, nodes: [lite nodes], edges: [[src, tgt, rel], ...], cut: [[src, tgt, rel, other_cid], ...]}
+
+import argparse, json, os
+from pathlib import Path
+from collections import Counter, defaultdict
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from admin_graph_utils import DATA, load_lite_graph, index_nodes, weighted_csr, label_propagation, edge_weight
+
+OUT_DIR         = DATA / "clusters"
+OUT_ASSIGNMENTS = OUT_DIR / "assignments.json"
+OUT_SUMMARY     = OUT_DIR / "summary.json"
+
+MIN_CLUSTER_SIZE = int(os.getenv("GRAPH_CLUSTER_MIN_SIZE", "2"))
+POOL_CLUSTER     = 0  # catch-all for nodes left in tiny communities
+
+def load_previous(path: Path = OUT_ASSIGNMENTS) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return {k: int(v) for k, v in json.loads(path.read_text(encoding="utf-8")).items()}
+    except (ValueError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable {path}: {e}")
+        return {}
+
+def seed_labels(ids: list, previous: dict) -> np.ndarray:
+    """Known nodes start in their old cluster, pooled and new nodes start on their own label"""
+    next_free = max(list(previous.values()) + [POOL_CLUSTER]) + 1
+    seeds = np.empty(len(ids), dtype=np.int64)
+    for i, nid in enumerate(ids):
+        cid = previous.get(nid, POOL_CLUSTER)
+        if cid == POOL_CLUSTER:
+            seeds[i] = next_free
+            next_free += 1
+        else:
+            seeds[i] = cid
+    return seeds
+
+def stable_cluster_ids(ids: list, labels: np.ndarray, comp: np.ndarray, previous: dict, min_size: int) -> np.ndarray:
+    """
+    Turn raw LPA labels into published cluster ids.
+    Groups are split by connected component (a seeded label can straddle a split),
+    the largest group carrying an old id keeps it, everything else gets fresh ids
+    in size then first-id order, and groups under min_size go to the pool cluster.
+    """
+    groups = defaultdict(list)
+    for i, key in enumerate(zip(labels.tolist(), comp.tolist())):
+        groups[key].append(i)
+
+    old_ids = set(previous.values()) - {POOL_CLUSTER}
+    # biggest group first so it claims the old id, first id breaks ties
+    ordered = sorted(groups.items(), key=lambda kv: (-len(kv[1]), ids[kv[1][0]]))
+    out = np.full(len(ids), POOL_CLUSTER, dtype=np.int64)
+    claimed, fresh = set(), []
+    for (lab, _), members in ordered:
+        if len(members) < min_size:
+            continue
+        if lab in old_ids and lab not in claimed:
+            claimed.add(lab)
+            out[members] = lab
+        else:
+            fresh.append(members)
+
+    next_free = max(list(old_ids) + [POOL_CLUSTER]) + 1
+    for members in fresh:
+        out[members] = next_free
+        next_free += 1
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Cluster the lite graph and write per-cluster subgraph files")
+    ap.add_argument("--min-size", type=int, default=MIN_CLUSTER_SIZE, help="Smaller communities go to cluster 0, default 2")
+    ap.add_argument("--max-iter", type=int, default=50, help="Label propagation sweeps, default 50")
+    ap.add_argument("--fresh", action="store_true", help="Ignore previous assignments.json, renumber from scratch")
+    args = ap.parse_args()
+
+    nodes, edges = load_lite_graph()
+    ids, idx = index_nodes(nodes)
+    A = weighted_csr(edges, idx)
+
+    previous = {} if args.fresh else load_previous()
+    labels = label_propagation(A, seed_labels(ids, previous), max_iter=args.max_iter)
+    _, comp = connected_components(A, directed=False)
+    cids = stable_cluster_ids(ids, labels, comp, previous, args.min_size)
+    assign = {nid: int(c) for nid, c in zip(ids, cids)}
+
+    # per-cluster subgraphs, edges inside a cluster vs those cut by the partition
+    node_by_id = {n["id"]: n for n in nodes if n.get("id") in idx}
+    members = defaultdict(list)
+    for nid in ids:
+        members[assign[nid]].append(nid)
+
+    inner, cut = defaultdict(list), defaultdict(list)
+    link_w = Counter()
+    for e in edges:
+        s, t = e[0], e[1]
+        if s not in assign or t not in assign:
+            continue
+        cs, ct = assign[s], assign[t]
+        if cs == ct:
+            inner[cs].append(e)
+        else:
+            cut[cs].append(list(e[:3]) + [ct])
+            cut[ct].append(list(e[:3]) + [cs])
+            link_w[(min(cs, ct), max(cs, ct))] += edge_weight(e)
+
+    deg = Counter()
+    for e in edges:
+        deg[e[0]] += edge_weight(e)
+        deg[e[1]] += edge_weight(e)
+
+    summary_nodes = []
+    for cid in sorted(members):
+        mem = members[cid]
+        hub = min(mem, key=lambda nid: (-deg[nid], nid))
+        types = Counter(node_by_id[nid].get("t") or "other" for nid in mem)
+        summary_nodes.append({
+            "id": cid,
+            "l": "Unclustered" if cid == POOL_CLUSTER else (node_by_id[hub].get("l") or hub),
+            "n": len(mem),
+            "hub": hub,
+            "t": types.most_common(1)[0][0],
+        })
+    summary_edges = [[a, b, w] for (a, b), w in sorted(link_w.items())]
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    # clear cluster files from earlier builds, ids may have been retired
+    for old in OUT_DIR.glob("cluster_*.json"):
+        old.unlink()
+
+    dump = lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    OUT_ASSIGNMENTS.write_text(dump(assign), encoding="utf-8")
+    OUT_SUMMARY.write_text(dump({"nodes": summary_nodes, "edges": summary_edges}), encoding="utf-8")
+    total = 0
+    for cid, mem in members.items():
+        path = OUT_DIR / f"cluster_{cid}.json"
+        path.write_text(dump({
+            "id": cid,
+            "nodes": [node_by_id[nid] for nid in mem],
+            "edges": inner[cid],
+            "cut": cut[cid],
+        }), encoding="utf-8")
+        total += path.stat().st_size
+
+    kept = sum(1 for nid in ids if previous.get(nid) is not None and previous[nid] == assign[nid])
+    print(f"Nodes: {len(ids)}  |  Clusters: {len(members)} (pool {len(members.get(POOL_CLUSTER, []))} nodes)  |  Cut edges: {sum(link_w.values())}")
+    if previous:
+        print(f"Kept previous cluster id for {kept}/{len(ids)} nodes")
+    print(f"Wrote {OUT_ASSIGNMENTS} ({OUT_ASSIGNMENTS.stat().st_size} bytes)")
+    print(f"Wrote {OUT_SUMMARY} ({OUT_SUMMARY.stat().st_size} bytes)")
+    print(f"Wrote {len(members)} cluster files to {OUT_DIR} ({total} bytes)")
+
+if __name__ == "__main__":
+    main()
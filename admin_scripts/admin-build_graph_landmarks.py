@@ -0,0 +1,39 @@
+# python admin_scripts/admin-build_graph_landmarks.py
+# python admin_scripts/admin-build_graph_landmarks.py --landmarks 32
+
+# Builds a landmark distance oracle graph_landmarks.json for "how are these two nodes connected" queries
+# Picks k high degree landmark nodes (component hubs first), runs a vectorised sparse BFS from each one,
+# and stores per landmark distances (uint8) and parent pointers (int32) packed as base64 rows.
+# Any pair query is then d(a,L) + d(L,b) over the k landmarks, plus a walk up the parent pointers for the path,
+# see admin-query_graph_path.py for the query side. Graph is treated as undirected, same as adjacency.json
+
+# writes:
+# docs/data/graph_landmarks.json , {v, ids, landmarks, unreachable, dist_dtype, parent_dtype, dist[], parent[]}
+
+import argparse, json, os
+
+from admin_graph_utils import DATA, load_lite_graph, index_nodes, undirected_csr, build_landmark_oracle
+
+OUT_LANDMARKS = DATA / "graph_landmarks.json"
+
+LANDMARK_COUNT = int(os.getenv("GRAPH_LANDMARKS", "16"))
+
+def main():
+    ap = argparse.ArgumentParser(description="Build landmark BFS distance oracle from graph_data.lite.json")
+    ap.add_argument("--landmarks", type=int, default=LANDMARK_COUNT, help="Number of landmark nodes, default 16")
+    args = ap.parse_args()
+
+    nodes, edges = load_lite_graph()
+    ids, idx = index_nodes(nodes)
+    A = undirected_csr(edges, idx)
+
+    oracle = build_landmark_oracle(ids, A, k=args.landmarks)
+
+    DATA.mkdir(parents=True, exist_ok=True)
+    OUT_LANDMARKS.write_text(json.dumps(oracle, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+    print(f"Nodes: {len(ids)}  |  Undirected links: {A.nnz // 2}  |  Landmarks: {len(oracle['landmarks'])}")
+    print(f"Wrote {OUT_LANDMARKS} ({OUT_LANDMARKS.stat().st_size} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# python admin_scripts/admin-build_graph_lod.py
+# python admin_scripts/admin-build_graph_lod.py --group-by type_region --min-nodes 10
+
+# Level of detail (LOD) graphs for zoomed out network views, so the viewer can draw a handful of
+# supernodes at low zoom and only swap in real nodes for the visible region.
+# Level 0 is graph_data.lite.json itself. Level 1 groups nodes by community (clusters/assignments.json,
+# from admin-build_graph_clusters.py) or by type+region (region from node_details.json); nodes left in
+# the unclustered pool fall back to type+region. Each further level runs label propagation over the
+# weighted supernode graph, stopping once a level shrinks by less than 10% or drops to --min-nodes.
+
+# writes:
+# docs/data/graph_lod_<level>.json , {level, group_by, nodes: [...], edges: [...]}
+#   node: {id, l, t, n, ids: [original node ids], c: [child supernode ids, level 2+], w_in, x?, y?}
+#   edge: [src, tgt, weight, {relationship_type: count}], undirected, src < tgt
+
+import argparse, json, os
+from collections import Counter, defaultdict
+
+import numpy as np
+from scipy import sparse
+
+from admin_graph_utils import DATA, load_lite_graph, label_propagation, edge_type_counts
+
+ASSIGNMENTS  = DATA / "clusters" / "assignments.json"
+DETAILS_PATH = DATA / "node_details.json"
+
+LOD_MIN_NODES  = int(os.getenv("GRAPH_LOD_MIN_NODES", "20"))
+LOD_MAX_LEVELS = int(os.getenv("GRAPH_LOD_MAX_LEVELS", "4"))
+MIN_SHRINK     = 0.10  # stop coarsening when a level saves less than this share of supernodes
+POOL_CLUSTER   = 0     # matches admin-build_graph_clusters.py
+
+def lod_path(level: int):
+    return DATA / f"graph_lod_{level}.json"
+
+def base_level(nodes, edges):
+    """Level 0, one supernode per real node, edge counters keyed by (row, row) with row_a < row_b"""
+    supers = [{"key": n["id"], "ids": [n["id"]], "w_in": 0, "hub": n["id"]} for n in nodes]
+    row = {n["id"]: i for i, n in enumerate(nodes)}
+    links = defaultdict(Counter)
+    for e in edges:
+        a, b = row.get(e[0]), row.get(e[1])
+        if a is None or b is None:
+            continue
+        rels = edge_type_counts(e)
+        if a == b:
+            supers[a]["w_in"] += sum(rels.values())
+        else:
+            links[(min(a, b), max(a, b))].update(rels)
+    return supers, links
+
+def coarsen(supers, links, group: list):
+    """Merge supernodes sharing a group key, internal links become w_in, parallel links add up per type"""
+    keys = sorted(set(group), key=str)
+    new_row = {k: i for i, k in enumerate(keys)}
+    merged = [{"key": k, "ids": [], "children": [], "w_in": 0} for k in keys]
+    strength = Counter()
+    for i, s in enumerate(supers):
+        m = merged[new_row[group[i]]]
+        m["ids"].extend(s["ids"])
+        m["children"].append(i)
+        m["w_in"] += s["w_in"]
+
+    new_links = defaultdict(Counter)
+    for (a, b), rels in links.items():
+        ga, gb = new_row[group[a]], new_row[group[b]]
+        w = sum(rels.values())
+        strength[a] += w
+        strength[b] += w
+        if ga == gb:
+            merged[ga]["w_in"] += w
+        else:
+            new_links[(min(ga, gb), max(ga, gb))].update(rels)
+
+    # hub is the child with the most link weight, its original hub names the supernode
+    for m in merged:
+        best = min(m["children"], key=lambda c: (-strength[c], str(supers[c]["hub"])))
+        m["hub"] = supers[best]["hub"]
+    return merged, new_links
+
+def lpa_groups(supers, links) -> list:
+    n = len(supers)
+    if not links:
+        return list(range(n))
+    pairs = np.array(list(links.keys()), dtype=np.int32)
+    w = np.array([sum(r.values()) for r in links.values()], dtype=np.float32)
+    A = sparse.csr_matrix(
+        (np.concatenate([w, w]), (np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))),
+        shape=(n, n),
+    )
+    return label_propagation(A, np.arange(n)).tolist()
+
+def type_region_key(nid, lite, details) -> str:
+    t = lite.get(nid, {}).get("t") or "other"
+    region = (details.get(nid) or {}).get("region") or "unknown"
+    return f"{t}|{region}"
+
+def level_payload(level, group_by, supers, prev_ids, links, lite, details) -> dict:
+    ids = [f"{level}:{s['key'] if level == 1 else s['hub']}" for s in supers]
+    out_nodes = []
+    for sid, s in zip(ids, supers):
+        members = sorted(s["ids"])
+        types = Counter(lite.get(m, {}).get("t") or "other" for m in members)
+        hub = lite.get(s["hub"], {})
+        if (level == 1 and group_by == "type_region") or str(s["key"]).startswith("pool|"):
+            t, region = str(s["key"]).split("|")[-2:]
+            label = f"{t} · {region}"
+        else:
+            label = hub.get("l") or s["hub"]
+        node = {"id": sid, "l": label, "t": types.most_common(1)[0][0], "n": len(members), "ids": members, "w_in": s["w_in"]}
+        if level > 1:
+            node["c"] = sorted(prev_ids[c] for c in s["children"])
+        xs = [(lite[m]["x"], lite[m]["y"]) for m in members if lite.get(m, {}).get("x") is not None]
+        if xs:
+            node["x"] = round(sum(x for x, _ in xs) / len(xs), 2)
+            node["y"] = round(sum(y for _, y in xs) / len(xs), 2)
+        out_nodes.append(node)
+
+    out_edges = []
+    for (a, b), rels in sorted(links.items()):
+        s, t = sorted((ids[a], ids[b]))
+        out_edges.append([s, t, sum(rels.values()), dict(sorted(rels.items()))])
+    out_edges.sort(key=lambda e: (e[0], e[1]))
+    return {"level": level, "group_by": group_by, "nodes": out_nodes, "edges": out_edges}, ids
+
+def main():
+    ap = argparse.ArgumentParser(description="Build coarsened level of detail graphs from graph_data.lite.json")
+    ap.add_argument("--group-by", choices=["auto", "community", "type_region"], default="auto",
+                    help="Level 1 grouping, auto uses communities when clusters/assignments.json exists")
+    ap.add_argument("--min-nodes", type=int, default=LOD_MIN_NODES, help="Stop once a level has this few supernodes, default 20")
+    ap.add_argument("--max-levels", type=int, default=LOD_MAX_LEVELS, help="Most LOD levels to write, default 4")
+    args = ap.parse_args()
+
+    nodes, edges = load_lite_graph()
+    nodes = sorted((n for n in nodes if n.get("id")), key=lambda n: n["id"])
+    lite = {n["id"]: n for n in nodes}
+    details = json.loads(DETAILS_PATH.read_text(encoding="utf-8")) if DETAILS_PATH.exists() else {}
+
+    group_by = args.group_by
+    if group_by == "auto":
+        group_by = "community" if ASSIGNMENTS.exists() else "type_region"
+    if group_by == "community":
+        if not ASSIGNMENTS.exists():
+            raise SystemExit(f"Missing {ASSIGNMENTS}, run admin-build_graph_clusters.py first or use --group-by type_region")
+        assign = json.loads(ASSIGNMENTS.read_text(encoding="utf-8"))
+        group = []
+        for n in nodes:
+            cid = assign.get(n["id"], POOL_CLUSTER)
+            # unclustered pool would be one meaningless blob, split it by type+region instead
+            group.append(f"pool|{type_region_key(n['id'], lite, details)}" if cid == POOL_CLUSTER else f"c{cid}")
+    else:
+        group = [type_region_key(n["id"], lite, details) for n in nodes]
+
+    supers, links = base_level(nodes, edges)
+    prev_ids = [n["id"] for n in nodes]
+    written = []
+    for level in range(1, args.max_levels + 1):
+        if level > 1:
+            if len(supers) <= args.min_nodes:
+                break
+            group = lpa_groups(supers, links)
+            if len(set(group)) > len(supers) * (1 - MIN_SHRINK):
+                break
+        supers, links = coarsen(supers, links, group)
+        payload, prev_ids = level_payload(level, group_by, supers, prev_ids, links, lite, details)
+        path = lod_path(level)
+        path.write_text(json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        written.append(path)
+        print(f"Level {level}: {len(supers)} supernodes, {len(links)} links  |  Wrote {path} ({path.stat().st_size} bytes)")
+
+    # drop deeper levels left over from a bigger previous build
+    for old in DATA.glob("graph_lod_*.json"):
+        if old not in written:
+            old.unlink()
+            print(f"Removed stale {old.name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# python admin_scripts/admin-query_graph_path.py data_to_insight department_for_education
+# python admin_scripts/admin-query_graph_path.py --queries my_pairs.json --out results.json
+
+# Answers "how are these two nodes connected" from docs/data/graph_landmarks.json
+# (build it with admin-build_graph_landmarks.py). Each answer costs one pass over the landmarks,
+# not a BFS over the graph, and the path returned is approximate (an upper bound on the true distance).
+
+# query file format, either of:
+#   {"queries": [{"source": "coram", "target": "adcs"}, ...]}
+#   [["coram", "adcs"], ...]
+# result format:
+#   {"results": [{"source", "target", "distance", "lower_bound", "via", "path": [ids...]}, ...]}
+# distance/path are null/[] when no landmark reaches both nodes, e.g. separate components
+
+import argparse, json, sys
+from pathlib import Path
+
+from admin_graph_utils import DATA, load_landmark_oracle, path_query
+
+LANDMARKS_PATH = DATA / "graph_landmarks.json"
+
+def read_queries(path: Path) -> list[tuple[str, str]]:
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    items = raw.get("queries", []) if isinstance(raw, dict) else raw
+    pairs = []
+    for q in items:
+        if isinstance(q, dict):
+            pairs.append((q.get("source"), q.get("target")))
+        elif isinstance(q, (list, tuple)) and len(q) >= 2:
+            pairs.append((q[0], q[1]))
+    return pairs
+
+def main():
+    ap = argparse.ArgumentParser(description="Approximate shortest path queries over graph_landmarks.json")
+    ap.add_argument("pair", nargs="*", help="source and target node ids, for a single query")
+    ap.add_argument("--queries", type=Path, help="JSON query file, see header for format")
+    ap.add_argument("--landmarks", type=Path, default=LANDMARKS_PATH, help="Oracle file, default docs/data/graph_landmarks.json")
+    ap.add_argument("--out", type=Path, help="Write results JSON here instead of stdout")
+    args = ap.parse_args()
+
+    if args.queries:
+        pairs = read_queries(args.queries)
+    elif len(args.pair) == 2:
+        pairs = [tuple(args.pair)]
+    else:
+        ap.error("give a source and target id, or --queries FILE")
+
+    if not args.landmarks.exists():
+        raise SystemExit(f"Missing {args.landmarks}, run admin-build_graph_landmarks.py first.")
+    oracle = load_landmark_oracle(args.landmarks)
+
+    results = {"results": [path_query(oracle, s, t) for s, t in pairs]}
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(payload, encoding="utf-8")
+        print(f"Wrote {args.out} ({len(results['results'])} results)")
+    else:
+        sys.stdout.write(payload + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@
 import os
 from pathlib import Path
 from datetime import datetime
-import pdfplumber
+
+# PDF word counts come from the search index extraction cache (keyed by file sha256), shared with search_index/build.py
+from search_index.utils.pdf_cache import pdf_stats
 
 
 BASE_DIR = Path("/workspaces/csc-map-of-the-world")
@@ -20,8 +22,7 @@ INCLUDE_EXT = {".yml", ".yaml", ".pdf", ".txt", ".md"}
 def get_word_count(file_path, ext):
     try:
         if ext == ".pdf":
-            with pdfplumber.open(file_path) as pdf:
-                return sum(len(p.extract_text().split()) for p in pdf.pages if p.extract_text())
+            return pdf_stats(file_path)["words"]
         elif ext == ".docx":
             # note - have switched off import of docx lib/ python-docx
             doc = Document(file_path)
@@ -161,6 +161,36 @@ def resolve_id(x, seen_nodes: set, crosswalk: dict):
         return hit
     return x
 
+# ---------- Edges ----------
+
+def consolidate_edges(raw_edges, *, directed: bool = True) -> list[dict]:
+    """
+    Merge parallel edges between the same pair into one weighted edge.
+    raw_edges is an iterable of (source, target, relationship_type, source_file).
+    directed=False also folds reciprocal edges (a->b with b->a), keeping the first seen orientation.
+    Returns dicts {source, target, relationship_type, weight, type_counts, source_files} in first seen order,
+    relationship_type being the most common type (first seen wins ties), type_counts ordered the same way.
+    """
+    merged = {}
+    for src, tgt, rel, file in raw_edges:
+        key = (src, tgt) if directed else tuple(sorted((src, tgt)))
+        e = merged.get(key)
+        if e is None:
+            e = merged[key] = {"source": src, "target": tgt, "weight": 0, "type_counts": {}, "source_files": []}
+        e["weight"] += 1
+        e["type_counts"][rel] = e["type_counts"].get(rel, 0) + 1
+        if file and file not in e["source_files"]:
+            e["source_files"].append(file)
+
+    out = []
+    for e in merged.values():
+        order = list(e["type_counts"])
+        counts = sorted(e["type_counts"].items(), key=lambda kv: (-kv[1], order.index(kv[0])))
+        e["type_counts"] = dict(counts)
+        e["relationship_type"] = counts[0][0]
+        out.append(e)
+    return out
+
 # ---------- Node presentation helpers ----------
 
 def type_class(raw_type: str, category: str) -> str:
@@ -0,0 +1,299 @@
+# admin_scripts/admin_graph_utils.py
+
+
+"""
+Shared helpers for graph analysis builders that work off graph_data.lite.json,
+e.g. landmark distances and clustering, used by the admin-build_graph_* scripts
+"""
+
+import base64
+import json
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+ROOT     = Path(__file__).resolve().parents[1]
+DATA     = ROOT / "docs" / "data"
+LITE_SRC = DATA / "graph_data.lite.json"
+
+UNREACHABLE = 255  # uint8 sentinel for "no path from this landmark"
+
+# ---------- Loading ----------
+
+def load_lite_graph(path: Path = LITE_SRC):
+    """Return (nodes, edges) from graph_data.lite.json, edges as [src, tgt, rel] or merged [src, tgt, rel, weight, {rel: count}]"""
+    if not path.exists():
+        raise SystemExit(f"Missing {path}, build your graph_data.lite.json first.")
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    nodes = raw.get("nodes", [])
+    edges = [e for e in raw.get("edges", []) if isinstance(e, list) and len(e) >= 2]
+    return nodes, edges
+
+def index_nodes(nodes) -> tuple[list, dict]:
+    """Sorted id list plus {id: row} lookup, sorted so row numbers are stable between builds"""
+    ids = sorted({n["id"] for n in nodes if n.get("id")})
+    return ids, {nid: i for i, nid in enumerate(ids)}
+
+# ---------- Sparse adjacency ----------
+
+def undirected_csr(edges, idx: dict) -> sparse.csr_matrix:
+    """Symmetric 0/1 CSR adjacency, de duplicated, self loops dropped, unknown endpoints skipped"""
+    pairs = [(idx[e[0]], idx[e[1]]) for e in edges if e[0] in idx and e[1] in idx and e[0] != e[1]]
+    n = len(idx)
+    if not pairs:
+        return sparse.csr_matrix((n, n), dtype=np.int8)
+    src, tgt = np.array(pairs, dtype=np.int32).T
+    rows = np.concatenate([src, tgt])
+    cols = np.concatenate([tgt, src])
+    A = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    A.data[:] = 1  # duplicates summed on construction, flatten back to 0/1
+    A.sort_indices()
+    return A
+
+def edge_weight(e) -> int:
+    """Relationship count behind a lite edge, merged edges carry it at position 3"""
+    return int(e[3]) if len(e) > 3 and isinstance(e[3], (int, float)) else 1
+
+def edge_type_counts(e) -> dict:
+    """{relationship_type: count} for a lite edge, plain or merged"""
+    if len(e) > 4 and isinstance(e[4], dict):
+        return e[4]
+    return {(e[2] if len(e) > 2 and e[2] else "relatesTo"): edge_weight(e)}
+
+def weighted_csr(edges, idx: dict) -> sparse.csr_matrix:
+    """Symmetric CSR where each entry counts the relationships between the pair, either direction"""
+    kept = [e for e in edges if e[0] in idx and e[1] in idx and e[0] != e[1]]
+    n = len(idx)
+    if not kept:
+        return sparse.csr_matrix((n, n), dtype=np.float32)
+    src = np.array([idx[e[0]] for e in kept], dtype=np.int32)
+    tgt = np.array([idx[e[1]] for e in kept], dtype=np.int32)
+    w = np.array([edge_weight(e) for e in kept], dtype=np.float32)
+    rows = np.concatenate([src, tgt])
+    cols = np.concatenate([tgt, src])
+    A = sparse.csr_matrix((np.concatenate([w, w]), (rows, cols)), shape=(n, n))
+    A.sum_duplicates()
+    return A
+
+def degrees(A: sparse.csr_matrix) -> np.ndarray:
+    return np.diff(A.indptr).astype(np.int32)
+
+# ---------- BFS ----------
+
+def bfs_tree(A: sparse.csr_matrix, source: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Level synchronous BFS from one source, vectorised per frontier over CSR rows.
+    Returns (dist, parent), dist is UNREACHABLE and parent -1 where no path exists.
+    Parent is the lowest numbered frontier node seen first, so output is deterministic.
+    """
+    n = A.shape[0]
+    dist = np.full(n, UNREACHABLE, dtype=np.uint8)
+    parent = np.full(n, -1, dtype=np.int32)
+    dist[source] = 0
+
+    frontier = np.array([source], dtype=np.int32)
+    level = 0
+    while frontier.size and level < UNREACHABLE - 1:
+        level += 1
+        starts, ends = A.indptr[frontier], A.indptr[frontier + 1]
+        counts = ends - starts
+        if not counts.sum():
+            break
+        # gather every neighbour of every frontier node in one go
+        owners = np.repeat(frontier, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        nbrs = A.indices[np.repeat(starts, counts) + offsets]
+
+        fresh = dist[nbrs] == UNREACHABLE
+        nbrs, owners = nbrs[fresh], owners[fresh]
+        nbrs, first = np.unique(nbrs, return_index=True)
+        dist[nbrs] = level
+        parent[nbrs] = owners[first]
+        frontier = nbrs.astype(np.int32)
+    return dist, parent
+
+# ---------- Clustering ----------
+
+def greedy_colouring(A: sparse.csr_matrix) -> np.ndarray:
+    """Greedy colouring, highest degree first, so no two neighbours share a colour"""
+    n = A.shape[0]
+    deg = degrees(A)
+    colour = np.full(n, -1, dtype=np.int32)
+    for i in np.lexsort((np.arange(n), -deg)):
+        taken = set(colour[A.indices[A.indptr[i]:A.indptr[i + 1]]].tolist())
+        c = 0
+        while c in taken:
+            c += 1
+        colour[i] = c
+    return colour
+
+def _best_labels(A: sparse.csr_matrix, rows: np.ndarray, labels: np.ndarray, self_weight: float) -> np.ndarray:
+    """Heaviest neighbour label for each of rows, own label gets self_weight and wins ties, then smallest label"""
+    sub = A[rows]
+    r = np.repeat(np.arange(len(rows), dtype=np.int64), np.diff(sub.indptr))
+    lab = np.concatenate([labels[sub.indices], labels[rows]])
+    r = np.concatenate([r, np.arange(len(rows), dtype=np.int64)])
+    wts = np.concatenate([sub.data.astype(np.float64), np.full(len(rows), self_weight)])
+
+    # total weight per (row, label), labels compacted so (row, label) packs into one int64 key
+    uniq, lab_c = np.unique(lab, return_inverse=True)
+    L = len(uniq)
+    keys, inv = np.unique(r * L + lab_c.ravel(), return_inverse=True)
+    w = np.bincount(inv.ravel(), weights=wts, minlength=len(keys))
+    p_row, p_lab = keys // L, uniq[keys % L]
+    is_own = p_lab == labels[rows][p_row]
+    order = np.lexsort((p_lab, ~is_own, -w, p_row))
+    first = order[np.r_[True, p_row[order[1:]] != p_row[order[:-1]]]]
+    best = np.empty(len(rows), dtype=np.int64)
+    best[p_row[first]] = p_lab[first]
+    return best
+
+def label_propagation(A: sparse.csr_matrix, labels: np.ndarray, max_iter: int = 50, self_weight: float = 0.5) -> np.ndarray:
+    """
+    Weighted label propagation, nodes take the label with the heaviest neighbour weight.
+    Their own label counts self_weight extra (under one edge, so fresh labels still move)
+    and wins ties, then the smallest label. Updates go one colour class at a time,
+    vectorised within the class, so neighbours never swap labels in the same step
+    (plain synchronous LPA flip-flops forever on stars, e.g. DfE and its plans).
+    Seeding labels from a previous run keeps communities stable when the graph barely changes.
+    """
+    n = A.shape[0]
+    labels = np.asarray(labels, dtype=np.int64).copy()
+    if n == 0:
+        return labels
+    colour = greedy_colouring(A)
+    classes = [np.flatnonzero(colour == c) for c in range(colour.max() + 1)]
+
+    for _ in range(max_iter):
+        changed = 0
+        for rows in classes:
+            best = _best_labels(A, rows, labels, self_weight)
+            moved = best != labels[rows]
+            labels[rows[moved]] = best[moved]
+            changed += int(moved.sum())
+        if not changed:
+            break
+    return labels
+
+# ---------- Landmarks ----------
+
+def select_landmarks(A: sparse.csr_matrix, k: int) -> list[int]:
+    """
+    Pick up to k high degree landmarks. The hub of each connected component (size > 1)
+    goes first, largest component first, so every linked node has at least one landmark
+    when k allows, remaining slots go to the next highest degree nodes overall.
+    """
+    deg = degrees(A)
+    n_comp, labels = connected_components(A, directed=False)
+    # highest degree first, lowest row breaks ties
+    order = np.lexsort((np.arange(len(deg)), -deg))
+
+    chosen, seen_comp = [], set()
+    sizes = np.bincount(labels, minlength=n_comp)
+    hubs = []
+    for i in order:
+        c = labels[i]
+        if c in seen_comp or sizes[c] < 2:
+            continue
+        seen_comp.add(c)
+        hubs.append((-sizes[c], int(i)))
+    for _, i in sorted(hubs)[:k]:
+        chosen.append(i)
+
+    for i in order:
+        if len(chosen) >= k or deg[i] == 0:
+            break
+        if int(i) not in chosen:
+            chosen.append(int(i))
+    return chosen
+
+def _b64(arr: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<")).tobytes()).decode("ascii")
+
+def _unb64(s: str, dtype) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(s), dtype=np.dtype(dtype).newbyteorder("<"))
+
+def build_landmark_oracle(ids: list, A: sparse.csr_matrix, k: int = 16) -> dict:
+    """
+    BFS from every landmark, packed as base64 little endian rows,
+    dist as uint8, parent as int32 row numbers, one row per landmark
+    """
+    landmarks = select_landmarks(A, k)
+    dist_rows, parent_rows = [], []
+    for l in landmarks:
+        d, p = bfs_tree(A, l)
+        dist_rows.append(_b64(d))
+        parent_rows.append(_b64(p))
+    return {
+        "v": 1,
+        "ids": ids,
+        "landmarks": landmarks,
+        "unreachable": UNREACHABLE,
+        "dist_dtype": "uint8",
+        "parent_dtype": "int32",
+        "dist": dist_rows,
+        "parent": parent_rows,
+    }
+
+def load_landmark_oracle(path: Path) -> dict:
+    """Load the packed oracle and decode rows into numpy arrays, ready for path_query"""
+    raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {
+        "ids": raw["ids"],
+        "idx": {nid: i for i, nid in enumerate(raw["ids"])},
+        "landmarks": raw["landmarks"],
+        "dist": np.stack([_unb64(r, raw["dist_dtype"]) for r in raw["dist"]]) if raw["dist"] else np.zeros((0, len(raw["ids"])), dtype=np.uint8),
+        "parent": np.stack([_unb64(r, raw["parent_dtype"]) for r in raw["parent"]]) if raw["parent"] else np.zeros((0, len(raw["ids"])), dtype=np.int32),
+        "unreachable": raw.get("unreachable", UNREACHABLE),
+    }
+
+def _walk_to_root(parent: np.ndarray, i: int) -> list[int]:
+    path = [i]
+    while parent[path[-1]] >= 0:
+        path.append(int(parent[path[-1]]))
+    return path
+
+def path_query(oracle: dict, source: str, target: str) -> dict:
+    """
+    Approximate shortest path between two node ids via the best landmark.
+    Cost is one pass over the k landmarks plus the path length, independent of graph size.
+    distance is an upper bound (exact when the true path runs through a landmark),
+    lower_bound is the triangle inequality bound max|d(a,L) - d(b,L)|.
+    """
+    out = {"source": source, "target": target, "distance": None, "lower_bound": None, "via": None, "path": []}
+    idx = oracle["idx"]
+    if source not in idx or target not in idx:
+        out["error"] = "unknown node id"
+        return out
+    a, b = idx[source], idx[target]
+    if a == b:
+        out.update(distance=0, lower_bound=0, path=[source])
+        return out
+
+    da = oracle["dist"][:, a].astype(np.int32)
+    db = oracle["dist"][:, b].astype(np.int32)
+    ok = (da != oracle["unreachable"]) & (db != oracle["unreachable"])
+    if not ok.any():
+        return out  # different components, or no landmark covers them
+
+    total = np.where(ok, da + db, np.iinfo(np.int32).max)
+    best = int(np.argmin(total))
+    parent = oracle["parent"][best]
+
+    # stitch a -> L and b -> L at their first shared node, trims detours past the meeting point
+    up_a, up_b = _walk_to_root(parent, a), _walk_to_root(parent, b)
+    pos_b = {n: i for i, n in enumerate(up_b)}
+    for i, n in enumerate(up_a):
+        if n in pos_b:
+            rows = up_a[: i + 1] + up_b[: pos_b[n]][::-1]
+            break
+
+    out.update(
+        distance=len(rows) - 1,
+        lower_bound=int(np.abs(da[ok] - db[ok]).max()),
+        via=oracle["ids"][oracle["landmarks"][best]],
+        path=[oracle["ids"][r] for r in rows],
+    )
+    return out
@@ -0,0 +1,125 @@
+# python admin_scripts/dev-benchmark_pdf_backends.py
+# python admin_scripts/dev-benchmark_pdf_backends.py --dir data_published --limit 20 --out bench_pdf.json
+
+# dev benchmark for the PDF text backends in search_index/utils/pdf_text.py, makes no changes to the build
+# every PDF is read by every installed backend with no cache, reports per backend pages/sec and failures,
+# then how closely the texts agree per document against the reference backend (pdfplumber, the historic output):
+#   exact     whitespace normalised, lowercased text identical
+#   token_f1  multiset word overlap F1, 1.0 = same words in any order
+#   words     word count ratio backend/reference
+# console output, optional --out JSON with the per document rows
+
+import argparse, json, re, statistics, time
+from collections import Counter
+from pathlib import Path
+
+from search_index.utils.pdf_text import BACKENDS, available_backends, extract_pages_with
+
+WORD_RE = re.compile(r"\w+")
+
+def words(pages):
+    return WORD_RE.findall(" ".join(pages).lower())
+
+def token_f1(a: Counter, b: Counter) -> float:
+    if not a and not b:
+        return 1.0
+    overlap = sum((a & b).values())
+    if not overlap:
+        return 0.0
+    p, r = overlap / sum(b.values()), overlap / sum(a.values())
+    return 2 * p * r / (p + r)
+
+def run_backend(backend, paths):
+    rows = {}
+    for path in paths:
+        t = time.perf_counter()
+        try:
+            pages = extract_pages_with(path, backend)
+        except Exception as e:
+            rows[path] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        rows[path] = {"seconds": time.perf_counter() - t, "pages": len(pages), "words": words(pages)}
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare PDF text backends for speed and text agreement")
+    ap.add_argument("--dir", default="data_published", help="Folder searched recursively for PDFs, default data_published")
+    ap.add_argument("--limit", type=int, default=0, help="Only the first N PDFs (sorted), 0 = all")
+    ap.add_argument("--reference", default="pdfplumber", choices=BACKENDS, help="Backend the others are compared to")
+    ap.add_argument("--out", help="Optional JSON report path")
+    args = ap.parse_args()
+
+    paths = sorted(Path(args.dir).rglob("*.pdf"))
+    if args.limit:
+        paths = paths[:args.limit]
+    backends = available_backends()
+    if not paths:
+        raise SystemExit(f"No PDFs under {args.dir}")
+    if args.reference not in backends:
+        raise SystemExit(f"Reference backend {args.reference} is not installed (have: {', '.join(backends) or 'none'})")
+
+    print(f"{len(paths)} PDFs under {args.dir}  |  backends: {', '.join(backends)}")
+    results = {b: run_backend(b, paths) for b in backends}
+
+    report = {"dir": args.dir, "files": len(paths), "reference": args.reference, "backends": {}, "docs": []}
+    print(f"\n{'backend':<12}{'ok':>6}{'failed':>8}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'p50 ms/doc':>12}")
+    for b in backends:
+        ok = [r for r in results[b].values() if "error" not in r]
+        secs = sum(r["seconds"] for r in ok)
+        pages = sum(r["pages"] for r in ok)
+        p50 = statistics.median(r["seconds"] for r in ok) * 1000 if ok else 0.0
+        stats = {"ok": len(ok), "failed": len(paths) - len(ok), "pages": pages, "seconds": round(secs, 3),
+                 "pages_per_s": round(pages / secs, 1) if secs else None, "p50_ms": round(p50, 1)}
+        report["backends"][b] = stats
+        print(f"{b:<12}{stats['ok']:>6}{stats['failed']:>8}{pages:>8}{secs:>10.2f}{stats['pages_per_s'] or 0:>10.1f}{p50:>12.1f}")
+
+    ref = results[args.reference]
+    for b in backends:
+        if b == args.reference:
+            continue
+        rs, bs = report["backends"][args.reference], report["backends"][b]
+        if rs["seconds"] and bs["seconds"] and rs["pages"] == bs["pages"]:
+            print(f"\n{b} speed up over {args.reference}: {rs['seconds'] / bs['seconds']:.2f}x")
+
+        f1s, exact, page_match = [], 0, 0
+        for path in paths:
+            r, o = ref[path], results[b][path]
+            row = {"file": str(path), "backend": b}
+            if "error" in r or "error" in o:
+                row["error"] = r.get("error") or o.get("error")
+                report["docs"].append(row)
+                continue
+            ca, cb = Counter(r["words"]), Counter(o["words"])
+            row.update({
+                "pages": [r["pages"], o["pages"]],
+                "exact": r["words"] == o["words"],
+                "token_f1": round(token_f1(ca, cb), 4),
+                "words": round(len(o["words"]) / len(r["words"]), 4) if r["words"] else None,
+            })
+            f1s.append(row["token_f1"])
+            exact += row["exact"]
+            page_match += r["pages"] == o["pages"]
+            report["docs"].append(row)
+
+        if f1s:
+            agree = {"compared": len(f1s), "exact": exact, "page_count_match": page_match,
+                     "token_f1_mean": round(statistics.fmean(f1s), 4), "token_f1_min": min(f1s)}
+            report["backends"][b]["vs_reference"] = agree
+            print(f"{b} vs {args.reference}: {len(f1s)} compared  |  exact {exact}  |  page counts match {page_match}"
+                  f"  |  token F1 mean {agree['token_f1_mean']:.4f} min {agree['token_f1_min']:.4f}")
+            worst = sorted((d for d in report["docs"] if d["backend"] == b and "token_f1" in d), key=lambda d: d["token_f1"])[:5]
+            for d in worst:
+                if d["token_f1"] < 1.0:
+                    print(f"   {d['token_f1']:.4f}  words x{d['words']}  {d['file']}")
+
+    for b in backends:
+        for path, r in results[b].items():
+            if "error" in r:
+                print(f"{b} failed on {path.name}: {r['error']}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nWrote {args.out}")
+
+if __name__ == "__main__":
+    main()
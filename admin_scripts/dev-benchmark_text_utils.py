@@ -0,0 +1,84 @@
+# python admin_scripts/dev-benchmark_text_utils.py
+# python admin_scripts/dev-benchmark_text_utils.py --repeat 5 --dirs data_web data_yml data_published
+
+# dev benchmark for search_index/utils/text_utils.py, makes no changes, console output only
+# runs clean_text + lemmatise_filtered_words over the local corpus and reports tokens/sec for
+#   legacy   the pre-cache implementation (dict of str.replace, regex compiled per call, lemmatize per token)
+#   cold     current implementation with an empty lemma cache
+#   warm     current implementation with the cache already filled (what a second PDF in the same run sees)
+# outputs of every mode are checked identical to legacy. PDFs are read through the extraction cache.
+
+import argparse, re, time
+from pathlib import Path
+
+from search_index.utils import text_utils as tu
+
+TEXT_EXT = {".txt", ".md", ".yml", ".yaml"}
+
+def legacy_clean_text(text):
+    replacements = {
+        "‘": "'", "’": "'",
+        "“": '"', "”": '"',
+        "–": "-", "—": "-",
+        "…": "...", "•": "-",
+    }
+    for bad, good in replacements.items():
+        text = text.replace(bad, good)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"(page\s+\d+|contents\s+page)", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"[^a-zA-Z0-9\s\.,;:‘’'\"-]", "", text)
+    return text.strip()
+
+def legacy_lemmatise(text):
+    words = re.findall(r'\b[a-zA-Z]{4,}\b', text.lower())
+    return [tu.lemmatizer.lemmatize(w) for w in words if w not in tu.stop_words]
+
+def load_corpus(dirs):
+    texts = []
+    for d in dirs:
+        for path in sorted(Path(d).rglob("*")):
+            if path.suffix.lower() in TEXT_EXT:
+                texts.append(path.read_text(encoding="utf-8", errors="ignore"))
+            elif path.suffix.lower() == ".pdf":
+                from search_index.utils.pdf_cache import pdf_text
+                try:
+                    texts.append(" ".join(pdf_text(path)[1]))
+                except Exception as e:
+                    print(f"Skipping {path.name}: {e}")
+    return texts
+
+def run(texts, clean, lemmatise):
+    t = time.perf_counter()
+    out = [lemmatise(clean(x)) for x in texts]
+    return out, time.perf_counter() - t
+
+def main():
+    ap = argparse.ArgumentParser(description="Tokens/sec for the search index text layer, legacy vs cached")
+    ap.add_argument("--dirs", nargs="+", default=["data_web", "data_yml", "data_repos", "data_published"])
+    ap.add_argument("--repeat", type=int, default=3, help="Corpus copies per run, repeated words are the point of the cache")
+    args = ap.parse_args()
+
+    texts = load_corpus(args.dirs) * args.repeat
+    if not texts:
+        raise SystemExit(f"No text under {', '.join(args.dirs)}")
+    tokens = sum(len(tu._WORD_RE.findall(x.lower())) for x in texts)
+    chars = sum(len(x) for x in texts)
+    print(f"{len(texts)} texts  |  {chars:,} chars  |  {tokens:,} tokens (4+ letter words)")
+
+    legacy, t_legacy = run(texts, legacy_clean_text, legacy_lemmatise)
+    tu._lemma_cache.clear()
+    cold, t_cold = run(texts, tu.clean_text, tu.lemmatise_filtered_words)
+    warm, t_warm = run(texts, tu.clean_text, tu.lemmatise_filtered_words)
+
+    t0 = time.perf_counter(); [legacy_clean_text(x) for x in texts]; t_clean_old = time.perf_counter() - t0
+    t0 = time.perf_counter(); [tu.clean_text(x) for x in texts]; t_clean_new = time.perf_counter() - t0
+
+    print(f"\n{'mode':<8}{'seconds':>10}{'tokens/s':>14}{'speed up':>10}")
+    for name, secs in (("legacy", t_legacy), ("cold", t_cold), ("warm", t_warm)):
+        print(f"{name:<8}{secs:>10.3f}{tokens / secs:>14,.0f}{t_legacy / secs:>9.2f}x")
+    print(f"\nclean_text alone: legacy {t_clean_old:.3f}s, current {t_clean_new:.3f}s ({t_clean_old / max(t_clean_new, 1e-9):.2f}x)")
+    print(f"lemma cache: {len(tu._lemma_cache):,} distinct words")
+    print("outputs identical to legacy:", cold == legacy and warm == legacy)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 import os
 import json
+import argparse
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
+from collections import Counter
+from itertools import islice
 from pathlib import Path
 
 # loader imports
@@ -8,54 +13,235 @@ from loaders.web import load_from_data_web
 from loaders.yml import load_from_data_yml
 from loaders.repos import load_from_data_repos
 from loaders.published import load_from_data_published
+from utils.text_utils import save_lemma_table
+from utils.index_state import STATE_PATH, STATE_VERSION, load_state, read_state_line
+from utils.keywords import (KEYWORD_BUDGET, KEYWORD_WEIGHTING, WEIGHTINGS, MIN_DF, MAX_DF, term_counts,
+                            build_vocabulary, batch_keywords, count_matrix, weight_rows, top_k_per_row)
+from outputs.stream import FORMATS, SUFFIX, index_writer, dumps_min
+from outputs.shards import SHARDS_DIR, sharded_writer
+from outputs.bm25 import BM25_BASENAME, bm25_writer
+from outputs.keyword_ids import IDS_PATH, ids_writer, compare_sizes, round_trip_ok
 
 # Output config
 SAVE_PARQUET = False
-OUTPUT_JSON_PATH = Path("docs/data/search_index.json") # front-end search index
+OUTPUT_JSON_PATH = Path("docs/data/search_index.json") # front-end search index, --format ndjson writes search_index.ndjson alongside
 OUTPUT_PARQUET_PATH = Path("admin_scripts/docs_index.parquet") # not used in front-end
+OUTPUT_FORMAT = os.getenv("SEARCH_INDEX_FORMAT", "json")
+OUTPUT_SHARDS = os.getenv("SEARCH_INDEX_SHARDS", "")  # "" off, "auto" or a shard count, see outputs/shards.py
+OUTPUT_BM25 = os.getenv("SEARCH_INDEX_BM25", "0") == "1"  # search_bm25.json + .bin postings, see outputs/bm25.py
+OUTPUT_KEYWORD_IDS = os.getenv("SEARCH_INDEX_KEYWORD_IDS", "0") == "1"  # search_index.ids.json, see outputs/keyword_ids.py
+SPOOL_BATCH = 512  # docs per keyword selection batch in pass 2
 
-
-def build_search_index():
-    all_entries = []
-
+# Two passes so memory does not grow with the corpus:
+# 1) loaders yield records one at a time, each is reduced to its term counts and spooled to the state file
+#    (utils/index_state.py) while corpus document frequencies and lengths accumulate. Files whose content
+#    hash matches the previous state are not reprocessed, their state line is copied, deleted files drop out
+# 2) the state is read back SPOOL_BATCH docs at a time, keywords chosen against the corpus wide stats,
+#    finished entries streamed straight into the output file. Keywords depend on the whole corpus, so this
+#    pass always runs over every doc, the output matches a full rebuild.
+LOADERS = [
     # web scraped
-    print("Loading from data_web...")
-    web_entries = load_from_data_web()
-    print(f"data_web: {len(web_entries)} entries")
-    all_entries.extend(web_entries)
-
+    ("data_web", load_from_data_web),
     # SCCM defined objects from network diagram
-    print("Loading from data_yml...")
-    yml_entries = load_from_data_yml()
-    print(f"data_yml: {len(yml_entries)} entries")
-    all_entries.extend(yml_entries)
-
+    ("data_yml", load_from_data_yml),
     # files pulled from defined repos (usually only README)
-    print("Loading from data_repos...")
-    repo_entries = load_from_data_repos(force_refresh=False) # or load_from_data_repos()
-    print(f"data_repos: {len(repo_entries)} entries")
-    all_entries.extend(repo_entries)
-
+    ("data_repos", lambda previous: load_from_data_repos(force_refresh=False, previous=previous)), # or load_from_data_repos()
     # pdf documents, e.g DfE, guidance, reports...
     # typically the highest data overheads(incl. bytesize)
-    print("Loading from data_published...")
-    published_entries = load_from_data_published()
-    print(f"data_published: {len(published_entries)} entries")
-    all_entries.extend(published_entries)
+    ("data_published", load_from_data_published),
+]
+
+
+def index_entry(record, keywords):
+    return {
+        "doc_id": record["doc_id"],
+        "name": record["name"],
+        "excerpt": record["excerpt"],
+        "tags": record["tags"],
+        "url": record["url"],
+        "keywords": keywords,
+    }
+
+
+def spool_records(state_path=STATE_PATH, full=False, out_path=None):
+    """
+    Pass 1, writes the new state file (to out_path instead when given, the previous state at state_path is
+    then only read), returns (document frequencies, doc count, total token count)
+    """
+    out_path = Path(out_path or state_path)
+    shas, offsets = ({}, {}) if full else load_state(state_path)
+    prev = open(state_path, "rb") if offsets else None
+    tmp = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    tmp.parent.mkdir(parents=True, exist_ok=True)
+    df, n_docs, total_len, seen = Counter(), 0, 0, set()
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="\n") as spool:
+            spool.write(dumps_min({"version": STATE_VERSION}) + "\n")
+            for name, load in LOADERS:
+                print(f"Loading from {name}...")
+                count = reused = 0
+                for record in load(previous=shas):
+                    if record["doc_id"] in seen:
+                        print(f"Skipping duplicate doc_id {record['doc_id']} ({record.get('name')})")
+                        continue
+                    seen.add(record["doc_id"])
+                    if record.get("unchanged"):
+                        line = read_state_line(prev, offsets[record["doc_id"]])
+                        _, counts, doc_len, _ = json.loads(line)
+                        spool.write(line)
+                        reused += 1
+                    else:
+                        counts = record["counts"] if "counts" in record else term_counts(record["keywords"])
+                        doc_len = sum(counts.values())
+                        spool.write(dumps_min([index_entry(record, None), counts, doc_len, record["sha"]]) + "\n")
+                    df.update(counts.keys())
+                    count += 1
+                    total_len += doc_len
+                print(f"{name}: {count} entries ({count - reused} processed, {reused} unchanged)")
+                n_docs += count
+        if prev:
+            prev.close()
+        os.replace(tmp, out_path)
+    except BaseException:
+        if prev:
+            prev.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    if shas:
+        print(f"Dropped {len(set(shas) - seen)} docs no longer found since the last build")
+    return df, n_docs, total_len
+
+
+def read_spool(spool, batch=SPOOL_BATCH):
+    """Yields lists of (entry, counts, doc_len) read back from the state file"""
+    spool.seek(0)
+    spool.readline()  # version header
+    while True:
+        lines = list(islice(spool, batch))
+        if not lines:
+            return
+        yield [json.loads(line)[:3] for line in lines]
+
+
+def report_keyword_budgets(records, W, vocab, budgets):
+    """
+    Index size against recall for each budget, measured against keeping every surviving term (budget 0).
+    findable   share of (doc, term) pairs still matched by search_tool.js (keywords, or name/excerpt substring)
+    weight     share of the total term weight kept
+    """
+    terms = np.asarray(vocab, dtype=object)
+    full = top_k_per_row(W, 0)
+    hay = [f"{r['name']}\n{r['excerpt']}".lower() for r in records]
+    total_pairs = sum(len(c) for c in full) or 1
+    total_weight = float(W.sum()) or 1.0
+
+    print(f"\n{'budget':>8}{'kw/doc':>9}{'postings':>10}{'JSON KB':>10}{'findable':>10}{'weight':>9}")
+    for budget in budgets:
+        kept = top_k_per_row(W, budget)
+        kept_weight = sum(float(W[i, cols].sum()) for i, cols in enumerate(kept) if len(cols))
+        found = 0
+        for i, (all_cols, cols) in enumerate(zip(full, kept)):
+            found += len(cols)
+            found += sum(1 for t in terms[np.setdiff1d(all_cols, cols, assume_unique=True)] if t in hay[i])
+        size = sum(len(dumps_min(index_entry(r, terms[c].tolist()))) + 1 for r, c in zip(records, kept)) + 1
+        postings = sum(len(c) for c in kept)
+        print(f"{budget or 'all':>8}{postings / max(len(kept), 1):>9.1f}{postings:>10}{size / 1024:>10.1f}"
+              f"{found / total_pairs:>10.3f}{kept_weight / total_weight:>9.3f}")
+
+
+def build_search_index(budget=KEYWORD_BUDGET, weighting=KEYWORD_WEIGHTING, sweep=None, fmt=OUTPUT_FORMAT, shards=OUTPUT_SHARDS,
+                       bm25=OUTPUT_BM25, keyword_ids=OUTPUT_KEYWORD_IDS, full=False):
+    # a sweep spools to a scratch file, the build state and lemma table of the last real build stay as they were
+    spool_path = STATE_PATH.with_name(f"{STATE_PATH.name}.sweep.{os.getpid()}") if sweep else STATE_PATH
+    try:
+        df, n_docs, total_len = spool_records(STATE_PATH, full, spool_path)
+        if not sweep:
+            save_lemma_table()  # no-op unless LEMMA_TABLE is set
+        _write_outputs(spool_path, df, n_docs, total_len, budget, weighting, sweep, fmt, shards, bm25, keyword_ids)
+    finally:
+        if sweep:
+            spool_path.unlink(missing_ok=True)
+
+
+def _write_outputs(spool_path, df, n_docs, total_len, budget, weighting, sweep, fmt, shards, bm25, keyword_ids):
+    with open(spool_path, encoding="utf-8") as spool:
+
+        # one keyword pass over the whole corpus, shared vocabulary and document frequencies across sources
+        vocab = build_vocabulary(df, n_docs, MIN_DF, MAX_DF)
+        avgdl = total_len / n_docs if n_docs else 0.0
+        df_vec = np.array([df[t] for t in vocab], dtype=np.float64)
+        terms = np.asarray(vocab, dtype=object)
+        print(f"\nKeywords: {len(vocab)} terms over {n_docs} docs, {weighting} weighted, budget {budget or 'all'} per doc")
+
+        if sweep:
+            # report only, holds the whole corpus matrix in memory
+            rows = [row for batch in read_spool(spool) for row in batch]
+            W = weight_rows(count_matrix([c for _, c, _ in rows], vocab), df_vec, n_docs, weighting,
+                            doc_len=[n for _, _, n in rows], avgdl=avgdl)
+            report_keyword_budgets([e for e, _, _ in rows], W, vocab, sweep)
+            return
 
-    # Save search_index.json
-    OUTPUT_JSON_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(OUTPUT_JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(all_entries, f, indent=2)
+        out_path = OUTPUT_JSON_PATH.with_suffix(SUFFIX[fmt])
+        n_shards = None if shards in ("", "auto") else int(shards)
+        with index_writer(out_path, fmt) as write, \
+                (sharded_writer(SHARDS_DIR, n_shards) if shards else nullcontext()) as write_shard, \
+                (bm25_writer(vocab, df_vec, n_docs, avgdl) if bm25 else nullcontext()) as add_bm25, \
+                (ids_writer(IDS_PATH) if keyword_ids else nullcontext()) as write_ids:
+            for batch in read_spool(spool):
+                X = count_matrix([c for _, c, _ in batch], vocab)
+                doc_len = [n for _, _, n in batch]
+                if add_bm25:
+                    add_bm25(X, doc_len, [e["doc_id"] for e, _, _ in batch])
+                kws = batch_keywords(X, doc_len, df_vec, terms, n_docs, avgdl, budget, weighting)
+                for (entry, _, _), keywords in zip(batch, kws):
+                    entry["keywords"] = keywords
+                    write(entry)
+                    if write_shard:
+                        write_shard(entry)
+                    if write_ids:
+                        write_ids(entry)
 
-    print(f"\nSaved JSON search index: {OUTPUT_JSON_PATH} ({round(os.path.getsize(OUTPUT_JSON_PATH)/1024, 2)} KB)")
+    full_kb = os.path.getsize(out_path) / 1024
+    print(f"\nSaved {fmt.upper()} search index: {out_path} ({write.count} entries, {round(full_kb, 2)} KB)")
+    if shards:
+        m, b = write_shard.manifest, write_shard.report
+        print(f"Saved sharded index: {SHARDS_DIR} ({m['shards']} shards, {m['n_terms']} terms, {round(b['total']/1024, 2)} KB total)")
+        print(f"   docs.json {round(b['docs']/1024, 2)} KB  |  shard min/mean/max {b['shard_min']}/{b['shard_mean']}/{b['shard_max']} bytes")
+        print(f"   one term query fetches ~{round((b['docs'] + b['shard_mean'])/1024, 2)} KB vs {round(full_kb, 2)} KB for the full index")
+    if bm25:
+        r = add_bm25.report
+        print(f"Saved BM25 postings: {BM25_BASENAME}.json/.bin ({r['terms']} terms, {r['postings']} postings, "
+              f"{round(r['bin_bytes']/1024, 2)} KB bin + {round(r['header_bytes']/1024, 2)} KB header)")
+    if keyword_ids:
+        sizes = compare_sizes(out_path, IDS_PATH)
+        p, k = sizes["plain"], sizes["ids"]
+        print(f"Saved keyword id index: {IDS_PATH} ({write_ids.vocab_size} vocab terms, round trip {'ok' if round_trip_ok(out_path, IDS_PATH) else 'FAILED'})")
+        print(f"   {round(k['bytes']/1024, 2)} KB vs {round(p['bytes']/1024, 2)} KB plain ({p['bytes']/k['bytes']:.2f}x), "
+              f"gzip {round(k['gzip']/1024, 2)} KB vs {round(p['gzip']/1024, 2)} KB ({p['gzip']/k['gzip']:.2f}x)")
 
     if SAVE_PARQUET:
-        df = pd.DataFrame(all_entries)
+        df = pd.read_json(out_path, lines=(fmt == "ndjson"))
         OUTPUT_PARQUET_PATH.parent.mkdir(parents=True, exist_ok=True)
         df.to_parquet(OUTPUT_PARQUET_PATH, index=False)
         print(f"Saved Parquet: {OUTPUT_PARQUET_PATH} ({round(os.path.getsize(OUTPUT_PARQUET_PATH)/1024**2, 2)} MB)")
 
 
 if __name__ == "__main__":
-    build_search_index()
+    ap = argparse.ArgumentParser(description="Build docs/data/search_index.json from the local data_ folders")
+    ap.add_argument("--keyword-budget", type=int, default=KEYWORD_BUDGET,
+                    help=f"Most keywords kept per document, 0 keeps all, default {KEYWORD_BUDGET} (env KEYWORD_BUDGET)")
+    ap.add_argument("--weighting", choices=WEIGHTINGS, default=KEYWORD_WEIGHTING, help="Keyword ranking, env KEYWORD_WEIGHTING")
+    ap.add_argument("--format", choices=FORMATS, default=OUTPUT_FORMAT,
+                    help="json (minified array, the site index) or ndjson (one entry per line), env SEARCH_INDEX_FORMAT")
+    ap.add_argument("--shards", default=OUTPUT_SHARDS,
+                    help="Also write the term sharded index to docs/data/search_shards, 'auto' or a shard count, env SEARCH_INDEX_SHARDS")
+    ap.add_argument("--bm25", action="store_true", default=OUTPUT_BM25,
+                    help="Also write BM25 postings to docs/data/search_bm25.json/.bin, env SEARCH_INDEX_BM25=1")
+    ap.add_argument("--keyword-ids", action="store_true", default=OUTPUT_KEYWORD_IDS,
+                    help="Also write docs/data/search_index.ids.json, shared vocab + delta encoded keyword ids, env SEARCH_INDEX_KEYWORD_IDS=1")
+    ap.add_argument("--full", action="store_true", help="Ignore the previous build state, reprocess every file")
+    ap.add_argument("--budget-sweep", help="Comma separated budgets, e.g. 20,40,60,100,0, report size vs recall and write nothing "
+                         "(the PDF text cache still fills for new PDFs)")
+    args = ap.parse_args()
+    sweep = [int(b) for b in args.budget_sweep.split(",")] if args.budget_sweep else None
+    build_search_index(args.keyword_budget, args.weighting, sweep, args.format, args.shards, args.bm25, args.keyword_ids, args.full)
@@ -0,0 +1,266 @@
+# python admin_scripts/search_index/chunk_build.py
+# python admin_scripts/search_index/chunk_build.py --dry-run
+# python admin_scripts/search_index/chunk_build.py --chunk-chars 1200 --chunk-overlap 100   (re-chunks everything)
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path, PureWindowsPath
+
+from utils.pdf_cache import file_sha256
+from utils.pdf_text import consume_pages
+from vectors.chunks import CHUNKS_PARQUET
+
+# Local, incremental version of the chunking step csc_motw_corpus_build.ipynb runs, against the same
+# docs/data/csc_artifacts/state.json manifest, so chunks can be rebuilt from the orchestrator:
+#   {version, model, chunk_chars, chunk_overlap,
+#    docs: {doc_id: {path, source_name, sha256, chunks, bytes, last_built[, embedded]}},
+#    failed: {doc_id: {path, sha256, error}}}
+# doc_id is the first 16 hex of the PDF's SHA-256. Per PDF under data_published:
+#   sha256 matches a state entry        unchanged, its motw_chunks.parquet row group is copied across as is,
+#                                       path and source_name refreshed when the file has moved
+#   sha256 matches a failed entry       skipped, it failed to extract and has not changed since (--full retries)
+#   new, or its path's sha256 changed   re-chunked, the old entry and row group (if any) are dropped
+#   state entry whose PDF has gone      dropped
+# Chunks are the notebook's: page texts whitespace collapsed and joined, then fixed windows of chunk_chars
+# characters starting every chunk_chars - chunk_overlap, up to the end of the text (24 of the 25 current docs
+# reproduce exactly from their own chunk texts, the other's chunk boundaries differ).
+# motw_chunks.parquet keeps one row group per document, sorted by doc_id, so replacing a document means
+# writing its row group and copying the others, no PDF of an unchanged document is opened.
+# Embedding stays external, docs chunked here are marked "embedded": false until the notebook re-embeds them.
+STATE_JSON = Path("docs/data/csc_artifacts/state.json")
+SOURCE_DIR = Path("data_published")
+CHUNK_CHARS = 1800
+CHUNK_OVERLAP = 150
+CHUNK_COLUMNS = ("doc_id", "chunk_id", "source_path", "source_name", "text")
+
+
+def chunk_windows(pages, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Yields text[i:i + chunk_chars] for i = 0, step, 2 step... over the page stream, never holding the whole text"""
+    step = chunk_chars - overlap
+    if step <= 0:
+        raise ValueError("chunk_overlap must be smaller than chunk_chars")
+    buf = ""
+    for page in pages:
+        words = " ".join(page.split())
+        if not words:
+            continue
+        buf = f"{buf} {words}" if buf else words
+        while len(buf) > chunk_chars:  # a full window with text after it, so another window follows
+            yield buf[:chunk_chars]
+            buf = buf[step:]
+    if buf:
+        yield buf
+    while len(buf) > step:  # every start before the end gets a window, so short tails repeat inside the last one
+        buf = buf[step:]
+        yield buf
+
+
+def pdf_chunks(path, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP) -> list:
+    """Chunk texts of one PDF, backend fallback as the search index build (utils/pdf_text.py)"""
+    _, chunks = consume_pages(path, lambda _, pages: list(chunk_windows(pages, chunk_chars, overlap)))
+    return chunks
+
+
+def _posix(p) -> str:
+    # the notebook writes Windows paths (data_published\x.pdf)
+    return PureWindowsPath(p).as_posix() if "\\" in str(p) else Path(p).as_posix()
+
+
+def load_state(path=STATE_JSON) -> dict:
+    path = Path(path)
+    if not path.exists():
+        return {"version": 1, "model": None, "chunk_chars": CHUNK_CHARS, "chunk_overlap": CHUNK_OVERLAP, "docs": {}}
+    state = json.loads(path.read_text(encoding="utf-8"))
+    state.setdefault("docs", {})
+    return state
+
+
+def plan_chunks(state, source_dir=SOURCE_DIR, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP) -> dict:
+    """
+    {keep: [(doc_id, path, sha)], build: [...], drop: [doc_id], moved: [doc_id], failed: [(doc_id, path, sha)]}
+    for the PDFs now under source_dir, moved being kept docs whose recorded path is gone, failed the
+    unchanged PDFs that failed before. A chunk size or overlap other than the state's rebuilds every document.
+    """
+    same_config = state.get("chunk_chars") == chunk_chars and state.get("chunk_overlap") == overlap
+    known = state["docs"] if same_config else {}
+    failed_before = state.get("failed", {}) if same_config else {}
+    found = {}  # doc_id -> (sha, [paths]), same bytes under several paths are chunked once
+    for path in sorted(Path(source_dir).rglob("*.pdf")):
+        sha = file_sha256(path)
+        found.setdefault(sha[:16], (sha, []))[1].append(path)
+    keep, build, moved, failed = [], [], [], []
+    for doc_id, (sha, paths) in found.items():
+        entry = known.get(doc_id) or failed_before.get(doc_id) or {}
+        # the recorded path when it is still one of them, so a copy elsewhere does not count as a move
+        path = next((p for p in paths if _posix(p) == _posix(entry.get("path", ""))), paths[0])
+        if doc_id in known and known[doc_id].get("sha256") == sha:
+            keep.append((doc_id, path, sha))
+            if _posix(path) != _posix(known[doc_id].get("path", "")):
+                moved.append(doc_id)
+        elif doc_id in failed_before and failed_before[doc_id].get("sha256") == sha:
+            failed.append((doc_id, path, sha))
+        else:
+            build.append((doc_id, path, sha))
+    current = {d for d, _, _ in keep + build}
+    drop = [d for d in state["docs"] if d not in current]
+    return {"keep": keep, "build": build, "drop": drop, "moved": moved, "failed": failed}
+
+
+def _chunk_table(doc_id, path, chunks):
+    import pyarrow as pa
+
+    n = len(chunks)
+    return pa.table({
+        "doc_id": pa.array([doc_id] * n, pa.string()),
+        "chunk_id": pa.array(range(n), pa.int32()),
+        "source_path": pa.array([_posix(path)] * n, pa.string()),
+        "source_name": pa.array([Path(path).name] * n, pa.string()),
+        "text": pa.array(chunks, pa.string()),
+    })
+
+
+def _row_groups(pf) -> dict:
+    """doc_id -> row group indexes of the existing parquet"""
+    groups = {}
+    for g in range(pf.metadata.num_row_groups):
+        for d in set(pf.read_row_group(g, columns=["doc_id"]).column("doc_id").to_pylist()):
+            groups.setdefault(d, []).append(g)
+    return groups
+
+
+def rebuild_chunks(state, plan, chunks_path=CHUNKS_PARQUET, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP, log=print) -> dict:
+    """
+    Writes motw_chunks.parquet (kept row groups copied, built ones chunked now) and returns the new state.
+    A kept doc missing from the parquet is chunked again rather than silently lost, a PDF that fails to
+    extract is recorded under failed so it is not retried until its bytes change.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    chunks_path = Path(chunks_path)
+    old = pq.ParquetFile(chunks_path) if chunks_path.exists() else None
+    groups = _row_groups(old) if old is not None else {}
+    build = {doc_id: (path, sha) for doc_id, path, sha in plan["build"]}
+    for doc_id, path, sha in plan["keep"]:
+        if doc_id not in groups:
+            build[doc_id] = (path, sha)
+    docs = {d: dict(state["docs"][d]) for d, _, _ in plan["keep"] if d not in build}
+    failed = {d: dict(state["failed"][d]) for d, _, _ in plan["failed"]}
+    kept_paths = {d: path for d, path, _ in plan["keep"]}
+    stamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    schema = pa.schema([(c, pa.int32() if c == "chunk_id" else pa.string()) for c in CHUNK_COLUMNS])
+    tmp = chunks_path.with_name(f"{chunks_path.name}.{os.getpid()}.tmp")
+    chunks_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+            for doc_id in sorted(set(docs) | set(build)):
+                if doc_id in build:
+                    path, sha = build[doc_id]
+                    t = time.perf_counter()
+                    try:
+                        table = _chunk_table(doc_id, path, pdf_chunks(path, chunk_chars, overlap))
+                    except Exception as e:
+                        log(f"Skipping {Path(path).name}: {type(e).__name__} {e}")
+                        failed[doc_id] = {"path": _posix(path), "sha256": sha, "error": f"{type(e).__name__} {e}"}
+                        continue
+                    log(f"[chunk] {Path(path).name}: {table.num_rows} chunks in {time.perf_counter() - t:.2f} s")
+                    docs[doc_id] = {"path": _posix(path), "source_name": Path(path).name, "sha256": sha,
+                                    "chunks": table.num_rows, "bytes": Path(path).stat().st_size,
+                                    "last_built": stamp, "embedded": False}
+                else:
+                    table = pa.concat_tables([old.read_row_group(g, columns=list(CHUNK_COLUMNS)) for g in groups[doc_id]])
+                    table = table.filter(pc.equal(table.column("doc_id"), doc_id)).cast(schema)
+                    if doc_id in plan["moved"]:
+                        table = _moved(table, docs[doc_id], kept_paths[doc_id])
+                if table.num_rows:
+                    writer.write_table(table, row_group_size=table.num_rows)  # one row group per doc
+        os.replace(tmp, chunks_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    out = {k: v for k, v in state.items() if k not in ("docs", "failed")}
+    out.update({"chunk_chars": chunk_chars, "chunk_overlap": overlap, "docs": dict(sorted(docs.items()))})
+    if failed:
+        out["failed"] = dict(sorted(failed.items()))
+    return out
+
+
+def _moved(table, entry, path):
+    """Kept chunks of a PDF that now lives at path, rows and state entry pointed there (entry updated in place)"""
+    import pyarrow as pa
+
+    old = _posix(entry.get("path", ""))
+    moved = [_posix(p) == old for p in table.column("source_path").to_pylist()]
+    for column, value in (("source_path", _posix(path)), ("source_name", Path(path).name)):
+        values = [value if m else v for m, v in zip(moved, table.column(column).to_pylist())]
+        table = table.set_column(table.schema.get_field_index(column), column, pa.array(values, pa.string()))
+    entry.update({"path": _posix(path), "source_name": Path(path).name})
+    return table
+
+
+def save_state(state, path=STATE_JSON):
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def awaiting_embedding(state) -> list:
+    return [d for d, e in state["docs"].items() if e.get("embedded") is False]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Incrementally re-chunk changed PDFs into motw_chunks.parquet, driven by state.json")
+    ap.add_argument("--source", default=str(SOURCE_DIR), help=f"PDF folder, default {SOURCE_DIR}")
+    ap.add_argument("--state", default=str(STATE_JSON), help=f"Manifest, default {STATE_JSON}")
+    ap.add_argument("--chunks", default=str(CHUNKS_PARQUET), help=f"Chunks parquet, default {CHUNKS_PARQUET}")
+    ap.add_argument("--chunk-chars", type=int, help=f"Window size, default the manifest's ({CHUNK_CHARS} when new)")
+    ap.add_argument("--chunk-overlap", type=int, help=f"Window overlap, default the manifest's ({CHUNK_OVERLAP} when new)")
+    ap.add_argument("--full", action="store_true", help="Re-chunk every document")
+    ap.add_argument("--dry-run", action="store_true", help="Report what would be kept, chunked and dropped")
+    args = ap.parse_args()
+
+    if not any(Path(args.source).rglob("*.pdf")):
+        raise SystemExit(f"No PDFs under {args.source}, refusing to drop every document from {args.state}")
+    state = load_state(args.state)
+    chunk_chars = args.chunk_chars or state.get("chunk_chars") or CHUNK_CHARS
+    overlap = args.chunk_overlap if args.chunk_overlap is not None else state.get("chunk_overlap", CHUNK_OVERLAP)
+    if args.full:
+        state = {**state, "chunk_chars": None}  # no config match, everything is built
+
+    t = time.perf_counter()
+    plan = plan_chunks(state, args.source, chunk_chars, overlap)
+    print(f"{len(plan['keep'])} unchanged ({len(plan['moved'])} moved), {len(plan['build'])} to chunk, "
+          f"{len(plan['drop'])} to drop, {len(plan['failed'])} failed before and unchanged "
+          f"({chunk_chars} chars, {overlap} overlap), hashed in {time.perf_counter() - t:.2f} s")
+    for doc_id in plan["drop"]:
+        print(f"[drop]  {doc_id}  {state['docs'][doc_id].get('source_name', '')}")
+    kept = {doc_id: path for doc_id, path, _ in plan["keep"]}
+    for doc_id in plan["moved"]:
+        print(f"[move]  {doc_id}  {state['docs'][doc_id].get('path')} -> {_posix(kept[doc_id])}")
+    for doc_id, path, _ in plan["failed"]:
+        print(f"[skip]  {doc_id}  {path} ({state['failed'][doc_id].get('error')}, --full retries it)")
+    if args.dry_run:
+        for doc_id, path, _ in plan["build"]:
+            print(f"[chunk] {doc_id}  {path}")
+        sys.exit(0)
+    settled = not plan["build"] and not plan["drop"] and not plan["moved"] and len(plan["failed"]) == len(state.get("failed", {}))
+    if settled and Path(args.chunks).exists():
+        print("Nothing changed, motw_chunks.parquet left as is")
+        sys.exit(0)
+
+    t = time.perf_counter()
+    new_state = rebuild_chunks(state, plan, args.chunks, chunk_chars, overlap)
+    save_state(new_state, args.state)
+    total = sum(e.get("chunks", 0) for e in new_state["docs"].values())
+    print(f"Wrote {args.chunks}: {len(new_state['docs'])} docs, {total} chunks, "
+          f"{Path(args.chunks).stat().st_size / 1024:.1f} KB in {time.perf_counter() - t:.2f} s")
+    pending = awaiting_embedding(new_state)
+    if pending:
+        print(f"{len(pending)} docs chunked here still need embedding (motw_vectors.parquet) by the notebook")
@@ -0,0 +1,278 @@
+# python admin_scripts/search_index/dedupe.py chunks
+# python admin_scripts/search_index/dedupe.py chunks --threshold 0.9 --drop
+# python admin_scripts/search_index/dedupe.py chunks --scale 100000
+# python admin_scripts/search_index/dedupe.py index
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from utils.minhash import NUM_PERM, THRESHOLD, SHINGLE_WORDS, token_hashes, shingle_hashes, signatures, lsh_params, near_duplicates
+from utils.index_state import STATE_PATH, STATE_VERSION
+from chunk_build import STATE_JSON, load_state, save_state
+from vectors.chunks import CHUNKS_PARQUET
+from vectors.store import VECTORS_PARQUET
+
+# Near duplicate detection ahead of embedding and indexing (utils/minhash.py), boilerplate and repeated
+# sections otherwise cost a vector and a chunk row each, and repeated pages skew keyword document frequencies.
+#   chunks   motw_chunks.parquet, word SHINGLE_WORDS-gram shingles per chunk, and per document (all its chunks)
+#   index    the search index build state (.cache/index_state.ndjson), term set per document, so scraped
+#            data_web pages and PDFs are compared across sources without their text
+# Near duplicates are marked, the lowest row of each cluster is kept as the canonical copy:
+#   <chunks>.dupes.json   {threshold, num_perm, bands, rows,
+#                          chunks: [{row, doc_id, source_path, chunk_id, same_as: {row, doc_id, source_path, chunk_id}}],
+#                          docs: [{doc_id, source_path, same_as: {doc_id, source_path}}]}
+# A chunk is identified by its row (file order) with doc_id, source_path and chunk_id, and a document by
+# doc_id and source_path: the same PDF under two names has one doc_id and repeats its chunk ids.
+# chunks --drop also removes the duplicate rows from motw_chunks.parquet and motw_vectors.parquet together
+# (one row group per doc kept, chunk ids left as they were), refusing when the two do not line up row for row,
+# and updates the chunk counts in state.json, so chunks, vectors and manifest stay in step. The derived
+# stores (vector_search.py convert, ivf-build, pq-build) need re-running after. Bytes and vectors saved are
+# reported either way.
+DEFAULT_DIM = 384  # all-MiniLM-L6-v2, when no vectors parquet is around to read it from
+
+
+def chunk_signatures(texts, num_perm=NUM_PERM) -> tuple:
+    """(uint32[n, num_perm] signatures, [shingle sets]) for chunk texts"""
+    sets = [shingle_hashes(token_hashes(t or "")) for t in texts]
+    return signatures(sets, num_perm), sets
+
+
+def _vector_dim() -> int:
+    try:
+        from vectors.store import parquet_info
+        return parquet_info(VECTORS_PARQUET)["dim"] or DEFAULT_DIM
+    except (OSError, ImportError):
+        return DEFAULT_DIM
+
+
+def _clusters(canonical) -> int:
+    dup = canonical != np.arange(len(canonical))
+    return len(set(canonical[dup].tolist()))
+
+
+def synthetic_chunks(texts, n, dup_share=0.1, near_share=0.1, seed=0) -> list:
+    """
+    n chunks from the real ones with half their words swapped for random corpus words (so they are distinct),
+    then dup_share exact and near_share lightly edited (5% of words) copies of earlier ones, for timing at scale
+    """
+    rng = np.random.default_rng(seed)
+    words = [t.split() for t in texts if t]
+    vocab = np.array(sorted({w for ws in words for w in ws}))
+    out = []
+    for i in range(n):
+        r = rng.random()
+        if out and r < dup_share:
+            out.append(out[rng.integers(len(out))])
+            continue
+        if out and r < dup_share + near_share:
+            ws = out[rng.integers(len(out))].split()
+        else:
+            ws = list(words[rng.integers(len(words))])
+        p = 0.05 if r < dup_share + near_share else 0.5
+        swap = np.flatnonzero(rng.random(len(ws)) < p)
+        for j, w in zip(swap, vocab[rng.integers(len(vocab), size=swap.size)]):
+            ws[j] = w
+        out.append(" ".join(ws))
+    return out
+
+
+def report_chunks(args):
+    import pyarrow.parquet as pq
+
+    t = time.perf_counter()
+    if args.scale:
+        texts = synthetic_chunks(pq.read_table(args.chunks, columns=["text"]).column("text").to_pylist(), args.scale)
+        keys = [("synthetic", "", i) for i in range(len(texts))]
+        print(f"Synthetic: {len(texts)} chunks derived from {args.chunks}, ~10% exact and ~10% near copies")
+    else:
+        table = pq.read_table(args.chunks, columns=["doc_id", "source_path", "chunk_id", "source_name", "text"])
+        texts = table.column("text").to_pylist()
+        keys = list(zip(table.column("doc_id").to_pylist(), table.column("source_path").to_pylist(),
+                        table.column("chunk_id").to_pylist()))
+        names = dict(zip(zip(table.column("doc_id").to_pylist(), table.column("source_path").to_pylist()),
+                         table.column("source_name").to_pylist()))
+    load_s = time.perf_counter() - t
+
+    bands, rows = (args.bands, args.num_perm // args.bands) if args.bands else lsh_params(args.threshold, args.num_perm)
+    t = time.perf_counter()
+    sigs, sets = chunk_signatures(texts, args.num_perm)
+    sig_s = time.perf_counter() - t
+    t = time.perf_counter()
+    canonical, checked = near_duplicates(sigs, args.threshold, bands)
+    lsh_s = time.perf_counter() - t
+
+    dup = np.flatnonzero(canonical != np.arange(len(texts)))
+    text_bytes = sum(len((texts[i] or "").encode("utf-8")) for i in dup)
+    dim = _vector_dim()
+    print(f"{len(texts)} chunks, MinHash {args.num_perm} perms, {SHINGLE_WORDS} word shingles, LSH {bands} bands x {rows} rows, "
+          f"threshold {args.threshold}")
+    print(f"   load {load_s:.2f} s, signatures {sig_s:.2f} s, LSH {lsh_s:.2f} s ({checked} candidate pairs checked), "
+          f"{len(texts) / max(sig_s + lsh_s, 1e-9):,.0f} chunks/s")
+    print(f"   {len(dup)} near duplicate chunks in {_clusters(canonical)} clusters, {len(dup) / max(len(texts), 1):.1%} of chunks")
+    print(f"   saved: {text_bytes / 1024:.1f} KB of chunk text, {len(dup)} vectors "
+          f"({len(dup) * dim / 1024:.1f} KB as uint8 parquet, {len(dup) * (dim + 4) / 1024:.1f} KB in the int8 store, "
+          f"{len(dup) * dim * 4 / 1024:.1f} KB as float32)")
+    if args.scale:
+        return
+
+    # documents (doc_id, source_path), one signature over the union of their chunks' shingles
+    docs = list(dict.fromkeys((d, p) for d, p, _ in keys))
+    members = {}
+    for i, (d, p, _) in enumerate(keys):
+        members.setdefault((d, p), []).append(i)
+    doc_sets = [np.unique(np.concatenate([sets[i] for i in members[d]])) for d in docs]
+    doc_canonical, _ = near_duplicates(signatures(doc_sets, args.num_perm), args.threshold, bands)
+    doc_dups = [(docs[i], docs[c]) for i, c in enumerate(doc_canonical) if i != c]
+    print(f"   {len(doc_dups)} near duplicate documents")
+    for d, c in doc_dups:
+        print(f"     {names.get(d)} ({d[0]})  ~  {names.get(c)} ({c[0]})")
+
+    shown = {}
+    for i in dup:
+        shown.setdefault(int(canonical[i]), []).append(int(i))
+    for c, same in list(shown.items())[:args.show]:
+        d, p, chunk = keys[c]
+        print(f"\n   row {c} {d}:{chunk} ({names.get((d, p), '')}) x{len(same) + 1}: {' '.join(texts[c].split())[:120]}")
+
+    def chunk_mark(i):
+        return {"row": int(i), "doc_id": keys[i][0], "source_path": keys[i][1], "chunk_id": int(keys[i][2])}
+
+    marks = {
+        "threshold": args.threshold, "num_perm": args.num_perm, "bands": bands, "rows": rows,
+        "chunks": [{**chunk_mark(i), "same_as": chunk_mark(canonical[i])} for i in dup],
+        "docs": [{"doc_id": d[0], "source_path": d[1], "same_as": {"doc_id": c[0], "source_path": c[1]}} for d, c in doc_dups],
+    }
+    out = Path(args.out or Path(args.chunks).with_suffix(".dupes.json"))
+    out.write_text(json.dumps(marks, indent=2), encoding="utf-8")
+    print(f"\nMarked {len(dup)} chunks and {len(doc_dups)} docs in {out}")
+    if args.drop and len(dup):
+        drop_chunks(set(dup.tolist()), args.chunks, args.vectors, args.state)
+        print(f"Dropped them from {args.chunks} ({Path(args.chunks).stat().st_size / 1024:.1f} KB) and "
+              f"{args.vectors} ({Path(args.vectors).stat().st_size / 1024:.1f} KB), chunk counts updated in {args.state}")
+        print("Re-run vector_search.py convert (and ivf-build / pq-build) for the search stores")
+
+
+def _row_keys(path) -> list:
+    import pyarrow.parquet as pq
+
+    t = pq.read_table(path, columns=["doc_id", "source_path", "chunk_id"])
+    return list(zip(t.column("doc_id").to_pylist(), t.column("source_path").to_pylist(), t.column("chunk_id").to_pylist()))
+
+
+def _write_without(path, drop_rows, tmp):
+    """Copy of the parquet at path into tmp without the given rows (file order), row groups, schema and codec kept"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    codec = pf.metadata.row_group(0).column(0).compression.lower() if pf.metadata.num_row_groups else "zstd"
+    with pq.ParquetWriter(tmp, pf.schema_arrow, compression=codec) as writer:
+        pos = 0
+        for g in range(pf.metadata.num_row_groups):
+            table = pf.read_row_group(g)
+            keep = [r for r in range(table.num_rows) if pos + r not in drop_rows]
+            pos += table.num_rows
+            if keep:
+                writer.write_table(table.take(pa.array(keep, pa.int64())), row_group_size=len(keep))
+
+
+def drop_chunks(drop_rows, chunks_path=CHUNKS_PARQUET, vectors_path=VECTORS_PARQUET, state_path=STATE_JSON):
+    """
+    Remove the given rows (file order) from the chunks and vectors parquets, which must hold the same
+    (doc_id, source_path, chunk_id) rows in the same order, and recount each doc's chunks in state.json
+    """
+    chunks_path, vectors_path = Path(chunks_path), Path(vectors_path)
+    keys = _row_keys(chunks_path)
+    if not vectors_path.exists() or _row_keys(vectors_path) != keys:
+        raise SystemExit(f"{vectors_path} does not hold the rows of {chunks_path.name} in the same order, "
+                         "embed the current chunks before dropping any")
+    tmps = [p.with_name(f"{p.name}.{os.getpid()}.tmp") for p in (chunks_path, vectors_path)]
+    try:
+        for path, tmp in zip((chunks_path, vectors_path), tmps):
+            _write_without(path, drop_rows, tmp)
+        for path, tmp in zip((chunks_path, vectors_path), tmps):
+            os.replace(tmp, path)
+    except BaseException:
+        for tmp in tmps:
+            tmp.unlink(missing_ok=True)
+        raise
+
+    state = load_state(state_path)
+    counts, dropped = {}, {}
+    for r, (doc_id, _, _) in enumerate(keys):
+        tally = dropped if r in drop_rows else counts
+        tally[doc_id] = tally.get(doc_id, 0) + 1
+    for doc_id, n in dropped.items():
+        if doc_id in state["docs"]:
+            entry = state["docs"][doc_id]
+            entry["chunks"] = counts.get(doc_id, 0)
+            entry["duplicates_dropped"] = entry.get("duplicates_dropped", 0) + n
+    if Path(state_path).exists():
+        save_state(state, state_path)
+
+
+def report_index(args):
+    """Near duplicate documents of the last search index build, from the term sets in its state file"""
+    path = Path(args.state)
+    if not path.exists():
+        raise SystemExit(f"{path} not found, run build.py first")
+    entries, sets, sizes = [], [], []
+    with open(path, "rb") as f:
+        if json.loads(f.readline() or b"{}").get("version") != STATE_VERSION:
+            raise SystemExit(f"{path.name} is from another state version, re-run build.py")
+        for line in f:
+            entry, counts, _, _ = json.loads(line)
+            entries.append(entry)
+            # terms, not shingles, the state keeps counts only, so this compares vocabularies
+            # too few terms to tell a copy from a short record (yml objects), left out as an empty set
+            terms = " ".join(counts) if len(counts) >= args.min_terms else ""
+            sets.append(np.unique(token_hashes(terms).astype(np.uint32)))
+            sizes.append(len(line))
+    t = time.perf_counter()
+    bands = args.bands or lsh_params(args.threshold, args.num_perm)[0]
+    canonical, checked = near_duplicates(signatures(sets, args.num_perm), args.threshold, bands)
+    dup = [i for i, c in enumerate(canonical) if i != c]
+    print(f"{len(entries)} docs in {path.name}, term set MinHash, threshold {args.threshold}, "
+          f"{time.perf_counter() - t:.2f} s, {checked} candidate pairs checked")
+    print(f"   {len(dup)} near duplicate docs, {sum(sizes[i] for i in dup) / 1024:.1f} KB of state "
+          f"(entries plus term counts) they add to pass 2")
+    for i in dup[:args.show]:
+        c = canonical[i]
+        print(f"     {entries[i].get('name')} ({entries[i]['doc_id']})  ~  {entries[c].get('name')} ({entries[c]['doc_id']})")
+    if args.out:
+        marks = {"threshold": args.threshold, "num_perm": args.num_perm,
+                 "docs": {entries[i]["doc_id"]: entries[canonical[i]]["doc_id"] for i in dup}}
+        Path(args.out).write_text(json.dumps(marks, indent=2), encoding="utf-8")
+        print(f"\nMarked {len(dup)} docs in {args.out}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="MinHash LSH near duplicate detection for chunks and documents")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    c = sub.add_parser("chunks", help="Near duplicate chunks and documents in motw_chunks.parquet")
+    c.add_argument("--chunks", default=str(CHUNKS_PARQUET), help=f"Chunks parquet, default {CHUNKS_PARQUET}")
+    c.add_argument("--out", help="Marks JSON, default <chunks>.dupes.json next to the parquet")
+    c.add_argument("--drop", action="store_true", help="Also drop the duplicate chunks from the chunks and vectors parquets")
+    c.add_argument("--vectors", default=str(VECTORS_PARQUET), help=f"Vectors parquet kept in step by --drop, default {VECTORS_PARQUET}")
+    c.add_argument("--state", default=str(STATE_JSON), help=f"Manifest whose chunk counts --drop updates, default {STATE_JSON}")
+    c.add_argument("--scale", type=int, help="Time a synthetic corpus of this many chunks instead (report only)")
+    c.set_defaults(run=report_chunks)
+
+    i = sub.add_parser("index", help="Near duplicate documents in the search index build state")
+    i.add_argument("--state", default=str(STATE_PATH), help="index_state.ndjson written by build.py")
+    i.add_argument("--out", help="Also write the marks as JSON")
+    i.add_argument("--min-terms", type=int, default=20, help="Docs with fewer distinct terms are not compared")
+    i.set_defaults(run=report_index)
+
+    for p in (c, i):
+        p.add_argument("--threshold", type=float, default=THRESHOLD, help="Estimated Jaccard at or above which items are duplicates")
+        p.add_argument("--num-perm", type=int, default=NUM_PERM, help="MinHash permutations, env MINHASH_PERM")
+        p.add_argument("--bands", type=int, help="LSH bands, default chosen for the threshold")
+        p.add_argument("--show", type=int, default=10, help="Examples to print")
+    args = ap.parse_args()
+    args.run(args)
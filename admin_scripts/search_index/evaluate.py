@@ -0,0 +1,168 @@
+# python admin_scripts/search_index/evaluate.py
+# python admin_scripts/search_index/evaluate.py --index docs/data/search_index.json --compare /tmp/search_index.new.json
+# python admin_scripts/search_index/evaluate.py --rank bm25 --out docs/data/search_eval.json
+import argparse
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+from query import INDEX_PATH, RANKINGS, QueryEngine, latency_summary
+from outputs.bm25 import BM25_BASENAME
+
+# Relevance and latency regression check for search index builds, so keyword extraction changes
+# (MIN_DF / MAX_DF, budgets, weighting, lemmatisation) come with a number rather than a hunch.
+# The query set (eval/csc_queries_v*.json) is versioned, each query lists the docs a user would expect,
+# as case insensitive name substrings (names survive rebuilds, doc_ids may not) or exact doc_ids.
+# Per query, over the ranked results query.py returns (search_tool.js rules, or --rank bm25):
+#   recall@k   share of expected items with a matching doc in the top k
+#   RR         1 / rank of the first expected doc, 0 when none is returned
+# Expected items no doc in the index matches at all are reported separately, they usually mean the
+# query set needs updating rather than a ranking regression.
+QUERY_SET = Path(__file__).resolve().parent / "eval" / "csc_queries_v1.json"
+KS = (1, 5, 10, 20)
+
+
+def load_query_set(path=QUERY_SET) -> dict:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(data.get("queries"), list):
+        raise ValueError(f"{path} has no queries list")
+    return data
+
+
+def _matches(doc, expected) -> bool:
+    return doc.get("doc_id") == expected or expected.lower() in str(doc.get("name") or "").lower()
+
+
+def evaluate_query(engine, query, expected, ks=KS, rank="js") -> dict:
+    n, hits = engine.search(query, limit=len(engine.docs), rank=rank)
+    # 1 based rank of the first doc matching each expected item, None when not returned
+    first = []
+    for e in expected:
+        first.append(next((r for r, i in enumerate(hits, 1) if _matches(engine.docs[i], e)), None))
+    ranks = [r for r in first if r is not None]
+    return {
+        "query": query,
+        "matches": n,
+        "recall": {k: sum(1 for r in ranks if r <= k) / len(expected) if expected else 0.0 for k in ks},
+        "rr": 1.0 / min(ranks) if ranks else 0.0,
+        "ranks": dict(zip(expected, first)),
+        "absent": [e for e in expected if not any(_matches(d, e) for d in engine.docs)],
+    }
+
+
+def index_size(path) -> dict:
+    raw = Path(path).read_bytes()
+    return {"bytes": len(raw), "gzip": len(gzip.compress(raw, 6))}
+
+
+def evaluate_index(index_path, query_set, ks=KS, rank="js", bm25_base=None, repeat=20) -> dict:
+    """Metrics for one build of the index against the query set, see the module comment"""
+    t = time.perf_counter()
+    engine = QueryEngine(index_path, bm25_base if rank == "bm25" else None)
+    load_ms = (time.perf_counter() - t) * 1000
+
+    queries = query_set["queries"]
+    per_query = [evaluate_query(engine, q["query"], q.get("expected", []), ks, rank) for q in queries]
+
+    samples = []
+    for q in queries:
+        for _ in range(max(repeat, 1)):
+            t = time.perf_counter()
+            engine.search(q["query"], rank=rank)  # search_tool.js's own 50 result cut
+            samples.append((time.perf_counter() - t) * 1000)
+
+    n = len(per_query) or 1
+    return {
+        "index": str(index_path),
+        "query_set_version": query_set.get("version"),
+        "rank": rank,
+        "docs": len(engine.docs),
+        "size": index_size(index_path),
+        "load_ms": round(load_ms, 2),
+        "recall": {k: sum(r["recall"][k] for r in per_query) / n for k in ks},
+        "mrr": sum(r["rr"] for r in per_query) / n,
+        "zero_result_queries": sum(1 for r in per_query if not r["matches"]),
+        "latency_ms": latency_summary(samples),
+        "queries": per_query,
+    }
+
+
+def _summary_rows(report, ks):
+    rows = [(f"recall@{k}", report["recall"][k], ".3f") for k in ks]
+    rows += [
+        ("MRR", report["mrr"], ".3f"),
+        ("zero result queries", report["zero_result_queries"], "d"),
+        ("docs", report["docs"], "d"),
+        ("index KB", report["size"]["bytes"] / 1024, ".1f"),
+        ("index gzip KB", report["size"]["gzip"] / 1024, ".1f"),
+        ("load ms", report["load_ms"], ".1f"),
+        ("query p50 ms", report["latency_ms"].get("p50", 0.0), ".3f"),
+        ("query p90 ms", report["latency_ms"].get("p90", 0.0), ".3f"),
+        ("query p99 ms", report["latency_ms"].get("p99", 0.0), ".3f"),
+    ]
+    return rows
+
+
+def print_report(report, ks=KS, out=sys.stdout):
+    out.write(f"\n{report['index']}  ({report['rank']} ranking, query set v{report['query_set_version']})\n")
+    for name, value, fmt in _summary_rows(report, ks):
+        out.write(f"  {name:<22}{value:>12{fmt}}\n")
+    out.write(f"\n  {'query':<32}{'matches':>8}{'RR':>7}" + "".join(f"{'R@' + str(k):>7}" for k in ks) + "\n")
+    for r in report["queries"]:
+        out.write(f"  {r['query'][:31]:<32}{r['matches']:>8}{r['rr']:>7.2f}" + "".join(f"{r['recall'][k]:>7.2f}" for k in ks) + "\n")
+    absent = [(r["query"], e) for r in report["queries"] for e in r["absent"]]
+    if absent:
+        out.write("\n  expected items no doc in this index matches (update the query set?):\n")
+        for q, e in absent:
+            out.write(f"    {q!r}: {e!r}\n")
+
+
+def print_comparison(a, b, ks=KS, out=sys.stdout):
+    """Side by side summary of two builds, then every query whose RR or recall moved"""
+    out.write(f"\nA  {a['index']}\nB  {b['index']}\n({a['rank']} ranking, query set v{a['query_set_version']})\n\n")
+    out.write(f"  {'':<22}{'A':>12}{'B':>12}{'B - A':>12}\n")
+    for (name, va, fmt), (_, vb, _) in zip(_summary_rows(a, ks), _summary_rows(b, ks)):
+        delta = vb - va
+        out.write(f"  {name:<22}{va:>12{fmt}}{vb:>12{fmt}}{delta:>+12{fmt}}\n")
+
+    changed = []
+    for qa, qb in zip(a["queries"], b["queries"]):
+        if qa["rr"] != qb["rr"] or any(qa["recall"][k] != qb["recall"][k] for k in ks):
+            changed.append((qa, qb))
+    if not changed:
+        out.write("\n  no per query changes in RR or recall\n")
+        return
+    out.write(f"\n  {'query':<32}{'RR A':>7}{'RR B':>7}" + "".join(f"{'R@' + str(k) + ' A/B':>13}" for k in ks) + "\n")
+    for qa, qb in changed:
+        out.write(f"  {qa['query'][:31]:<32}{qa['rr']:>7.2f}{qb['rr']:>7.2f}"
+                  + "".join(f"{qa['recall'][k]:>8.2f}/{qb['recall'][k]:<4.2f}" for k in ks) + "\n")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Recall@k, MRR, index size and query latency of a search index build")
+    ap.add_argument("--index", default=str(INDEX_PATH), help=f"Search index to evaluate (.json, .ndjson or .ids.json), default {INDEX_PATH}")
+    ap.add_argument("--compare", help="Second build of the index, reported side by side with --index")
+    ap.add_argument("--queries", default=str(QUERY_SET), help="Query set JSON, default the current eval/csc_queries_v*.json")
+    ap.add_argument("--k", default=",".join(map(str, KS)), help="Comma separated cut offs for recall@k")
+    ap.add_argument("--rank", choices=RANKINGS, default="js", help="js (search_tool.js order) or bm25 (needs build.py --bm25)")
+    ap.add_argument("--bm25-base", default=str(BM25_BASENAME),
+                    help="BM25 postings basename for --index, --compare uses <its folder>/search_bm25")
+    ap.add_argument("--repeat", type=int, default=20, help="Latency samples per query")
+    ap.add_argument("--out", help="Also write the full report(s) as JSON")
+    args = ap.parse_args()
+
+    ks = tuple(int(k) for k in args.k.split(","))
+    query_set = load_query_set(args.queries)
+    a = evaluate_index(args.index, query_set, ks, args.rank, args.bm25_base, args.repeat)
+    reports = {"a": a}
+    if args.compare:
+        b = evaluate_index(args.compare, query_set, ks, args.rank, Path(args.compare).parent / BM25_BASENAME.name, args.repeat)
+        reports["b"] = b
+        print_comparison(a, b, ks)
+    else:
+        print_report(a, ks)
+    if args.out:
+        Path(args.out).write_text(json.dumps(reports, indent=2), encoding="utf-8")
+        print(f"\nSaved report: {args.out}")
@@ -0,0 +1,306 @@
+# python admin_scripts/search_index/hybrid.py "section 47 enquiry" "care leavers"
+# python admin_scripts/search_index/hybrid.py --file queries.txt --vectors queries.npy --rank bm25 --repeat 5
+# cat queries.txt | python admin_scripts/search_index/hybrid.py --nprobe 8 --json > results.ndjson
+# python admin_scripts/search_index/hybrid.py --check
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from query import INDEX_PATH, RANKINGS, QueryEngine, latency_summary, read_queries, tokenise_query
+from outputs.bm25 import BM25_BASENAME
+from vectors.store import VECTORS_BASE, load_vectors, normalise, quantise_int8, search_int8
+from vectors.ivf import load_ivf, search_ivf
+from vectors.chunks import CHUNKS_PARQUET, ChunkTexts, excerpt, doc_rows
+from utils.index_state import doc_key
+
+# Hybrid retrieval: keyword matches from search_index.json (query.py, search_tool.js rules or BM25) and
+# chunk vector top k (vectors/store.py int8 brute force, or IVF with --nprobe) run side by side on two
+# threads, then are fused per document with reciprocal rank fusion:
+#   score(doc) = sum over the rankings it appears in of 1 / (RRF_K + rank)
+# RRF only needs ranks, so BM25 / substring order and cosine never have to be put on one scale.
+# The two sides key a PDF differently, the index by doc_key("published", path) (utils/index_state.py), the
+# chunks and vectors by the first 16 hex of its SHA-256, so chunk docs are mapped onto index doc_ids through
+# their source paths in motw_chunks.parquet (index_keys) and fused under the index doc_id, copies of one PDF
+# under several names under the best ranked one. --check confirms every PDF on both sides comes back as one
+# result with both ranks.
+# A doc's rank on the vector side is the rank of its best chunk, and that chunk's text (motw_chunks.parquet)
+# is the excerpt returned. Docs only the keywords found get their best chunk by scoring their own chunks,
+# docs without chunks (not in the csc_artifacts build) fall back to the index excerpt.
+# Query vectors are all-MiniLM-L6-v2 embeddings, from --vectors or computed with sentence-transformers
+# when it is installed (HYBRID_EMBED_MODEL), the vector store itself needs vector_search.py convert.
+RRF_K = 60
+KEYWORD_K = 50  # search_tool.js's own result cut
+VECTOR_K = 100  # chunks, several usually belong to one doc
+EMBED_MODEL = os.getenv("HYBRID_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+COMPONENTS = ("embed", "keyword", "vector", "fuse", "total")
+
+_models = {}
+
+
+def embed_queries(queries, model_name=EMBED_MODEL) -> np.ndarray:
+    """Normalised float32[q, dim] query embeddings, the model is loaded once per process"""
+    if model_name not in _models:
+        try:
+            from sentence_transformers import SentenceTransformer  # optional, only for text queries
+        except ImportError:
+            raise SystemExit("Query embeddings need sentence-transformers (pip install sentence-transformers) "
+                             "or precomputed vectors via --vectors") from None
+        _models[model_name] = SentenceTransformer(model_name)
+    return normalise(_models[model_name].encode(list(queries), normalize_embeddings=True))
+
+
+def rrf(rankings, rrf_k=RRF_K) -> list:
+    """[(key, score)] best first, rankings are lists of keys best first, ties keep first appearance"""
+    scores = {}
+    for ranking in rankings:
+        for r, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + r)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
+
+
+def index_keys(chunk_paths, index_ids) -> dict:
+    """
+    chunk doc_id -> the search index doc_ids of the same PDF, one per path it sits under. Indexes built before
+    path based doc_ids used the chunk doc_id itself, so that is tried as well.
+    """
+    out = {}
+    for doc_id, paths in chunk_paths.items():
+        keys = [k for k in [doc_id, *(doc_key("published", p) for p in paths)] if k in index_ids]
+        if keys:
+            out[doc_id] = list(dict.fromkeys(keys))
+    return out
+
+
+def _timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t) * 1000
+
+
+class HybridSearcher:
+    """Keyword index, vector store and chunk texts loaded once, search_batch() answers queries against them"""
+
+    def __init__(self, index_path=INDEX_PATH, vectors_base=VECTORS_BASE, chunks_parquet=CHUNKS_PARQUET,
+                 rank="js", bm25_base=None, nprobe=None, model_name=EMBED_MODEL):
+        self.rank, self.nprobe, self.model_name = rank, nprobe, model_name
+        self.engine = QueryEngine(index_path, bm25_base if rank == "bm25" else None)
+        self.store = load_vectors(vectors_base)
+        self.ivf = load_ivf(vectors_base) if nprobe else None
+        self.chunks = ChunkTexts(chunks_parquet)
+        self.rows_of_doc = doc_rows(self.store)
+        self.doc_index = {d: i for i, d in enumerate(self.store["doc_ids"])}
+        self.index_pos = {d.get("doc_id"): i for i, d in enumerate(self.engine.docs)}
+        self.index_keys = index_keys(self.chunks.paths, self.index_pos)
+        self.chunk_doc = {k: d for d, keys in self.index_keys.items() for k in keys}  # index doc_id -> chunk doc_id
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid")
+
+    def close(self):
+        self.pool.shutdown()
+
+    def keyword(self, queries, keyword_k=KEYWORD_K) -> list:
+        """Per query, doc_ids of the top keyword_k matches"""
+        out = []
+        for q in queries:
+            _, top = self.engine.search(q, keyword_k, self.rank)
+            out.append([self.engine.docs[i].get("doc_id") for i in top])
+        return out
+
+    def vector(self, Q, vector_k=VECTOR_K) -> tuple:
+        """(store rows int64[q, vector_k], scores), one matmul for the whole batch"""
+        if self.ivf is not None:
+            return search_ivf(self.ivf, Q, vector_k, self.nprobe)
+        return search_int8(self.store, Q, vector_k)
+
+    def best_chunk(self, q8, qs, doc_id) -> tuple:
+        """(store row, score) of the chunk doc's chunk closest to the query, (None, None) when it has no chunks"""
+        rows = self.rows_of_doc.get(self.doc_index.get(doc_id, -1))
+        if rows is None:
+            return None, None
+        scores = (np.asarray(self.store["int8"][rows], dtype=np.float32) @ q8.astype(np.float32)) * (qs * np.asarray(self.store["scale"][rows]))
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+    def fused_key(self, chunk_doc, kw_rank) -> str:
+        """Index doc_id a chunk doc is fused under, the copy the keywords ranked best when it sits under several"""
+        keys = self.index_keys.get(chunk_doc)
+        if not keys:
+            return chunk_doc  # not in the index, a vector only result
+        return min(keys, key=lambda d: kw_rank.get(d, len(kw_rank) + 1))
+
+    def _fuse(self, query, kw_ids, rows, scores, q8, qs, k, rrf_k) -> list:
+        kw_rank = {d: r for r, d in enumerate(kw_ids, 1)}
+        # copies of one PDF under several names are one document, at the rank of its best copy
+        kw_ids = list(dict.fromkeys(self.fused_key(self.chunk_doc[d], kw_rank) if d in self.chunk_doc else d for d in kw_ids))
+        kw_rank = {d: r for r, d in enumerate(kw_ids, 1)}
+        # vector side, docs in the order of their best chunk, under their index doc_id
+        vec_ids, vec_best = [], {}
+        for row, score in zip(rows, scores):
+            if row < 0:
+                continue
+            chunk_doc = self.store["doc_ids"][int(self.store["rows"][row, 0])]
+            key = self.fused_key(chunk_doc, kw_rank)
+            if key not in vec_best:
+                vec_best[key] = (chunk_doc, int(row), float(score))
+                vec_ids.append(key)
+        vec_rank = {d: r for r, d in enumerate(vec_ids, 1)}
+        tokens = tokenise_query(query)
+        out = []
+        for doc_id, score in rrf([kw_ids, vec_ids], rrf_k)[:k]:
+            if doc_id in vec_best:
+                chunk_doc, row, chunk_score = vec_best[doc_id]
+            else:
+                chunk_doc = self.chunk_doc.get(doc_id)
+                row, chunk_score = self.best_chunk(q8, qs, chunk_doc)
+            pos = self.index_pos.get(doc_id)
+            doc = self.engine.docs[pos] if pos is not None else {}
+            if row is not None:
+                _, chunk_id = self.store["rows"][row]
+                text = excerpt(self.chunks.text(chunk_doc, chunk_id), tokens)
+            else:
+                chunk_id, text = None, excerpt(doc.get("excerpt"), tokens)
+            out.append({
+                "doc_id": doc_id,
+                "chunk_doc_id": chunk_doc,
+                "name": doc.get("name") or self.store["doc_names"][self.doc_index[chunk_doc]],
+                "score": score,
+                "keyword_rank": kw_rank.get(doc_id),
+                "vector_rank": vec_rank.get(doc_id),
+                "chunk_id": None if chunk_id is None else int(chunk_id),
+                "chunk_score": chunk_score,
+                "excerpt": text,
+            })
+        return out
+
+    def search_batch(self, queries, vectors=None, k=10, keyword_k=KEYWORD_K, vector_k=VECTOR_K, rrf_k=RRF_K) -> tuple:
+        """
+        ([results per query], {component: ms for the whole batch}). The keyword scan (Python, holds the GIL)
+        and the vector matmul (BLAS, releases it) can overlap, total is wall time, not the sum of the parts.
+        """
+        t = time.perf_counter()
+        ms = dict.fromkeys(COMPONENTS, 0.0)
+        if vectors is None:
+            vectors, ms["embed"] = _timed(embed_queries, queries, self.model_name)
+        Q = normalise(vectors)
+        if len(Q) != len(queries) or Q.shape[1] != self.store["dim"]:
+            raise ValueError(f"Need one {self.store['dim']} dim vector per query, got {Q.shape} for {len(queries)} queries")
+        kw = self.pool.submit(_timed, self.keyword, queries, keyword_k)
+        vec = self.pool.submit(_timed, self.vector, Q, vector_k)
+        (kw_ids, ms["keyword"]), ((rows, scores), ms["vector"]) = kw.result(), vec.result()
+
+        f = time.perf_counter()
+        q8, qs = quantise_int8(Q)
+        results = [self._fuse(q, kw_ids[i], rows[i], scores[i], q8[i], qs[i], k, rrf_k) for i, q in enumerate(queries)]
+        ms["fuse"] = (time.perf_counter() - f) * 1000
+        ms["total"] = (time.perf_counter() - t) * 1000
+        return results, ms
+
+    def search(self, query, vector=None, k=10, **kw) -> list:
+        results, _ = self.search_batch([query], None if vector is None else np.atleast_2d(vector), k, **kw)
+        return results[0]
+
+
+def check_joins(searcher) -> tuple:
+    """
+    (PDFs checked, [problems]). Every chunk doc the index also holds is searched by its index name with its
+    first chunk as the query vector, it has to come back as one result carrying both a keyword and a vector rank.
+    Docs the name finds no keyword match for are not checked, the join is what is being tested.
+    """
+    docs = [(d, keys) for d, keys in searcher.index_keys.items() if searcher.doc_index.get(d) in searcher.rows_of_doc]
+    if not docs:
+        return 0, ["no chunk doc maps onto a search index doc_id"]
+    queries, vectors = [], []
+    for d, keys in docs:
+        queries.append(searcher.engine.docs[searcher.index_pos[keys[0]]].get("name") or "")
+        row = int(searcher.rows_of_doc[searcher.doc_index[d]][0])
+        vectors.append(np.asarray(searcher.store["int8"][row], dtype=np.float32) * float(searcher.store["scale"][row]))
+    results, _ = searcher.search_batch(queries, np.stack(vectors), k=KEYWORD_K + VECTOR_K)
+    checked, problems = 0, []
+    for (d, keys), q, hits in zip(docs, queries, results):
+        mine = [h for h in hits if h["doc_id"] in keys or h["doc_id"] == d]
+        if not any(h["keyword_rank"] for h in mine):
+            continue
+        checked += 1
+        if len(mine) != 1 or not mine[0]["vector_rank"]:
+            ranks = ", ".join(f"{h['doc_id']} kw {h['keyword_rank'] or '-'} / vec {h['vector_rank'] or '-'}" for h in mine)
+            problems.append(f"{d} ({q}): {ranks}")
+    return checked, problems
+
+
+def read_vectors(path) -> np.ndarray:
+    p = Path(path)
+    v = np.load(p) if p.suffix == ".npy" else np.asarray(json.loads(p.read_text(encoding="utf-8")), dtype=np.float32)
+    return np.atleast_2d(v).astype(np.float32)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Keyword + chunk vector search fused with reciprocal rank fusion")
+    ap.add_argument("queries", nargs="*", help="Queries, none reads --file or stdin (one per line, # comments skipped)")
+    ap.add_argument("--file", help="File of queries, one per line")
+    ap.add_argument("--vectors", help="Query embeddings (.npy or .json [q, dim], one row per query), skips the model")
+    ap.add_argument("--index", default=str(INDEX_PATH), help=f"Search index, default {INDEX_PATH}")
+    ap.add_argument("--rank", choices=RANKINGS, default="js", help="Keyword ranking, js (search_tool.js order) or bm25")
+    ap.add_argument("--bm25-base", default=str(BM25_BASENAME), help=f"BM25 postings basename, default {BM25_BASENAME}")
+    ap.add_argument("--base", default=str(VECTORS_BASE), help="Vector store basename (vector_search.py convert)")
+    ap.add_argument("--chunks", default=str(CHUNKS_PARQUET), help=f"Chunk texts, default {CHUNKS_PARQUET}")
+    ap.add_argument("--nprobe", type=int, help="Search the IVF index (vector_search.py ivf-build) probing N lists")
+    ap.add_argument("--k", type=int, default=10, help="Documents per query")
+    ap.add_argument("--keyword-k", type=int, default=KEYWORD_K, help="Keyword matches fed to the fusion")
+    ap.add_argument("--vector-k", type=int, default=VECTOR_K, help="Nearest chunks fed to the fusion")
+    ap.add_argument("--rrf-k", type=int, default=RRF_K, help="RRF constant, larger flattens the rank weights")
+    ap.add_argument("--repeat", type=int, default=1, help="Run the batch N times, every run is a latency sample")
+    ap.add_argument("--json", action="store_true", help="One JSON line per query {query, ms, results}")
+    ap.add_argument("--check", action="store_true", help="Check PDFs on both sides fuse into one result, then exit")
+    args = ap.parse_args()
+
+    t = time.perf_counter()
+    searcher = HybridSearcher(args.index, args.base, args.chunks, args.rank, args.bm25_base, args.nprobe)
+    load_ms = (time.perf_counter() - t) * 1000
+    if args.check:
+        checked, problems = check_joins(searcher)
+        searcher.close()
+        print(f"{len(searcher.index_keys)} of {len(searcher.store['doc_ids'])} chunk docs map onto the index, "
+              f"{checked} found by their name and checked, {len(problems)} not fused")
+        for p in problems:
+            print(f"  {p}")
+        sys.exit(1 if problems or not checked else 0)
+    queries = read_queries(args)
+    vectors = read_vectors(args.vectors) if args.vectors else None
+    if vectors is not None and len(vectors) != len(queries):
+        raise SystemExit(f"--vectors holds {len(vectors)} vectors for {len(queries)} queries")
+    if vectors is None and queries:
+        vectors, embed_ms = _timed(embed_queries, queries)  # once, not per repeat
+        print(f"Embedded {len(queries)} queries with {EMBED_MODEL} in {embed_ms:.1f} ms", file=sys.stderr)
+
+    samples = {c: [] for c in COMPONENTS}
+    results = []
+    for _ in range(max(args.repeat, 1)):
+        results, ms = searcher.search_batch(queries, vectors, args.k, args.keyword_k, args.vector_k, args.rrf_k)
+        for c in COMPONENTS:
+            samples[c].append(ms[c] / max(len(queries), 1))
+    searcher.close()
+
+    for q, hits in zip(queries, results):
+        if args.json:
+            print(json.dumps({"query": q, "ms": round(samples["total"][-1], 3), "results": hits}, ensure_ascii=False))
+            continue
+        print(f"\n{q!r}")
+        for r, h in enumerate(hits, 1):
+            ranks = f"kw {h['keyword_rank'] or '-'} / vec {h['vector_rank'] or '-'}"
+            print(f"  {r:>3}  {h['score']:.4f}  {ranks:<18} {h['doc_id']}  {h['name']}")
+            print(f"        chunk {h['chunk_id'] if h['chunk_id'] is not None else '-'}: {h['excerpt'][:160]}")
+
+    # timings to stderr, stdout stays clean for --json
+    print(f"\nLoaded {len(searcher.engine.docs)} docs, {searcher.store['n']} chunk vectors, {len(searcher.chunks)} chunk "
+          f"texts in {load_ms:.1f} ms", file=sys.stderr)
+    print(f"{len(queries)} queries x {max(args.repeat, 1)}, per query ms "
+          f"({'IVF nprobe ' + str(args.nprobe) if args.nprobe else 'int8 brute force'}, {args.rank} keywords):", file=sys.stderr)
+    for c in COMPONENTS[1:]:
+        s = latency_summary(samples[c])
+        if s["n"]:
+            print(f"  {c:<8} mean {s['mean']:.3f}  p50 {s['p50']:.3f}  p90 {s['p90']:.3f}  max {s['max']:.3f}", file=sys.stderr)
@@ -1,29 +1,52 @@
 from pathlib import Path
-import pdfplumber
-from hashlib import sha256
-from sklearn.feature_extraction.text import CountVectorizer
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, deque
+from itertools import islice
 
-import contextlib
-import io
+import os
+import signal
 
+try:
+    import resource  # POSIX only, memory cap is skipped elsewhere
+except ImportError:
+    resource = None
 
-from utils.text_utils import clean_text, extract_summary, lemmatise_filtered_words
 
+from utils.text_utils import page_summary, lemmatise_filtered_words
+from utils.pdf_cache import pdf_pages
+from utils.keywords import term_counts
+from utils.index_state import doc_key, content_sha, is_unchanged, unchanged_record
+
+
+# Parallel extraction, PDF parsing dominates build time on large guidance PDFs
+# PDF_WORKERS=0 keeps the old serial loop, N>0 uses a pool of N processes
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))
+PDF_TIMEOUT_S = int(os.getenv("PDF_TIMEOUT_S", "180"))  # per document, pool mode only
+PDF_MEM_MB = int(os.getenv("PDF_MEM_MB", "2048"))       # per worker address space cap, pool mode only
+PDF_TIMEOUT_GRACE_S = 30  # parent side deadline is timeout + grace, the worker's own alarm should fire first
 
 
 def process_pdf_file(path):
+    # cleaned page text comes from the sha256 keyed cache, unchanged PDFs are never reopened
+    # one page at a time, term counts accumulate as pages go by, so memory does not grow with page count
+    counts, excerpt, fallback = Counter(), "", ""
     try:
-        with contextlib.redirect_stderr(io.StringIO()):  # Suppress PDF warnings
-            with pdfplumber.open(path) as pdf:
-                raw_text = "\n".join([p.extract_text() or "" for p in pdf.pages])
-    except Exception as e:
-        print(f"Skipping {path.name}: {e}")
+        _, pages = pdf_pages(path)
+        for page in pages:
+            if not page:
+                continue
+            counts.update(term_counts(" ".join(lemmatise_filtered_words(page))))
+            if not excerpt:
+                summary, qualifies = page_summary(page)
+                if qualifies:
+                    excerpt = summary
+                elif not fallback:
+                    fallback = summary
+    except Exception as e:  # TimeoutError from the pool's alarm and MemoryError from its cap land here too
+        print(f"Skipping {path.name}: {type(e).__name__} {e}")
         return None
 
-    cleaned_text = clean_text(raw_text)
-    lemmatised = lemmatise_filtered_words(cleaned_text)
-    keyword_text = " ".join(lemmatised)
-
     try:
         folder = path.parts[path.parts.index("data_published") + 1]
         title = f"{folder} {path.stem}".replace("_", " ").title()
@@ -31,44 +54,143 @@ def process_pdf_file(path):
         title = path.stem.replace("_", " ").title()
 
     return {
-        "doc_id": sha256(path.name.encode()).hexdigest()[:12],
+        "doc_id": doc_key("published", path),
         "name": title,
-        "excerpt": extract_summary(cleaned_text),
+        "excerpt": excerpt or fallback,
         "tags": ["published"],
         "url": "",
-        "keywords": keyword_text,
+        "counts": counts,  # build.py takes term counts directly, no document sized keyword string
         "file": path.name
     }
 
 
+def _limit_worker_memory(mem_mb):
+    # pool initializer, a runaway PDF then hits MemoryError in its own worker rather than the machine
+    if resource is None or not mem_mb:
+        return
+    cap = mem_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+    except (ValueError, OSError) as e:
+        print(f"Could not set worker memory cap: {e}")
 
-def load_from_data_published():
-    published_dir = Path("data_published")
-    entries, texts = [], []
 
-    for path in published_dir.rglob("*.pdf"):
-        record = process_pdf_file(path)
+def _on_timeout(signum, frame):
+    raise TimeoutError("extraction timed out")
+
+
+def _process_pdf_guarded(path, timeout_s):
+    # runs in a worker, the alarm is the cheap first line against a pathological document, it only fires
+    # between bytecodes though, a hang inside MuPDF or pdfminer C code is left to the parent's deadline
+    use_alarm = timeout_s and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.alarm(timeout_s)
+    try:
+        return process_pdf_file(path)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+
+def _kill_pool(pool):
+    # workers stuck in C code never return, so the pool is torn down instead of waited on
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        proc.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_pool(paths, indexes, workers, timeout_s, mem_mb, crashed):
+    # yields (i, record) in indexes order, indexes whose worker died are appended to crashed instead
+    # only workers * 2 documents are in flight, finished records never pile up ahead of the consumer
+    # a document with no result timeout_s + PDF_TIMEOUT_GRACE_S after it reached the head of the queue (so it
+    # is running, everything before it has finished) is yielded with record None, its pool killed and the
+    # documents still outstanding resubmitted to a fresh pool
+    todo, pending = deque(indexes), deque()
+    deadline = timeout_s + PDF_TIMEOUT_GRACE_S if timeout_s else None
+    while todo or pending:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_limit_worker_memory, initargs=(mem_mb,))
+        try:
+            def submit(i):
+                try:
+                    pending.append((i, pool.submit(_process_pdf_guarded, paths[i], timeout_s)))
+                except BrokenProcessPool:
+                    crashed.append(i)
+
+            while todo and len(pending) < workers * 2:
+                submit(todo.popleft())
+            while pending:
+                i, fut = pending.popleft()
+                try:
+                    record = fut.result(timeout=deadline)
+                except BrokenProcessPool:
+                    crashed.append(i)
+                except FutureTimeout:
+                    print(f"Skipping {paths[i].name}: no result after {deadline}s, restarting the worker pool")
+                    todo.extendleft(reversed([j for j, _ in pending]))
+                    pending.clear()
+                    _kill_pool(pool)
+                    pool = None
+                    yield i, None
+                    break
+                else:
+                    yield i, record
+                if todo:
+                    submit(todo.popleft())
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+
+def extract_published_parallel(paths, workers, timeout_s=PDF_TIMEOUT_S, mem_mb=PDF_MEM_MB):
+    """
+    Process PDFs in a process pool, (path, record) yielded in the same order as paths.
+    A worker crash breaks the whole pool, so every document caught up in it is retried
+    once in its own single worker pool (yielded after the rest), only the real culprit is then skipped
+    (yielded with record None). A document past its deadline is skipped straight away, the pool
+    is replaced and the documents in flight with it are run again.
+    """
+    crashed = []
+    for i, record in _run_pool(paths, range(len(paths)), workers, timeout_s, mem_mb, crashed):
+        yield paths[i], record
+    for i in sorted(crashed):
+        again = []
+        for _, record in _run_pool(paths, [i], 1, timeout_s, mem_mb, again):
+            yield paths[i], record
+        if again:
+            print(f"Skipping {paths[i].name}: worker crashed twice")
+            yield paths[i], None
+
+
+def load_from_data_published(workers=None, previous=None):
+    published_dir = Path("data_published")
+    workers = PDF_WORKERS if workers is None else workers
+
+    # sorted so output order does not depend on filesystem walk order
+    paths = sorted(published_dir.rglob("*.pdf"))
+    plan = []
+    for path in paths:
+        doc_id, sha = doc_key("published", path), content_sha(path)
+        plan.append((path, doc_id, sha, is_unchanged(previous, doc_id, sha)))
+    todo = [path for path, _, _, same in plan if not same]
+
+    pooled, done = None, {}
+    if workers and workers > 0 and len(todo) > 1:
+        print(f"Extracting {len(todo)} PDFs with {workers} workers (timeout {PDF_TIMEOUT_S}s, cap {PDF_MEM_MB}MB)")
+        pooled = extract_published_parallel(todo, workers)
+
+    # back in path order, pool results that arrive early (crash retries reorder them) wait in done
+    for path, doc_id, sha, same in plan:
+        if same:
+            yield unchanged_record(doc_id, sha)
+            continue
+        if pooled is None:
+            record = process_pdf_file(path)
+        else:
+            while path not in done:
+                p, r = next(pooled)
+                done[p] = r
+            record = done.pop(path)
         if record:
-            texts.append(record["keywords"])
-            entries.append(record)
-
-    if not entries:
-        return []
-
-    vectorizer = CountVectorizer(max_df=0.85, min_df=2)
-    X = vectorizer.fit_transform(texts)
-    features = vectorizer.get_feature_names_out()
-
-    search_index = []
-    for i, record in enumerate(entries):
-        keywords = [features[j] for j in X[i].nonzero()[1]]
-        search_index.append({
-            "doc_id": record["doc_id"],
-            "name": record["name"],
-            "excerpt": record["excerpt"],
-            "tags": record["tags"],
-            "url": record["url"],
-            "keywords": sorted(keywords)
-        })
-
-    return search_index
+            record["sha"] = sha
+            yield record
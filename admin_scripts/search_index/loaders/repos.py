@@ -1,10 +1,9 @@
 from pathlib import Path
-from hashlib import sha256
-from sklearn.feature_extraction.text import CountVectorizer
 import subprocess
 import shutil
 import os
 
+from utils.index_state import doc_key, content_sha, is_unchanged, unchanged_record
 from utils.text_utils import clean_text, extract_summary, lemmatise_filtered_words
 
 # Mapping of short folder name to GitHub repo URL
@@ -86,7 +85,7 @@ def process_repo_file(path, repo_url):
         title = path.stem.replace("_", " ").title()
 
     return {
-        "doc_id": sha256(path.name.encode()).hexdigest()[:12],
+        "doc_id": doc_key("repo", path),
         "name": title,
         "excerpt": extract_summary(cleaned_text),
         "tags": ["repo"],
@@ -95,37 +94,19 @@ def process_repo_file(path, repo_url):
         "file": path.name
     }
 
-def load_from_data_repos(force_refresh=False):
+def load_from_data_repos(force_refresh=False, previous=None):
     fetch_all_repo_files(force_refresh=force_refresh)
 
-    entries, texts = [], []
-
+    # generator, one record at a time, keyword selection happens corpus wide in build.py
     for short_name, repo_url in REPO_REMOTE_URLS.items():
         repo_folder = repo_url.rstrip("/").split("/")[-1]
         repo_dir = CLONE_DIR / repo_folder
         for path in repo_dir.rglob("*.md"):
+            doc_id, sha = doc_key("repo", path), content_sha(path)
+            if is_unchanged(previous, doc_id, sha):
+                yield unchanged_record(doc_id, sha)
+                continue
             record = process_repo_file(path, repo_url)
             if record:
-                texts.append(record["keywords"])
-                entries.append(record)
-
-    if not entries:
-        return []
-
-    vectorizer = CountVectorizer(max_df=0.85, min_df=2)
-    X = vectorizer.fit_transform(texts)
-    features = vectorizer.get_feature_names_out()
-
-    search_index = []
-    for i, record in enumerate(entries):
-        keywords = [features[j] for j in X[i].nonzero()[1]]
-        search_index.append({
-            "doc_id": record["doc_id"],
-            "name": record["name"],
-            "excerpt": record["excerpt"],
-            "tags": record["tags"],
-            "url": record["url"],
-            "keywords": sorted(keywords)
-        })
-
-    return search_index
+                record["sha"] = sha
+                yield record
@@ -1,7 +1,6 @@
 from pathlib import Path
-from hashlib import sha256
-from sklearn.feature_extraction.text import CountVectorizer
 
+from utils.index_state import doc_key, content_sha, is_unchanged, unchanged_record
 from utils.text_utils import clean_text, extract_summary, lemmatise_filtered_words
 
 
@@ -37,7 +36,7 @@ def process_data_web_file(path):
         keyword_text = " ".join(lemmatised)
 
         return {
-            "doc_id": sha256(path.name.encode()).hexdigest()[:12],
+            "doc_id": doc_key("web", path),
             "name": title,
             "excerpt": extract_summary(cleaned_text),
             "tags": tags + ["web"],
@@ -51,32 +50,15 @@ def process_data_web_file(path):
         return None
 
 
-def load_from_data_web():
-    entries, texts = [], []
+def load_from_data_web(previous=None):
+    # generator, one record at a time, keyword selection happens corpus wide in build.py
     for path in Path("data_web").rglob("*"):
         if path.suffix.lower() in [".txt", ".md"]:
+            doc_id, sha = doc_key("web", path), content_sha(path)
+            if is_unchanged(previous, doc_id, sha):
+                yield unchanged_record(doc_id, sha)
+                continue
             record = process_data_web_file(path)
             if record:
-                texts.append(record["keywords"])
-                entries.append(record)
-
-    if not entries:
-        return []
-
-    vectorizer = CountVectorizer(max_df=0.85, min_df=2)
-    X = vectorizer.fit_transform(texts)
-    features = vectorizer.get_feature_names_out()
-
-    search_index = []
-    for i, record in enumerate(entries):
-        keywords = [features[j] for j in X[i].nonzero()[1]]
-        search_index.append({
-            "doc_id": record["doc_id"],
-            "name": record["name"],
-            "excerpt": record["excerpt"],
-            "tags": record["tags"],
-            "url": record["url"],
-            "keywords": sorted(keywords)
-        })
-
-    return search_index
+                record["sha"] = sha
+                yield record
@@ -0,0 +1,153 @@
+import json
+import math
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Precomputed BM25 postings for the site search, ranking work moves from query time to build time.
+# search_bm25.json   header: {version, k1, b, n_docs, avgdl, impact_scale, doc_dtype, terms, df, doc_ids, sections}
+# search_bm25.bin    little endian sections, byte offsets/lengths in header["sections"]
+#   doc_len   uint32[n_docs]        tokens per doc (same count BM25 keyword weighting uses)
+#   offsets   uint32[n_terms + 1]   postings of term t are [offsets[t], offsets[t + 1])
+#   docs      uint16|uint32[P]      doc rows (search_index.json order), ascending within a term
+#   tf        uint8[P]              term frequency, clipped at 255 (BM25 has long saturated by then)
+#   impact    uint8[P]              quantised BM25 term score, score ~= sum(impact) * impact_scale
+# A query touches only the postings of its terms, summing impact bytes per doc is the whole ranking.
+BM25_BASENAME = Path("docs/data/search_bm25")
+BM25_K1, BM25_B = 1.2, 0.75
+SECTION_ORDER = ("doc_len", "offsets", "docs", "tf", "impact")  # widest dtype first keeps every section aligned
+
+
+def bm25_idf(df, n_docs):
+    return np.log(1.0 + (n_docs - np.asarray(df, dtype=np.float64) + 0.5) / (np.asarray(df, dtype=np.float64) + 0.5))
+
+
+def bm25_weight(tf, dl, idf, avgdl, k1=BM25_K1, b=BM25_B):
+    tf = np.asarray(tf, dtype=np.float64)
+    return idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * np.asarray(dl, dtype=np.float64) / (avgdl or 1.0)))
+
+
+@contextmanager
+def bm25_writer(vocab, df, n_docs, avgdl, base=BM25_BASENAME):
+    """
+    Context manager yielding add(X, doc_len, doc_ids) for consecutive batches of the corpus,
+    X a docs x vocab count matrix. Postings are written when the block exits.
+    """
+    parts = {"rows": [], "cols": [], "tf": []}
+    lens, ids = [], []
+
+    def add(X, doc_len, doc_ids):
+        X = X.tocoo()
+        parts["rows"].append(X.row.astype(np.int64) + len(ids))
+        parts["cols"].append(X.col.astype(np.int64))
+        parts["tf"].append(X.data)
+        lens.extend(int(n) for n in doc_len)
+        ids.extend(doc_ids)
+
+    yield add
+
+    rows = np.concatenate(parts["rows"]) if parts["rows"] else np.zeros(0, np.int64)
+    cols = np.concatenate(parts["cols"]) if parts["cols"] else np.zeros(0, np.int64)
+    tf = np.concatenate(parts["tf"]) if parts["tf"] else np.zeros(0, np.float32)
+    order = np.lexsort((rows, cols))
+    rows, cols, tf = rows[order], cols[order], tf[order]
+
+    doc_len = np.asarray(lens, dtype=np.uint32)
+    idf = bm25_idf(df, n_docs)
+    tf_q = np.minimum(tf, 255).astype(np.uint8)
+    w = bm25_weight(tf_q, doc_len[rows], idf[cols], avgdl)
+    scale = float(w.max()) / 255 if w.size and w.max() > 0 else 1.0
+    impact = np.clip(np.ceil(w / scale), 1, 255).astype(np.uint8)  # ceil, a posting never rounds away to 0
+    offsets = np.zeros(len(vocab) + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(cols, minlength=len(vocab)), out=offsets[1:])
+    doc_dtype = np.uint16 if n_docs <= 0xFFFF else np.uint32
+
+    arrays = {"doc_len": doc_len, "offsets": offsets, "docs": rows.astype(doc_dtype), "tf": tf_q, "impact": impact}
+    sections, pos = {}, 0
+    base = Path(base)
+    base.parent.mkdir(parents=True, exist_ok=True)
+    bin_path, head_path = base.with_suffix(".bin"), base.with_suffix(".json")
+    tmp = bin_path.with_name(f"{bin_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        for name in SECTION_ORDER:
+            data = arrays[name].astype(arrays[name].dtype.newbyteorder("<"), copy=False).tobytes()
+            sections[name] = {"offset": pos, "length": len(data), "dtype": arrays[name].dtype.name}
+            f.write(data)
+            pos += len(data)
+    os.replace(tmp, bin_path)
+
+    header = {
+        "version": 1,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "n_docs": n_docs,
+        "avgdl": round(float(avgdl), 4),
+        "impact_scale": scale,
+        "doc_dtype": np.dtype(doc_dtype).name,
+        "terms": list(vocab),
+        "df": [int(d) for d in df],
+        "doc_ids": ids,
+        "sections": sections,
+    }
+    head_path.write_text(json.dumps(header, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    add.report = {"postings": int(rows.size), "terms": len(vocab), "bin_bytes": pos, "header_bytes": head_path.stat().st_size}
+
+
+def load_bm25(base=BM25_BASENAME, mmap=True):
+    """Header dict with numpy views over the binary sections (memory mapped by default)"""
+    base = Path(base)
+    index = json.loads(base.with_suffix(".json").read_text(encoding="utf-8"))
+    raw = np.memmap(base.with_suffix(".bin"), dtype=np.uint8, mode="r") if mmap else np.fromfile(base.with_suffix(".bin"), dtype=np.uint8)
+    for name, s in index["sections"].items():
+        index[name] = raw[s["offset"]:s["offset"] + s["length"]].view(np.dtype(s["dtype"]).newbyteorder("<"))
+    index["term_id"] = {t: i for i, t in enumerate(index["terms"])}
+    return index
+
+
+def impact_scores(index, terms):
+    """Summed impact bytes per doc row for the query terms, uint32[n_docs], multiply by impact_scale for BM25"""
+    acc = np.zeros(index["n_docs"], dtype=np.uint32)
+    for t in set(terms):
+        tid = index["term_id"].get(t)
+        if tid is None:
+            continue
+        lo, hi = int(index["offsets"][tid]), int(index["offsets"][tid + 1])
+        acc[index["docs"][lo:hi]] += index["impact"][lo:hi]
+    return acc
+
+
+def score_impacts(index, terms, k=10):
+    """Fast path, sums impact bytes over the postings of each query term, returns [(doc row, score), ...]"""
+    acc = impact_scores(index, terms)
+    hits = np.flatnonzero(acc)
+    top = hits[np.lexsort((hits, -acc[hits].astype(np.int64)))][:k]
+    return [(int(d), float(acc[d]) * index["impact_scale"]) for d in top]
+
+
+def score_reference(index, terms, k=10):
+    """
+    Plain Python BM25 over the stored tf / doc_len / df, for testing the postings and the impact ranking.
+    score(d) = sum over query terms t of idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    """
+    k1, b, n, avgdl = index["k1"], index["b"], index["n_docs"], index["avgdl"] or 1.0
+    scores = {}
+    for t in set(terms):
+        tid = index["term_id"].get(t)
+        if tid is None:
+            continue
+        df = index["df"][tid]
+        idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        for p in range(int(index["offsets"][tid]), int(index["offsets"][tid + 1])):
+            d, tf = int(index["docs"][p]), int(index["tf"][p])
+            dl = int(index["doc_len"][d])
+            scores[d] = scores.get(d, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+
+
+def analyse_query(text):
+    """Query text through the same lemmatiser and tokeniser as the documents"""
+    from utils.text_utils import lemmatise_filtered_words  # lazy, needs nltk
+    from utils.keywords import term_counts
+    return list(term_counts(" ".join(lemmatise_filtered_words(text))))
@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from .stream import dumps_min
+
+# search_index.json with keywords as integer references into one shared vocabulary, instead of every
+# entry repeating its keyword strings.
+#   {version, encoding: "delta", vocab: [sorted terms used by any entry], entries: [{..., keywords: [ids]}]}
+# ids are stored delta encoded in the entry's own keyword order:
+#   [first id, gap, gap, ...]   decode with a running sum, vocab[id] gives the term back
+# build.py keeps keywords alphabetical, so gaps are small and positive; an index with keywords in
+# another order (e.g. by score) still round trips, its gaps just go negative.
+# Field is "entries" rather than "docs" so search_tool.js cannot mistake it for the plain index.
+IDS_PATH = Path("docs/data/search_index.ids.json")
+
+
+def encode_keywords(terms, term_id) -> list:
+    ids = [term_id[t] for t in terms]
+    return [b - a for a, b in zip([0] + ids[:-1], ids)]
+
+
+def decode_keywords(deltas, vocab) -> list:
+    out, tid = [], 0
+    for d in deltas:
+        tid += d
+        out.append(vocab[tid])
+    return out
+
+
+def expand_ids_index(data) -> list:
+    """Back to the plain search_index.json list"""
+    vocab = data["vocab"]
+    return [dict(e, keywords=decode_keywords(e["keywords"], vocab)) for e in data["entries"]]
+
+
+@contextmanager
+def ids_writer(path=IDS_PATH):
+    """
+    Context manager yielding write(entry). The vocabulary is only known once every entry is seen,
+    so entries are spooled and written after it, vocab is restricted to terms some entry kept.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    used = set()
+
+    def write(entry):
+        used.update(entry["keywords"])
+        spool.write(dumps_min(entry) + "\n")
+        write.count += 1
+    write.count = 0
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        yield write
+
+        vocab = sorted(used)
+        term_id = {t: i for i, t in enumerate(vocab)}
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+                f.write('{"version":1,"encoding":"delta","vocab":' + dumps_min(vocab) + ',"entries":[')
+                spool.seek(0)
+                for i, line in enumerate(spool):
+                    entry = json.loads(line)
+                    entry["keywords"] = encode_keywords(entry["keywords"], term_id)
+                    f.write(("," if i else "") + dumps_min(entry))
+                f.write("]}")
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    write.vocab_size = len(vocab)
+
+
+def compare_sizes(plain_path, ids_path) -> dict:
+    """Raw and gzip bytes of both files, gzip being roughly what the browser transfers"""
+    out = {}
+    for name, p in (("plain", Path(plain_path)), ("ids", Path(ids_path))):
+        raw = p.read_bytes()
+        out[name] = {"bytes": len(raw), "gzip": len(gzip.compress(raw, 6))}
+    return out
+
+
+def round_trip_ok(plain_path, ids_path) -> bool:
+    text = Path(plain_path).read_text(encoding="utf-8")
+    plain = [json.loads(line) for line in text.splitlines()] if str(plain_path).endswith(".ndjson") else json.loads(text)
+    ids = json.loads(Path(ids_path).read_text(encoding="utf-8"))
+    return expand_ids_index(ids) == plain
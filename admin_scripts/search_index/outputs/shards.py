@@ -0,0 +1,112 @@
+import json
+import math
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+from .stream import dumps_min
+
+# Term sharded search index, so a client can fetch the doc table once and then only the postings
+# shards its query terms hash to, instead of the whole search_index.json before the first query.
+#   docs.json          {fields: [doc_id, name, excerpt, url, tags], rows: [[...], ...]}, row number = doc ref
+#   terms_<i>.json     {term: [doc row, ...]} for every keyword whose hash lands in shard i
+#   manifest.json      {version, hash, shards, n_docs, n_terms, docs, files, bytes}
+# Shard of a term: fnv1a_32(utf-8 bytes of term) % shards, cheap to mirror in JS with Math.imul.
+# Shard count is a power of two sized so an average shard is around SEARCH_SHARD_TARGET_KB.
+SHARDS_DIR = Path("docs/data/search_shards")
+SHARD_TARGET_KB = int(os.getenv("SEARCH_SHARD_TARGET_KB", "32"))
+MAX_SHARDS = 256
+DOC_FIELDS = ["doc_id", "name", "excerpt", "url", "tags"]
+FNV_OFFSET, FNV_PRIME = 0x811C9DC5, 0x01000193
+
+
+def fnv1a_32(term: str) -> int:
+    h = FNV_OFFSET
+    for b in term.encode("utf-8"):
+        h = ((h ^ b) * FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+
+def shard_of(term: str, shards: int) -> int:
+    return fnv1a_32(term) % shards
+
+
+def auto_shard_count(postings_bytes: int, target_kb=SHARD_TARGET_KB) -> int:
+    """Smallest power of two keeping the average shard under target_kb, at least 1, at most MAX_SHARDS"""
+    want = max(1, math.ceil(postings_bytes / (target_kb * 1024)))
+    return min(MAX_SHARDS, 1 << (want - 1).bit_length())
+
+
+def _postings_bytes(postings) -> int:
+    # "term":[1,2,3], per entry, close enough to size the shards before writing them
+    return sum(len(t.encode("utf-8")) + 4 + len(",".join(map(str, rows))) + 2 for t, rows in postings.items())
+
+
+@contextmanager
+def sharded_writer(out_dir=SHARDS_DIR, shards=None):
+    """
+    Context manager yielding write(entry), entries are the finished search index dicts.
+    Doc rows stream to disk, postings are held until close (budgeted keywords, same order of size as the output).
+    shards=None sizes the shard count from the postings, write.report holds the byte counts afterwards.
+    """
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(f"{out_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    docs_f = open(tmp_dir / "docs.json", "w", encoding="utf-8", newline="\n")
+    postings = {}
+
+    def write(entry):
+        docs_f.write(("," if write.count else "") + dumps_min([entry.get(f) for f in DOC_FIELDS]))
+        for term in entry["keywords"]:
+            postings.setdefault(term, []).append(write.count)
+        write.count += 1
+    write.count = 0
+
+    try:
+        docs_f.write('{"fields":' + dumps_min(DOC_FIELDS) + ',"rows":[')
+        yield write
+        docs_f.write("]}")
+        docs_f.close()
+
+        n = shards or auto_shard_count(_postings_bytes(postings))
+        buckets = [{} for _ in range(n)]
+        for term in sorted(postings):
+            buckets[shard_of(term, n)][term] = postings[term]
+        files, sizes = [], []
+        for i, bucket in enumerate(buckets):
+            name = f"terms_{i}.json"
+            (tmp_dir / name).write_text(dumps_min(bucket), encoding="utf-8")
+            files.append(name)
+            sizes.append((tmp_dir / name).stat().st_size)
+
+        docs_bytes = (tmp_dir / "docs.json").stat().st_size
+        write.report = {
+            "docs": docs_bytes,
+            "shards_total": sum(sizes),
+            "shard_min": min(sizes),
+            "shard_mean": round(sum(sizes) / n),
+            "shard_max": max(sizes),
+            "total": docs_bytes + sum(sizes),
+        }
+        manifest = {
+            "version": 1,
+            "hash": "fnv1a32",
+            "shards": n,
+            "n_docs": write.count,
+            "n_terms": len(postings),
+            "docs": "docs.json",
+            "files": files,
+            "bytes": write.report,
+        }
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+        # swap the whole folder, stale shards from a bigger previous build go with it
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+        write.manifest = manifest
+    except BaseException:
+        docs_f.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
@@ -0,0 +1,47 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+# Streamed search index writers, entries go to disk one at a time instead of one json.dump of the whole list.
+# json     minified array, same shape search_tool.js has always loaded
+# ndjson   one minified entry per line, for downstream tools (jq, pandas read_json(lines=True), DuckDB)
+# Written to <name>.<pid>.tmp and swapped in on success, a failed build leaves the previous index in place.
+FORMATS = ("json", "ndjson")
+SUFFIX = {"json": ".json", "ndjson": ".ndjson"}
+
+
+def dumps_min(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+@contextmanager
+def index_writer(path, fmt="json"):
+    """Context manager yielding write(entry), count of entries written is available as write.count"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown search index format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    f = open(tmp, "w", encoding="utf-8", newline="\n")
+
+    def write(entry):
+        if fmt == "ndjson":
+            f.write(dumps_min(entry) + "\n")
+        else:
+            f.write(("," if write.count else "") + dumps_min(entry))
+        write.count += 1
+    write.count = 0
+
+    try:
+        if fmt == "json":
+            f.write("[")
+        yield write
+        if fmt == "json":
+            f.write("]")
+        f.close()
+        os.replace(tmp, path)
+    except BaseException:
+        f.close()
+        tmp.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,165 @@
+# python admin_scripts/search_index/query.py "social care" "early help"
+# python admin_scripts/search_index/query.py --file queries.txt --rank bm25 --repeat 20
+# cat queries.txt | python admin_scripts/search_index/query.py --json > results.ndjson
+import argparse
+import json
+import mmap
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from outputs.bm25 import BM25_BASENAME, impact_scores, load_bm25, analyse_query
+from outputs.keyword_ids import expand_ids_index
+
+# Local query engine over the published search index, so ranking and latency can be tested without a browser.
+# Matching is search_tool.js's, rule for rule:
+#   query trimmed + lower cased, under 3 characters returns nothing, split on whitespace
+#   a doc matches when every token is a substring of "name\nexcerpt\nkeywords" (tags when keywords missing)
+#   order: docs whose name contains the first token first, then shorter names, stable otherwise
+# --rank bm25 keeps the same matched set and reorders it by the precomputed BM25 postings (outputs/bm25.py),
+# ties keep the search_tool.js order. The index is loaded once, haystacks are built at load, not per query.
+INDEX_PATH = Path("docs/data/search_index.json")
+RANKINGS = ("js", "bm25")
+MIN_QUERY_CHARS = 3
+JS_RESULT_LIMIT = 50  # search_tool.js renders at most 50 results
+
+
+def load_index(path=INDEX_PATH) -> list:
+    """
+    search_index.json entries as a list. Accepts the plain array, {docs|index|items: [...]},
+    search_index.ndjson (scanned line by line through mmap) and search_index.ids.json (expanded).
+    """
+    path = Path(path)
+    if path.suffix == ".ndjson":
+        with open(path, "rb") as f:
+            if path.stat().st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return [json.loads(line) for line in iter(mm.readline, b"") if line.strip()]
+    data = json.loads(path.read_bytes())
+    if isinstance(data, dict) and "encoding" in data:
+        return expand_ids_index(data)
+    if isinstance(data, dict):
+        data = data.get("index") or data.get("items") or data.get("docs") or []
+    if not isinstance(data, list):
+        raise ValueError(f"Unexpected search index shape in {path} (not an array)")
+    return data
+
+
+def _haystack(d) -> str:
+    # same fallbacks as search_tool.js
+    name = str(d.get("name") or d.get("title") or d.get("label") or d.get("doc_id") or "").lower()
+    excerpt = str(d.get("excerpt") or d.get("summary") or "").lower()
+    kws = d.get("keywords") if isinstance(d.get("keywords"), list) else (d.get("tags") if isinstance(d.get("tags"), list) else [])
+    return f"{name}\n{excerpt}\n{' '.join(map(str, kws)).lower()}"
+
+
+def tokenise_query(query) -> list:
+    q = (query or "").strip().lower()
+    return q.split() if len(q) >= MIN_QUERY_CHARS else []
+
+
+class QueryEngine:
+    """search_index.json loaded once, search() answers queries against it"""
+
+    def __init__(self, index_path=INDEX_PATH, bm25_base=None):
+        self.docs = load_index(index_path)
+        self.hay = [_haystack(d) for d in self.docs]
+        self.name_lc = [str(d.get("name") or "").lower() for d in self.docs]
+        self.bm25 = self.bm25_rows = None
+        if bm25_base:
+            self.bm25 = load_bm25(bm25_base, mmap=True)
+            row_of = {doc_id: i for i, doc_id in enumerate(self.bm25["doc_ids"])}
+            # index position -> postings row, -1 when the postings predate the doc (scores 0)
+            self.bm25_rows = np.array([row_of.get(d.get("doc_id"), -1) for d in self.docs], dtype=np.int64)
+
+    def match(self, query) -> list:
+        """Positions of matched docs in search_tool.js order"""
+        tokens = tokenise_query(query)
+        if not tokens:
+            return []
+        hits = [i for i, h in enumerate(self.hay) if all(t in h for t in tokens)]
+        first = tokens[0]
+        hits.sort(key=lambda i: (0 if first in self.name_lc[i] else 1, len(self.name_lc[i])))
+        return hits
+
+    def bm25_scores(self, query) -> np.ndarray:
+        """BM25 score per index position (0 for docs without postings)"""
+        acc = impact_scores(self.bm25, analyse_query(query)).astype(np.float64) * self.bm25["impact_scale"]
+        rows = self.bm25_rows
+        return np.where(rows >= 0, acc[np.maximum(rows, 0)], 0.0)
+
+    def search(self, query, limit=JS_RESULT_LIMIT, rank="js") -> tuple:
+        """(matched doc count, [index positions] of the top limit), rank js | bm25"""
+        if rank not in RANKINGS:
+            raise ValueError(f"Unknown ranking {rank!r}, expected one of {', '.join(RANKINGS)}")
+        hits = self.match(query)
+        if rank == "bm25" and hits:
+            if self.bm25 is None:
+                raise ValueError("BM25 ranking needs postings, build with --bm25 and pass bm25_base")
+            scores = self.bm25_scores(query)
+            hits.sort(key=lambda i: -scores[i])  # stable, ties keep the search_tool.js order
+        return len(hits), hits[:limit]
+
+
+def latency_summary(samples_ms) -> dict:
+    s = np.asarray(samples_ms, dtype=np.float64)
+    if not s.size:
+        return {"n": 0}
+    p50, p90, p99 = np.percentile(s, [50, 90, 99])
+    return {"n": int(s.size), "mean": float(s.mean()), "p50": float(p50), "p90": float(p90), "p99": float(p99), "max": float(s.max())}
+
+
+def read_queries(args) -> list:
+    if args.queries:
+        return args.queries
+    lines = Path(args.file).read_text(encoding="utf-8").splitlines() if args.file else sys.stdin.read().splitlines()
+    return [q for q in (line.strip() for line in lines) if q and not q.startswith("#")]
+
+
+def run_batch(engine, queries, limit, rank, repeat=1, out=sys.stdout, as_json=False):
+    """Answer every query (repeat times, for steadier timings), print results, return latency samples in ms"""
+    samples = []
+    for q in queries:
+        for _ in range(max(repeat, 1)):
+            t = time.perf_counter()
+            n, top = engine.search(q, limit, rank)
+            samples.append((time.perf_counter() - t) * 1000)
+        ms = samples[-1]
+        if as_json:
+            out.write(json.dumps({"query": q, "matches": n, "ms": round(ms, 3),
+                                  "hits": [engine.docs[i].get("doc_id") for i in top]}, ensure_ascii=False) + "\n")
+        else:
+            out.write(f"{q!r}: {n} matches, {ms:.2f} ms\n")
+            for r, i in enumerate(top, 1):
+                out.write(f"  {r:>3}  {engine.docs[i].get('doc_id', '')}  {engine.docs[i].get('name', '')}\n")
+    return samples
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Query docs/data/search_index.json with the search_tool.js matching rules")
+    ap.add_argument("queries", nargs="*", help="Queries, none reads --file or stdin (one per line, # comments skipped)")
+    ap.add_argument("--file", help="File of queries, one per line")
+    ap.add_argument("--index", default=str(INDEX_PATH), help=f"Search index (.json, .ndjson or .ids.json), default {INDEX_PATH}")
+    ap.add_argument("--rank", choices=RANKINGS, default="js", help="js (search_tool.js order) or bm25 (needs build.py --bm25)")
+    ap.add_argument("--bm25-base", default=str(BM25_BASENAME), help=f"BM25 postings basename, default {BM25_BASENAME}")
+    ap.add_argument("--limit", type=int, default=10, help=f"Results per query, search_tool.js shows {JS_RESULT_LIMIT}")
+    ap.add_argument("--repeat", type=int, default=1, help="Run each query N times, every run is a latency sample")
+    ap.add_argument("--json", action="store_true", help="One JSON line per query {query, matches, ms, hits: [doc_id]}")
+    args = ap.parse_args()
+
+    t = time.perf_counter()
+    engine = QueryEngine(args.index, args.bm25_base if args.rank == "bm25" else None)
+    load_ms = (time.perf_counter() - t) * 1000
+    queries = read_queries(args)
+    samples = run_batch(engine, queries, args.limit, args.rank, args.repeat, as_json=args.json)
+
+    # timings to stderr, stdout stays clean for --json
+    s = latency_summary(samples)
+    print(f"\nLoaded {len(engine.docs)} docs from {args.index} in {load_ms:.1f} ms", file=sys.stderr)
+    if s["n"]:
+        print(f"{len(queries)} queries x {max(args.repeat, 1)}, {args.rank} ranking: mean {s['mean']:.3f}  p50 {s['p50']:.3f}  "
+              f"p90 {s['p90']:.3f}  p99 {s['p99']:.3f}  max {s['max']:.3f} ms  ({1000 / s['mean'] if s['mean'] else 0:.0f} q/s)",
+              file=sys.stderr)
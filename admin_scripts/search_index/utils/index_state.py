@@ -0,0 +1,63 @@
+import json
+from hashlib import sha256
+from pathlib import Path
+
+from .pdf_cache import file_sha256
+
+# Incremental search index builds.
+# doc_id is sha256("<source>:<relative posix path>")[:12], so two repos' README.md no longer collide and
+# an entry can be matched to its file across runs. The content hash is the file's SHA-256.
+# index_state.ndjson keeps, per doc, what pass 1 of build.py produces:
+#   line 1     {"version": STATE_VERSION}
+#   then       [entry (keywords unset), term counts, doc length, content sha]
+# A file whose doc_id and sha match the previous state is not cleaned, lemmatised or counted again,
+# its state line is copied across. Files no longer found simply are not copied, so they drop out.
+STATE_PATH = Path(__file__).resolve().parents[1] / ".cache" / "index_state.ndjson"
+STATE_VERSION = 1  # bump when cleaning / lemmatising / counting changes, forces a full rebuild
+
+
+def doc_key(source, path) -> str:
+    return sha256(f"{source}:{Path(path).as_posix()}".encode()).hexdigest()[:12]
+
+
+def content_sha(path) -> str:
+    return file_sha256(path)
+
+
+def is_unchanged(previous, doc_id, sha) -> bool:
+    return bool(previous) and previous.get(doc_id) == sha
+
+
+def unchanged_record(doc_id, sha) -> dict:
+    """Stand in a loader yields instead of reprocessing, build.py copies the state line"""
+    return {"doc_id": doc_id, "sha": sha, "unchanged": True}
+
+
+def load_state(path=STATE_PATH):
+    """({doc_id: sha}, {doc_id: byte offset of its line}) from a previous build, empty when missing or stale"""
+    path = Path(path)
+    if not path.exists():
+        return {}, {}
+    shas, offsets = {}, {}
+    with open(path, "rb") as f:
+        try:
+            head = json.loads(f.readline() or b"{}")
+        except json.JSONDecodeError:
+            head = {}
+        if head.get("version") != STATE_VERSION:
+            print(f"Ignoring {path.name}, written by state version {head.get('version')}")
+            return {}, {}
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            entry, _, _, sha = json.loads(line)
+            shas[entry["doc_id"]] = sha
+            offsets[entry["doc_id"]] = pos
+    return shas, offsets
+
+
+def read_state_line(f, offset) -> str:
+    f.seek(offset)
+    return f.readline().decode("utf-8")
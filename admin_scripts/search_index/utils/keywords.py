@@ -0,0 +1,110 @@
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+# Corpus wide keyword selection for search_index.json.
+# One vocabulary and one set of document frequencies across every source (web, yml, repos, published),
+# then each document keeps only its KEYWORD_BUDGET highest weighted terms instead of every surviving feature.
+# Vocabulary rules match the CountVectorizer(max_df=0.85, min_df=2) the loaders used to fit per source.
+KEYWORD_BUDGET = int(os.getenv("KEYWORD_BUDGET", "60"))             # per document, 0 = keep every surviving term
+KEYWORD_WEIGHTING = os.getenv("KEYWORD_WEIGHTING", "tfidf").lower()  # tfidf | bm25
+MIN_DF = 2
+MAX_DF = 0.85
+BM25_K1, BM25_B = 1.2, 0.75
+
+WEIGHTINGS = ("tfidf", "bm25")
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")  # CountVectorizer default token_pattern
+
+
+def term_counts(text) -> Counter:
+    return Counter(TOKEN_RE.findall(text.lower()))
+
+
+def build_vocabulary(df, n_docs, min_df=MIN_DF, max_df=MAX_DF) -> list:
+    """Sorted terms with min_df <= df <= max_df, float bounds are proportions of n_docs as in sklearn"""
+    lo = min_df if isinstance(min_df, int) else math.ceil(min_df * n_docs)
+    hi = max_df if isinstance(max_df, int) else max_df * n_docs
+    return sorted(t for t, n in df.items() if lo <= n <= hi)
+
+
+def count_matrix(counts, vocab) -> sparse.csr_matrix:
+    """docs x vocab term counts, columns in vocab (alphabetical) order, out of vocabulary terms dropped"""
+    col = {t: j for j, t in enumerate(vocab)}
+    indptr, indices, data = [0], [], []
+    for c in counts:
+        hits = sorted((col[t], n) for t, n in c.items() if t in col)
+        indices.extend(j for j, _ in hits)
+        data.extend(n for _, n in hits)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(vocab)),
+    )
+
+
+def weight_rows(X, df, n_docs, weighting=KEYWORD_WEIGHTING, doc_len=None, avgdl=None) -> sparse.csr_matrix:
+    """
+    Reweight a count matrix in place of its data array.
+    tfidf  (1 + log tf) * smoothed idf, sklearn's sublinear_tf + smooth_idf form
+    bm25   Okapi term weight with k1=1.2, b=0.75, doc_len defaults to the in vocabulary token count,
+           pass the corpus avgdl when X is only a batch of the corpus
+    Row normalisation is skipped, it does not change the order of terms within a row.
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Unknown keyword weighting {weighting!r}, expected one of {', '.join(WEIGHTINGS)}")
+    W = X.tocsr(copy=True).astype(np.float32)
+    df = np.asarray(df, dtype=np.float64)
+    tf = W.data.astype(np.float64)
+    cols = W.indices
+    if weighting == "tfidf":
+        idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+        W.data = ((1.0 + np.log(tf)) * idf[cols]).astype(np.float32)
+    else:
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        dl = np.asarray(X.sum(axis=1)).ravel() if doc_len is None else np.asarray(doc_len, dtype=np.float64)
+        if avgdl is None:
+            avgdl = dl.mean() if dl.size else 0.0
+        avgdl = avgdl or 1.0
+        rows = np.repeat(np.arange(W.shape[0]), np.diff(W.indptr))
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * dl[rows] / avgdl)
+        W.data = (idf[cols] * tf * (BM25_K1 + 1.0) / (tf + norm)).astype(np.float32)
+    return W
+
+
+def top_k_per_row(W, k) -> list:
+    """
+    Column indices of the k highest weights in each CSR row, one argsort over the whole matrix
+    rather than a Python loop per row. Ties go to the lower column (alphabetical term).
+    Each row's result comes back in ascending column order, k <= 0 keeps every stored entry.
+    """
+    W = W.tocsr()
+    W.sort_indices()
+    lengths = np.diff(W.indptr)
+    if k and k > 0:
+        rows = np.repeat(np.arange(W.shape[0]), lengths)
+        # rows is the primary key, so sorted position p still belongs to rows[p]
+        order = np.lexsort((W.indices, -W.data, rows))
+        rank = np.arange(order.size) - W.indptr[rows]
+        keep = np.sort(order[rank < k])
+        lengths = np.minimum(lengths, k)
+        cols = W.indices[keep]
+    else:
+        cols = W.indices
+    return np.split(cols, np.cumsum(lengths)[:-1]) if len(lengths) else []
+
+
+def batch_keywords(X, doc_len, df_vec, terms, n_docs, avgdl, budget=KEYWORD_BUDGET, weighting=KEYWORD_WEIGHTING) -> list:
+    """
+    Keyword lists for one batch of the corpus, X its docs x vocab count matrix (count_matrix),
+    weighted with corpus wide statistics (df_vec per vocab term, n_docs, avgdl), so a corpus can be
+    processed a batch at a time. terms is the vocab as a numpy object array.
+    """
+    if X.shape[0] == 0:
+        return []
+    W = weight_rows(X, df_vec, n_docs, weighting, doc_len=doc_len, avgdl=avgdl)
+    return [terms[cols].tolist() for cols in top_k_per_row(W, budget)]
+
@@ -0,0 +1,125 @@
+import gzip
+import json
+import os
+from hashlib import sha256
+from pathlib import Path
+
+from .pdf_text import PDF_TEXT_BACKEND, consume_pages
+
+# Local PDF extraction cache keyed by file SHA-256 (same hash state.json records per doc),
+# shared by the search index build and admin-re-build-sources-page.py so an unchanged PDF is never parsed twice.
+# Entries are per preferred backend (PDF_TEXT_BACKEND), switching backend re-extracts rather than mixing texts.
+# <sha>.<backend>.json     meta: {v, sha256, backend (the one that actually read the file), pages, words, source_name}
+# <sha>.<backend>.txt.gz   cleaned text, one page per "\f" separated block
+# Both directions stream a page at a time, so memory stays flat however long the document is.
+CACHE_DIR = Path(__file__).resolve().parents[1] / ".cache" / "pdf_extract"
+CACHE_VERSION = 1
+PAGE_SEP = "\f"
+READ_BLOCK = 64 * 1024
+
+
+def file_sha256(path, block=1024 * 1024):
+    h = sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _paths(sha, preferred=None):
+    stem = f"{sha}.{preferred or PDF_TEXT_BACKEND}"
+    return CACHE_DIR / f"{stem}.json", CACHE_DIR / f"{stem}.txt.gz"
+
+
+def _atomic_write(path, data: bytes):
+    # tmp + replace, pool workers may race on duplicate files with the same hash
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _read_meta(sha):
+    meta_path, text_path = _paths(sha)
+    if not meta_path.exists() or not text_path.exists():
+        return None
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    return meta if meta.get("v") == CACHE_VERSION else None
+
+
+def _extract(path, sha):
+    from .text_utils import clean_text  # lazy, cache hits need no nltk
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    meta_path, text_path = _paths(sha)
+    tmp = text_path.with_name(f"{text_path.name}.{os.getpid()}.tmp")
+
+    def write_pages(_, raw_pages):
+        # restarted from scratch by consume_pages if the backend fails part way, so reopen the tmp each time
+        pages = words = 0
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+            for raw in raw_pages:
+                f.write((PAGE_SEP if pages else "") + clean_text(raw))
+                words += len(raw.split())  # raw word count, as the sources page reports
+                pages += 1
+        return pages, words
+
+    try:
+        backend, (pages, words) = consume_pages(path, write_pages)
+        os.replace(tmp, text_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    meta = {
+        "v": CACHE_VERSION,
+        "sha256": sha,
+        "backend": backend,
+        "pages": pages,
+        "words": words,
+        "source_name": Path(path).name,
+    }
+    _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+    return meta
+
+
+def _cached_meta(path):
+    sha = file_sha256(path)
+    return sha, _read_meta(sha) or _extract(path, sha)
+
+
+def _read_pages(text_path):
+    with gzip.open(text_path, "rt", encoding="utf-8", newline="") as f:
+        buf = f.read(READ_BLOCK)
+        if not buf:
+            return  # no pages at all, as opposed to one empty page
+        while True:
+            *done, buf = buf.split(PAGE_SEP)
+            yield from done
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            buf += block
+        yield buf
+
+
+def pdf_stats(path):
+    """Cached {sha256, pages, words, ...} for a PDF, extracts and caches on a miss, raises if unreadable"""
+    return _cached_meta(path)[1]
+
+
+def pdf_pages(path):
+    """
+    Cached (meta, iterator of cleaned page texts) for a PDF, extracts and caches on a miss, raises if
+    unreadable. Pages are read back one at a time from the cache file, never the whole document.
+    """
+    sha, meta = _cached_meta(path)
+    return meta, _read_pages(_paths(sha)[1])
+
+
+def pdf_text(path):
+    """Cached (meta, [cleaned page texts]) for a PDF, the whole document in memory, see pdf_pages"""
+    meta, pages = pdf_pages(path)
+    return meta, list(pages)
@@ -0,0 +1,99 @@
+import logging
+import os
+
+# PDF text extraction backends, raw page strings one page at a time.
+# PyMuPDF is the fast path (2-5x pdfplumber on our guidance PDFs, see docs/dev-data_source_optimisation.md),
+# pdfplumber is kept as the fallback for documents PyMuPDF cannot open or is not installed for.
+# PDF_TEXT_BACKEND picks the preferred backend, the others are tried in BACKENDS order if it fails.
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24 only ships the fitz name
+    except ImportError:
+        pymupdf = None
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+BACKENDS = ("pymupdf", "pdfplumber")
+PDF_TEXT_BACKEND = os.getenv("PDF_TEXT_BACKEND", "pymupdf").strip().lower()
+
+if pymupdf is not None and hasattr(pymupdf, "TOOLS"):
+    pymupdf.TOOLS.mupdf_display_errors(False)  # MuPDF writes repair warnings straight to stderr
+# pdfplumber's warnings come through pdfminer's loggers, silenced here rather than by swapping sys.stderr,
+# which a paused page generator would otherwise hold for the whole process
+logging.getLogger("pdfminer").setLevel(logging.ERROR)
+
+
+def _pages_pymupdf(path):
+    with pymupdf.open(path) as doc:
+        for page in doc:
+            yield page.get_text("text", sort=True) or ""
+
+
+def _pages_pdfplumber(path):
+    with pdfplumber.open(path) as pdf:
+        for p in pdf.pages:
+            text = p.extract_text() or ""
+            p.close()  # drop the parsed layout, pdfplumber otherwise keeps every page's objects alive
+            yield text
+
+
+_EXTRACTORS = {
+    "pymupdf": (lambda: pymupdf is not None, _pages_pymupdf),
+    "pdfplumber": (lambda: pdfplumber is not None, _pages_pdfplumber),
+}
+
+
+def available_backends():
+    return [name for name in BACKENDS if _EXTRACTORS[name][0]()]
+
+
+def backend_order(preferred=None):
+    preferred = (preferred or PDF_TEXT_BACKEND).lower()
+    if preferred not in _EXTRACTORS:
+        raise ValueError(f"Unknown PDF_TEXT_BACKEND {preferred!r}, expected one of {', '.join(BACKENDS)}")
+    return [preferred] + [b for b in BACKENDS if b != preferred]
+
+
+def iter_pages_with(path, backend):
+    """Raw page texts one at a time from one named backend, no fallback"""
+    installed, pages = _EXTRACTORS[backend]
+    if not installed():
+        raise ImportError(f"PDF backend {backend} is not installed")
+    return pages(path)
+
+
+def extract_pages_with(path, backend):
+    """Raw page texts from one named backend, no fallback (benchmarking, debugging)"""
+    return list(iter_pages_with(path, backend))
+
+
+def consume_pages(path, consume, preferred=None):
+    """
+    Run consume(backend, page_iterator) with the preferred backend, any failure (even part way through
+    the document) restarts consume from scratch with the next installed backend, so consume must be
+    safe to repeat. Returns (backend_used, consume's result), the preferred backend's error is raised
+    if none can read the file.
+    """
+    first_err = None
+    for backend in backend_order(preferred):
+        if not _EXTRACTORS[backend][0]():
+            continue
+        try:
+            return backend, consume(backend, _EXTRACTORS[backend][1](path))
+        except (TimeoutError, MemoryError):
+            raise  # pool guards in loaders/published.py, retrying here would only double the damage
+        except Exception as e:
+            first_err = first_err or e
+    if first_err is None:
+        raise ImportError(f"No PDF backend installed, pip install one of: {', '.join(BACKENDS)}")
+    raise first_err
+
+
+def extract_pages(path, preferred=None):
+    """Raw page texts for a PDF as (backend_used, [page_text, ...]), fallback as consume_pages"""
+    return consume_pages(path, lambda _, pages: list(pages), preferred)
@@ -0,0 +1,305 @@
+# python admin_scripts/search_index/vector_search.py convert --float32
+# python admin_scripts/search_index/vector_search.py search --vector query.npy --k 10
+# python admin_scripts/search_index/vector_search.py search --row 0,17,250 --exact --repeat 20
+# python admin_scripts/search_index/vector_search.py ivf-build --nlist 64
+# python admin_scripts/search_index/vector_search.py ivf-bench --nprobe 1,2,4,8,16 --scale 100000
+# python admin_scripts/search_index/vector_search.py pq-build --m 48
+# python admin_scripts/search_index/vector_search.py pq-bench --m 16,32,48,96 --rerank 10
+# python admin_scripts/search_index/vector_search.py export-shards --nprobe 1,2,4
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from query import latency_summary
+from vectors.store import (VECTORS_PARQUET, VECTORS_BASE, convert_vectors, load_vectors, chunk_ref, iter_parquet_vectors,
+                           normalise, quantise_int8, search_int8, search_float32, recall_at_k)
+from vectors.ivf import KMEANS_ITERS, build_ivf, load_ivf, search_ivf, list_sizes
+from vectors.shards import SHARDS_DIR, SHARD_TARGET_KB, export_shards, ShardReader
+from vectors.pq import PQ_M, PQ_KSUB, PQ_ITERS, build_pq, build_pq_from_parquet, search_adc, rerank_int8, decode, pq_bytes
+
+# Offline semantic search over docs/data/csc_artifacts/motw_vectors.parquet (see vectors/store.py).
+# No embedding model is loaded here, queries are precomputed vectors (all-MiniLM-L6-v2, 384 dims):
+#   --vector  .npy of shape [dim] or [q, dim], or a .json list / list of lists
+#   --row     stored chunk rows as queries ("more like this chunk"), handy for checking the maths offline
+
+
+def read_query_vectors(args, store) -> np.ndarray:
+    if args.vector:
+        p = Path(args.vector)
+        v = np.load(p) if p.suffix == ".npy" else np.asarray(json.loads(p.read_text(encoding="utf-8")), dtype=np.float32)
+        v = np.atleast_2d(v).astype(np.float32)
+    elif args.row:
+        rows = [int(r) for r in args.row.split(",")]
+        v = np.asarray(store["f32"][rows]) if "f32" in store else np.asarray(store["int8"][rows], np.float32) * np.asarray(store["scale"][rows])[:, None]
+    else:
+        raise SystemExit("search needs --vector or --row")
+    if v.shape[1] != store["dim"]:
+        raise SystemExit(f"Query vectors are {v.shape[1]} dims, the store is {store['dim']}")
+    return v
+
+
+def timed(fn, repeat):
+    samples, out = [], None
+    for _ in range(max(repeat, 1)):
+        t = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return out, samples
+
+
+def cmd_convert(args):
+    t = time.perf_counter()
+    m = convert_vectors(args.parquet, args.base, args.float32)
+    base = Path(args.base)
+    sizes = {k: base.with_name(name).stat().st_size for k, name in m["files"].items()}
+    print(f"Converted {m['n']} x {m['dim']} {m['storage']} vectors from {m['source']} in {time.perf_counter() - t:.2f} s")
+    print(f"   {len(m['doc_ids'])} docs, parquet {m['source_bytes'] / 1024:.1f} KB")
+    for k, b in sizes.items():
+        print(f"   {m['files'][k]:<32}{b / 1024:>10.1f} KB")
+
+
+def cmd_search(args):
+    store = load_vectors(args.base)
+    queries = read_query_vectors(args, store)
+    (rows, scores), samples = timed(lambda: search_int8(store, queries, args.k), args.repeat)
+    for qi in range(len(queries)):
+        print(f"\nquery {qi}")
+        for r, (row, score) in enumerate(zip(rows[qi], scores[qi]), 1):
+            doc_id, chunk_id, name = chunk_ref(store, row)
+            print(f"  {r:>3}  {score:.4f}  row {row:<7} {doc_id}  chunk {chunk_id:<5} {name}")
+
+    s = latency_summary([ms / len(queries) for ms in samples])
+    print(f"\nint8 brute force over {store['n']} rows, {len(queries)} queries x {max(args.repeat, 1)}: "
+          f"per query p50 {s['p50']:.3f}  p90 {s['p90']:.3f}  max {s['max']:.3f} ms", file=sys.stderr)
+    if args.exact:
+        (truth, _), fs = timed(lambda: search_float32(store, queries, args.k), args.repeat)
+        f = latency_summary([ms / len(queries) for ms in fs])
+        print(f"float32 brute force: per query p50 {f['p50']:.3f} ms, int8 recall@{args.k} vs float32 "
+              f"{recall_at_k(rows, truth):.4f}", file=sys.stderr)
+
+
+def noisy_queries(store, count, noise, seed=0) -> np.ndarray:
+    """Stored vectors plus gaussian noise of about noise x their length, stand ins for real query embeddings"""
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(store["n"], size=min(count, store["n"]), replace=False))
+    x = np.asarray(store["int8"][rows], np.float32) * np.asarray(store["scale"][rows])[:, None]
+    x = normalise(x)
+    return normalise(x + rng.normal(scale=noise / np.sqrt(store["dim"]), size=x.shape).astype(np.float32))
+
+
+def synthetic_store(store, n, noise=0.5, seed=0, block=65536) -> dict:
+    """In memory store of n vectors jittered from the real ones, to benchmark at corpus sizes we do not have yet"""
+    rng = np.random.default_rng(seed)
+    out = {"n": n, "dim": store["dim"], "int8": np.empty((n, store["dim"]), np.int8), "scale": np.empty(n, np.float32)}
+    for lo in range(0, n, block):
+        hi = min(lo + block, n)
+        src = rng.integers(0, store["n"], size=hi - lo)
+        x = np.asarray(store["int8"][np.sort(src)], np.float32) * np.asarray(store["scale"][np.sort(src)])[:, None]
+        x = normalise(normalise(x) + rng.normal(scale=noise / np.sqrt(store["dim"]), size=x.shape).astype(np.float32))
+        out["int8"][lo:hi], out["scale"][lo:hi] = quantise_int8(x)
+    return out
+
+
+def cmd_ivf_build(args):
+    store = load_vectors(args.base)
+    t = time.perf_counter()
+    ivf = build_ivf(store, args.nlist, args.iters, base=args.base)
+    sizes = list_sizes(ivf)
+    print(f"Built IVF over {ivf['n']} vectors in {time.perf_counter() - t:.2f} s: {ivf['nlist']} lists, "
+          f"list size min/median/max {sizes.min()}/{int(np.median(sizes))}/{sizes.max()}")
+
+
+def cmd_ivf_bench(args):
+    store = load_vectors(args.base)
+    if args.scale:
+        store = synthetic_store(store, args.scale, args.noise)
+        print(f"Synthetic store: {store['n']} vectors jittered from the real {load_vectors(args.base)['n']}")
+    queries = noisy_queries(store, args.queries, args.noise, seed=1)
+
+    t = time.perf_counter()
+    ivf = build_ivf(store, args.nlist, args.iters) if args.scale or args.rebuild else load_ivf(args.base)
+    if args.scale or args.rebuild:
+        print(f"IVF built in {time.perf_counter() - t:.2f} s")
+
+    # truth is the int8 brute force, IVF scores the same int8 codes, so recall measures the probing alone
+    truth, _ = search_int8(store, queries, args.k)
+    bf_ms = latency_summary([min(timed(lambda: search_int8(store, queries[qi:qi + 1], args.k), args.repeat)[1])
+                             for qi in range(min(len(queries), 50))])["p50"]
+    sizes = list_sizes(ivf)
+    print(f"\n{store['n']} vectors, {ivf['nlist']} lists (median {int(np.median(sizes))} per list), "
+          f"{len(queries)} queries, recall@{args.k} against int8 brute force (p50 {bf_ms:.3f} ms/query)")
+    print(f"{'nprobe':>8}{'recall':>9}{'scanned':>10}{'p50 ms':>9}{'p90 ms':>9}{'speedup':>9}")
+    for nprobe in (int(p) for p in args.nprobe.split(",")):
+        samples = []
+        for qi in range(len(queries)):
+            _, s = timed(lambda: search_ivf(ivf, queries[qi:qi + 1], args.k, nprobe), args.repeat)
+            samples.append(min(s))
+        found, _ = search_ivf(ivf, queries, args.k, nprobe)
+        lat = latency_summary(samples)
+        scanned = nprobe * np.mean(sizes) / store["n"]
+        print(f"{nprobe:>8}{recall_at_k(found, truth):>9.4f}{scanned:>9.1%}{lat['p50']:>9.3f}{lat['p90']:>9.3f}"
+              f"{bf_ms / lat['p50'] if lat['p50'] else 0:>8.1f}x")
+
+
+def cmd_pq_build(args):
+    t = time.perf_counter()
+    pq = build_pq_from_parquet(args.parquet, args.m, args.ksub, args.iters, base=args.base)
+    raw = pq["n"] * pq["dim"]
+    print(f"Built PQ codes for {pq['n']} vectors in {time.perf_counter() - t:.2f} s: m={pq['m']} x {pq['ksub']} centroids, "
+          f"{pq['m']} bytes a vector ({raw * 4 / (pq['n'] * pq['m']):.0f}x smaller than float32, {raw / (pq['n'] * pq['m']):.0f}x than uint8), "
+          f"{pq_bytes(pq) / 1024:.1f} KB with codebooks")
+
+
+def mean_cosine(X, approx) -> float:
+    """Reconstruction quality, mean cosine of each (normalised) vector with its approximation"""
+    return float(np.mean(np.einsum("ij,ij->i", X, approx) / np.maximum(np.linalg.norm(approx, axis=1), 1e-12)))
+
+
+def per_query_ms(fn, queries, repeat):
+    return latency_summary([min(timed(lambda: fn(queries[qi:qi + 1]), repeat)[1]) for qi in range(len(queries))])
+
+
+def cmd_pq_bench(args):
+    store = load_vectors(args.base)
+    if args.scale:
+        # synthetic vectors only exist as int8, their float32 baseline is the dequantised codes
+        store = synthetic_store(store, args.scale, args.noise)
+        X = normalise(np.asarray(store["int8"], np.float32) * store["scale"][:, None])
+    else:
+        X = np.asarray(store["f32"]) if "f32" in store else np.concatenate([x for *_, x in iter_parquet_vectors(store["source"])])
+    queries = noisy_queries(store, args.queries, args.noise, seed=1)
+    n, dim, k = store["n"], store["dim"], args.k
+    f32_store = dict(store, f32=X)
+    truth, _ = search_float32(f32_store, queries, k)
+
+    rows = []
+    lat = per_query_ms(lambda q: search_float32(f32_store, q, k), queries, args.repeat)
+    rows.append(("float32", n * dim * 4, dim * 4, 1.0, lat["p50"], 1.0))
+    # the store's int8 codes take the same byte a dim as the parquet's uint8, plus a float32 scale
+    found, _ = search_int8(store, queries, k)
+    lat = per_query_ms(lambda q: search_int8(store, q, k), queries, args.repeat)
+    rows.append(("uint8 / int8", n * (dim + 4), dim + 4, recall_at_k(found, truth), lat["p50"],
+                 mean_cosine(X, np.asarray(store["int8"], np.float32) * np.asarray(store["scale"])[:, None])))
+    for m in (int(x) for x in args.m.split(",")):
+        t = time.perf_counter()
+        pq = build_pq(X, m, args.ksub, args.iters)
+        build_s = time.perf_counter() - t
+        found, _ = search_adc(pq, queries, k)
+        lat = per_query_ms(lambda q: search_adc(pq, q, k), queries, args.repeat)
+        cos = mean_cosine(X, decode(pq["codes"], pq["codebooks"]))
+        rows.append((f"PQ m={m} ({build_s:.1f}s)", pq_bytes(pq), m, recall_at_k(found, truth), lat["p50"], cos))
+        if args.rerank:
+            # PQ shortlist of k * rerank, re-scored from the int8 store, which then has to be kept as well
+            refine = lambda q: rerank_int8(store, q, search_adc(pq, q, k * args.rerank)[0], k)
+            found, _ = refine(queries)
+            lat = per_query_ms(refine, queries, args.repeat)
+            rows.append((f"  + int8 rerank x{args.rerank}", pq_bytes(pq) + n * (dim + 4), m + dim + 4,
+                         recall_at_k(found, truth), lat["p50"], cos))
+
+    print(f"\n{n} vectors x {dim} dims, {len(queries)} noisy queries, recall@{k} against float32 brute force")
+    # total KB includes the PQ codebooks (ksub * dim floats), they dominate on a corpus this small
+    print(f"{'method':<22}{'KB':>11}{'B/vector':>10}{'vs f32':>8}{'recall':>9}{'p50 ms':>9}{'cos(x, x~)':>12}")
+    for name, b, per_vec, rec, p50, cos in rows:
+        print(f"{name:<22}{b / 1024:>11.1f}{per_vec:>10}{n * dim * 4 / b:>7.1f}x{rec:>9.4f}{p50:>9.3f}{cos:>12.4f}")
+
+
+def cmd_export_shards(args):
+    store = load_vectors(args.base)
+    t = time.perf_counter()
+    m = export_shards(store, args.out, args.nlist, args.iters, target_kb=args.target_kb)
+    b = m["bytes"]
+    print(f"Exported {m['n']} vectors into {m['nlist']} shards under {args.out} in {time.perf_counter() - t:.2f} s")
+    print(f"   manifest {b['manifest'] / 1024:.1f} KB, centroids {b['centroids'] / 1024:.1f} KB, shards "
+          f"{b['shards_total'] / 1024:.1f} KB (min / mean / max {b['shard_min'] / 1024:.1f} / {b['shard_mean'] / 1024:.1f} / "
+          f"{b['shard_max'] / 1024:.1f} KB), total {b['total'] / 1024:.1f} KB, parquet {store['source_bytes'] / 1024:.1f} KB")
+
+    # what a browser would fetch, read back through the files, recall against int8 brute force over the store
+    reader = ShardReader(args.out)
+    queries = noisy_queries(store, args.queries, args.noise, seed=1)
+    truth, _ = search_int8(store, queries, args.k)
+    truth_keys = [{chunk_ref(store, r)[:2] for r in row} for row in truth]
+    print(f"\nfirst query fetches manifest + centroids, {reader.startup_bytes / 1024:.1f} KB, then per query "
+          f"({len(queries)} noisy queries, recall@{args.k} against int8 brute force):")
+    print(f"{'nprobe':>8}{'mean KB':>10}{'max KB':>9}{'of all':>9}{'recall':>9}")
+    for nprobe in (int(p) for p in args.nprobe.split(",")):
+        fetched, recall = [], []
+        for q, want in zip(queries, truth_keys):
+            hits, nbytes = reader.search(q, args.k, nprobe)
+            fetched.append(nbytes)
+            recall.append(len({h[:2] for h in hits} & want) / max(len(want), 1))
+        print(f"{nprobe:>8}{np.mean(fetched) / 1024:>10.1f}{max(fetched) / 1024:>9.1f}"
+              f"{np.mean(fetched) / b['shards_total']:>8.1%}{np.mean(recall):>9.4f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local vector search over motw_vectors.parquet")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    c = sub.add_parser("convert", help="Parquet -> memory mappable int8 matrix, scales and row -> chunk map")
+    c.add_argument("--parquet", default=str(VECTORS_PARQUET), help=f"Vectors parquet, default {VECTORS_PARQUET}")
+    c.add_argument("--float32", action="store_true", help="Also keep the float32 vectors, the exact baseline for benchmarks")
+    c.set_defaults(run=cmd_convert)
+
+    s = sub.add_parser("search", help="Brute force top k cosine over the int8 matrix")
+    s.add_argument("--vector", help="Query vector(s), .npy or .json")
+    s.add_argument("--row", help="Comma separated store rows to use as query vectors")
+    s.add_argument("--k", type=int, default=10)
+    s.add_argument("--repeat", type=int, default=1, help="Run the batch N times, every run is a latency sample")
+    s.add_argument("--exact", action="store_true", help="Also run the float32 baseline and report int8 recall against it")
+    s.set_defaults(run=cmd_search)
+
+    b = sub.add_parser("ivf-build", help="Train the k-means coarse quantiser and write the flat inverted lists")
+    b.add_argument("--nlist", type=int, help="Number of lists, default ~4 sqrt(n)")
+    b.add_argument("--iters", type=int, default=KMEANS_ITERS, help="k-means iterations")
+    b.set_defaults(run=cmd_ivf_build)
+
+    i = sub.add_parser("ivf-bench", help="IVF recall@k and latency against brute force, per nprobe")
+    i.add_argument("--nprobe", default="1,2,4,8,16,32", help="Comma separated nprobe values")
+    i.add_argument("--k", type=int, default=10)
+    i.add_argument("--queries", type=int, default=200, help="Noisy copies of stored vectors used as queries")
+    i.add_argument("--noise", type=float, default=0.5, help="Query / synthetic jitter, relative to vector length")
+    i.add_argument("--scale", type=int, help="Benchmark a synthetic store of this many vectors (IVF built in memory)")
+    i.add_argument("--nlist", type=int, help="Lists for an in memory build, default ~4 sqrt(n)")
+    i.add_argument("--iters", type=int, default=KMEANS_ITERS)
+    i.add_argument("--rebuild", action="store_true", help="Build the IVF in memory instead of loading ivf-build's")
+    i.add_argument("--repeat", type=int, default=3, help="Runs per query, the fastest counts")
+    i.set_defaults(run=cmd_ivf_bench)
+
+    q = sub.add_parser("pq-build", help="Train PQ codebooks on motw_vectors.parquet and write the codes")
+    q.add_argument("--parquet", default=str(VECTORS_PARQUET), help=f"Vectors parquet, default {VECTORS_PARQUET}")
+    q.add_argument("--m", type=int, default=PQ_M, help="Sub-vectors (bytes per vector), must divide the dims, env PQ_M")
+    q.add_argument("--ksub", type=int, default=PQ_KSUB, help="Centroids per sub-vector codebook, at most 256")
+    q.add_argument("--iters", type=int, default=PQ_ITERS, help="k-means iterations per codebook")
+    q.set_defaults(run=cmd_pq_build)
+
+    r = sub.add_parser("pq-bench", help="Memory, recall@k and query time of PQ against uint8 / int8 and float32")
+    r.add_argument("--m", default="16,32,48,96", help="Comma separated sub-vector counts to train and compare")
+    r.add_argument("--ksub", type=int, default=PQ_KSUB)
+    r.add_argument("--iters", type=int, default=PQ_ITERS)
+    r.add_argument("--k", type=int, default=10)
+    r.add_argument("--queries", type=int, default=100, help="Noisy copies of stored vectors used as queries")
+    r.add_argument("--noise", type=float, default=0.5, help="Query jitter, relative to vector length")
+    r.add_argument("--repeat", type=int, default=3, help="Runs per query, the fastest counts")
+    r.add_argument("--scale", type=int, help="Benchmark a synthetic store of this many vectors instead")
+    r.add_argument("--rerank", type=int, default=0, help="Also report PQ shortlists of k x N re-scored from the int8 store")
+    r.set_defaults(run=cmd_pq_bench)
+
+    e = sub.add_parser("export-shards", help="Browser ready int8 shards clustered by IVF centroid, with a manifest")
+    e.add_argument("--out", default=str(SHARDS_DIR), help=f"Output folder, replaced whole, default {SHARDS_DIR}")
+    e.add_argument("--target-kb", type=int, default=SHARD_TARGET_KB, help="Average shard size the list count is chosen for")
+    e.add_argument("--nlist", type=int, help="Number of shards, overrides --target-kb")
+    e.add_argument("--iters", type=int, default=KMEANS_ITERS)
+    e.add_argument("--nprobe", default="1,2,4,8", help="Comma separated shards fetched per query, for the report")
+    e.add_argument("--k", type=int, default=10)
+    e.add_argument("--queries", type=int, default=200, help="Noisy copies of stored vectors used as queries")
+    e.add_argument("--noise", type=float, default=0.5, help="Query jitter, relative to vector length")
+    e.set_defaults(run=cmd_export_shards)
+
+    for p in (c, s, b, i, q, r, e):
+        p.add_argument("--base", default=str(VECTORS_BASE), help="Output / store basename, default under search_index/.cache/vectors")
+    args = ap.parse_args()
+    args.run(args)
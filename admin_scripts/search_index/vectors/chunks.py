@@ -0,0 +1,73 @@
+from pathlib import Path, PureWindowsPath
+
+import numpy as np
+
+# Chunk text lookup over motw_chunks.parquet (doc_id, chunk_id, source_path, source_name, text), the same
+# chunks, in the same order, as motw_vectors.parquet, so a vector store row maps to its text by (doc_id, chunk_id).
+# Only the key columns are read up front, texts are read a row group at a time on first use and kept.
+# doc_id here is the first 16 hex of the PDF's SHA-256 (chunk_build.py), paths[doc_id] lists the
+# data_published paths it was chunked from, more than one when the same bytes sit under two names.
+CHUNKS_PARQUET = Path("docs/data/csc_artifacts/motw_chunks.parquet")
+
+
+class ChunkTexts:
+    """text(doc_id, chunk_id), "" for chunks the parquet does not hold"""
+
+    def __init__(self, parquet_path=CHUNKS_PARQUET):
+        import pyarrow.parquet as pq  # lazy, like the vector store
+
+        self.pf = pq.ParquetFile(parquet_path)
+        self.where = {}  # (doc_id, chunk_id) -> (row group, row within it)
+        self.paths = {}  # doc_id -> posix source paths
+        for g in range(self.pf.metadata.num_row_groups):
+            keys = self.pf.read_row_group(g, columns=["doc_id", "chunk_id", "source_path"])
+            chunk_ids = keys.column("chunk_id").to_numpy().tolist()
+            for r, (d, c) in enumerate(zip(keys.column("doc_id").to_pylist(), chunk_ids)):
+                self.where.setdefault((d, int(c)), (g, r))
+            for d, p in set(zip(keys.column("doc_id").to_pylist(), keys.column("source_path").to_pylist())):
+                if p:
+                    paths = self.paths.setdefault(d, [])
+                    if posix_path(p) not in paths:
+                        paths.append(posix_path(p))
+        self.groups = {}
+
+    def __len__(self):
+        return len(self.where)
+
+    def text(self, doc_id, chunk_id) -> str:
+        at = self.where.get((doc_id, int(chunk_id)))
+        if at is None:
+            return ""
+        g, r = at
+        if g not in self.groups:
+            self.groups[g] = self.pf.read_row_group(g, columns=["text"]).column("text").to_pylist()
+        return self.groups[g][r] or ""
+
+
+def posix_path(p) -> str:
+    # the notebook writes Windows paths (data_published\x.pdf)
+    return PureWindowsPath(p).as_posix() if "\\" in str(p) else Path(p).as_posix()
+
+
+def excerpt(text, tokens, max_chars=300) -> str:
+    """max_chars of text around the first query token it contains (the start when none), cut at spaces"""
+    text = " ".join(str(text or "").split())
+    if len(text) <= max_chars:
+        return text
+    low = text.lower()
+    hits = [p for p in (low.find(t) for t in tokens) if p >= 0]
+    start = max(0, min(hits) - max_chars // 4) if hits else 0
+    start = min(start, len(text) - max_chars)
+    if start:
+        start = text.find(" ", start) + 1 or start
+    end = text.rfind(" ", start, start + max_chars)
+    end = end if end > start else start + max_chars
+    return ("… " if start else "") + text[start:end] + (" …" if end < len(text) else "")
+
+
+def doc_rows(store) -> dict:
+    """doc index -> int64 array of its store rows, for scoring every chunk of one doc"""
+    docs = np.asarray(store["rows"][:, 0])
+    order = np.argsort(docs, kind="stable")
+    bounds = np.flatnonzero(np.diff(docs[order])) + 1
+    return {int(docs[g[0]]): g for g in np.split(order, bounds) if g.size}
@@ -0,0 +1,161 @@
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .store import VECTORS_BASE, SEARCH_BLOCK, normalise, quantise_int8, store_stamp, check_stamp
+
+# Inverted file (IVF) index over the int8 store, NumPy only, so the deep search index can be rebuilt and
+# tested here rather than copied in as a FAISS binary.
+# Coarse quantiser: spherical k-means (inner product on normalised vectors) into nlist centroids.
+# Inverted lists are flat arrays, rows grouped by list so probing a list is one contiguous slice:
+#   <base>.ivf.json          {version, nlist, n, dim, iters, seed, store, files}, store the stamp of the
+#                            store it was built from (store.py), a changed store is refused at load
+#   <base>.ivf.centroids.npy float32[nlist, dim]   normalised centroids
+#   <base>.ivf.offsets.npy   int64[nlist + 1]       list j holds positions [offsets[j], offsets[j + 1])
+#   <base>.ivf.rows.npy      int32[n]               position -> store row (chunk map via the store)
+#   <base>.ivf.int8.npy      int8[n, dim]           store codes in list order
+#   <base>.ivf.scale.npy     float32[n]             store scales in list order
+# A query scores the centroids, then only the vectors in its nprobe best lists, nprobe = nlist is exact.
+IVF_VERSION = 1
+KMEANS_ITERS = 20
+KMEANS_SAMPLE_PER_LIST = 256  # training sample cap, as FAISS does, k-means quality saturates well before
+
+
+def default_nlist(n) -> int:
+    """~4 sqrt(n) lists, the usual IVF rule of thumb (about 1.3k lists at 100k chunks)"""
+    return max(1, min(n, int(round(4 * math.sqrt(n)))))
+
+
+def _dequantised(store, lo, hi):
+    return np.asarray(store["int8"][lo:hi], dtype=np.float32) * np.asarray(store["scale"][lo:hi], dtype=np.float32)[:, None]
+
+
+def assign(X, centroids, block=SEARCH_BLOCK) -> np.ndarray:
+    """Index of the best (inner product) centroid for each row of X"""
+    out = np.empty(len(X), dtype=np.int64)
+    for lo in range(0, len(X), block):
+        out[lo:lo + block] = np.argmax(np.asarray(X[lo:lo + block], dtype=np.float32) @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(X, nlist, iters=KMEANS_ITERS, seed=0) -> np.ndarray:
+    """
+    Spherical k-means, X normalised float32 rows. Initialised from a random sample of rows, an empty
+    cluster is re-seeded with the row its centroid currently fits worst. Returns normalised centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    centroids = X[rng.choice(n, size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(X, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            fit = np.einsum("ij,ij->i", X, centroids[labels])
+            sums[empty] = X[np.argsort(fit)[:empty.size]]
+        new = normalise(sums)
+        if np.allclose(new, centroids, atol=1e-6):
+            break
+        centroids = new
+    return centroids
+
+
+def _files(base):
+    base = Path(base)
+    return {name: base.with_name(f"{base.name}.ivf.{name}.npy") for name in ("centroids", "offsets", "rows", "int8", "scale")}
+
+
+def build_ivf(store, nlist=None, iters=KMEANS_ITERS, seed=0, base=None) -> dict:
+    """
+    Train the coarse quantiser on a sample, assign every store row, lay the lists out flat.
+    Writes the files above when base is given, returns the index dict either way.
+    """
+    n, dim = store["n"], store["dim"]
+    nlist = min(nlist or default_nlist(n), n)  # k-means needs a distinct vector per centroid
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(n, nlist * KMEANS_SAMPLE_PER_LIST), replace=False))
+    train = normalise(np.asarray(store["int8"][sample], dtype=np.float32) * np.asarray(store["scale"][sample])[:, None])
+    centroids = kmeans(train, nlist, iters, seed)
+
+    labels = np.empty(n, dtype=np.int64)
+    for lo in range(0, n, SEARCH_BLOCK):
+        hi = min(lo + SEARCH_BLOCK, n)
+        labels[lo:hi] = assign(_dequantised(store, lo, hi), centroids)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+    ivf = {
+        "version": IVF_VERSION, "nlist": nlist, "n": n, "dim": dim, "iters": iters, "seed": seed, "store": store_stamp(store),
+        "centroids": centroids.astype(np.float32), "offsets": offsets, "rows": order.astype(np.int32),
+        "int8": np.asarray(store["int8"])[order], "scale": np.asarray(store["scale"])[order],
+    }
+    if base is not None:
+        save_ivf(ivf, base)
+    return ivf
+
+
+def save_ivf(ivf, base=VECTORS_BASE):
+    files = _files(base)
+    for name, path in files.items():
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, ivf[name])
+        os.replace(tmp, path)
+    head = {k: ivf[k] for k in ("version", "nlist", "n", "dim", "iters", "seed", "store")}
+    head["files"] = {k: p.name for k, p in files.items()}
+    Path(base).with_name(f"{Path(base).name}.ivf.json").write_text(json.dumps(head, indent=2), encoding="utf-8")
+
+
+def load_ivf(base=VECTORS_BASE, mmap=True) -> dict:
+    base = Path(base)
+    head = base.with_name(f"{base.name}.ivf.json")
+    if not head.exists():
+        raise FileNotFoundError(f"{head} not found, run vector_search.py ivf-build first")
+    ivf = json.loads(head.read_text(encoding="utf-8"))
+    if ivf.get("version") != IVF_VERSION:
+        raise ValueError(f"{head.name} is IVF version {ivf.get('version')}, re-run vector_search.py ivf-build")
+    check_stamp(head, ivf.get("store"), base, "vector_search.py ivf-build")
+    for k, name in ivf["files"].items():
+        ivf[k] = np.load(base.with_name(name), mmap_mode="r" if mmap and k in ("rows", "int8", "scale") else None)
+    return ivf
+
+
+def list_sizes(ivf) -> np.ndarray:
+    return np.diff(np.asarray(ivf["offsets"]))
+
+
+def search_ivf(ivf, queries, k=10, nprobe=8) -> tuple:
+    """
+    Approximate top k cosine, queries float[q, dim]. Per query the nprobe best centroids are probed,
+    their list slices scored with the same int8 matmul + rescale as the brute force search.
+    Returns (store rows int64[q, k], scores float32[q, k]), best first, -1 / -inf padding when the
+    probed lists hold fewer than k vectors.
+    """
+    Q = normalise(queries)
+    q8, qs = quantise_int8(Q)
+    offsets, C = np.asarray(ivf["offsets"]), ivf["centroids"]
+    nprobe = max(1, min(nprobe, ivf["nlist"]))
+    probe = np.argpartition(-(Q @ C.T), nprobe - 1, axis=1)[:, :nprobe] if nprobe < ivf["nlist"] else \
+        np.broadcast_to(np.arange(ivf["nlist"]), (len(Q), ivf["nlist"]))
+    out_i = np.full((len(Q), k), -1, dtype=np.int64)
+    out_s = np.full((len(Q), k), -np.inf, dtype=np.float32)
+    for qi in range(len(Q)):
+        lists = np.sort(probe[qi])  # ascending list order reads the flat arrays front to back
+        starts, lens = offsets[lists], offsets[lists + 1] - offsets[lists]
+        total = int(lens.sum())
+        if not total:
+            continue
+        # positions of every probed vector, one gather and one matmul instead of a loop over lists
+        pos = np.repeat(starts - np.concatenate(([0], np.cumsum(lens)[:-1])), lens) + np.arange(total)
+        scores = (np.asarray(ivf["int8"][pos], dtype=np.float32) @ q8[qi].astype(np.float32)) * (qs[qi] * np.asarray(ivf["scale"][pos]))
+        m = min(k, total)
+        top = np.argpartition(-scores, m - 1)[:m] if total > m else np.arange(total)
+        top = top[np.lexsort((pos[top], -scores[top]))]
+        out_i[qi, :m] = np.asarray(ivf["rows"])[pos[top]]
+        out_s[qi, :m] = scores[top]
+    return out_i, out_s
@@ -0,0 +1,222 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .store import (VECTORS_PARQUET, VECTORS_BASE, SEARCH_BLOCK, normalise, quantise_int8, parquet_info, iter_parquet_vectors,
+                    source_stamp, check_stamp)
+
+# Product quantisation (PQ) for the chunk vectors, the compression half of the IVF-PQ the docs mention.
+# Each vector is split into m sub-vectors of dim / m values, each sub-vector replaced by the id of its nearest
+# centroid in that subspace's codebook of ksub centroids (ksub <= 256, so one uint8 per sub-vector):
+#   384 dims, m = 48  ->  48 bytes a vector, vs 384 for the uint8 / int8 store and 1536 for float32
+# Search is asymmetric (ADC): the query stays float, per query a lookup table LUT[j, c] = q_j . codebook[j, c]
+# is built once, a stored vector's score is then the sum of m table lookups, no decoding needed.
+#   <base>.pq.json            {version, m, ksub, dim, n, iters, seed, store, files}, store the stamp of the
+#                             store the rows follow (store.py), a changed store is refused at load
+#   <base>.pq.codebooks.npy   float32[m, ksub, dim / m]
+#   <base>.pq.codes.npy       uint8[n, m], rows in store order (chunk map via the store)
+PQ_VERSION = 1
+PQ_M = int(os.getenv("PQ_M", "48"))
+PQ_KSUB = 256
+PQ_ITERS = 25
+PQ_TRAIN_MAX = 65536  # rows sampled to train the codebooks
+
+
+def kmeans_l2(X, k, iters=PQ_ITERS, seed=0) -> np.ndarray:
+    """Plain Euclidean k-means on the rows of X, empty clusters re-seeded with the worst fitted rows"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(X))
+    centroids = X[rng.choice(len(X), size=k, replace=False)].copy()
+    for _ in range(iters):
+        d = (X * X).sum(1)[:, None] - 2.0 * X @ centroids.T + (centroids * centroids).sum(1)[None, :]
+        labels = d.argmin(1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        new = sums / np.maximum(counts, 1)[:, None]
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            worst = np.argsort(-d[np.arange(len(X)), labels])[:empty.size]
+            new[empty] = X[worst]
+        if np.allclose(new, centroids, atol=1e-7):
+            break
+        centroids = new.astype(np.float32)
+    return centroids
+
+
+def train_pq(X, m=PQ_M, ksub=PQ_KSUB, iters=PQ_ITERS, seed=0) -> np.ndarray:
+    """Codebooks float32[m, ksub, dim / m] trained on the rows of X"""
+    X = np.asarray(X, dtype=np.float32)
+    n, dim = X.shape
+    if dim % m:
+        raise ValueError(f"{dim} dims do not split into {m} sub-vectors")
+    if not 1 < ksub <= 256:
+        raise ValueError("ksub must be in 2..256, codes are one uint8 per sub-vector")
+    dsub = dim // m
+    rng = np.random.default_rng(seed)
+    if n > PQ_TRAIN_MAX:
+        X = X[np.sort(rng.choice(n, size=PQ_TRAIN_MAX, replace=False))]
+    books = np.zeros((m, ksub, dsub), dtype=np.float32)
+    for j in range(m):
+        c = kmeans_l2(np.ascontiguousarray(X[:, j * dsub:(j + 1) * dsub]), ksub, iters, seed + j)
+        books[j, :len(c)] = c
+        if len(c) < ksub:
+            books[j, len(c):] = c[0]  # fewer training rows than ksub, never the nearest so never used
+    return books
+
+
+def encode(X, books, block=None) -> np.ndarray:
+    """uint8[n, m] nearest codebook entry per sub-vector"""
+    m, ksub, dsub = books.shape
+    block = block or max(1, (1 << 24) // (m * ksub))  # keeps the [block, m, ksub] score buffer at 64MB
+    norms = (books * books).sum(2)  # [m, ksub]
+    codes = np.empty((len(X), m), dtype=np.uint8)
+    for lo in range(0, len(X), block):
+        xb = np.asarray(X[lo:lo + block], dtype=np.float32).reshape(-1, m, dsub)
+        # argmin |x - c|^2 = argmax 2 x.c - |c|^2, per subspace
+        scores = 2.0 * np.einsum("nmd,mkd->nmk", xb, books) - norms[None]
+        codes[lo:lo + block] = scores.argmax(2)
+    return codes
+
+
+def decode(codes, books) -> np.ndarray:
+    """float32[n, dim] reconstruction, concatenated codebook entries"""
+    m = books.shape[0]
+    return books[np.arange(m)[None, :], np.asarray(codes, dtype=np.int64)].reshape(len(codes), -1)
+
+
+def adc_tables(queries, books) -> np.ndarray:
+    """float32[q, m, ksub] inner product of each query sub-vector with every codebook entry"""
+    m, ksub, dsub = books.shape
+    Q = normalise(queries).reshape(-1, m, dsub)
+    return np.einsum("qmd,mkd->qmk", Q, books).astype(np.float32)
+
+
+def search_adc(pq, queries, k=10, block=SEARCH_BLOCK) -> tuple:
+    """
+    Top k by asymmetric distance (inner product, cosine on normalised vectors) over the PQ codes.
+    Returns (store rows int64[q, k], approximate scores float32[q, k]), best first.
+    """
+    codes, books, n = pq["codes"], pq["codebooks"], pq["n"]
+    luts = adc_tables(queries, books).reshape(len(queries), -1)  # flattened, entry j * ksub + c
+    m, ksub = books.shape[:2]
+    k = min(k, n)
+    flat_offset = (np.arange(m) * ksub)[None, :]
+    best = [(np.zeros(0, np.float32), np.zeros(0, np.int64)) for _ in range(len(luts))]
+    for lo in range(0, n, block):
+        c = np.asarray(codes[lo:lo + block], dtype=np.intp) + flat_offset  # shared by every query in the batch
+        for qi, lut in enumerate(luts):
+            scores = lut[c].sum(1)  # m lookups per vector
+            kk = min(k, len(scores))
+            top = np.argpartition(-scores, kk - 1)[:kk] if len(scores) > kk else np.arange(len(scores))
+            s, i = np.concatenate([best[qi][0], scores[top]]), np.concatenate([best[qi][1], top + lo])
+            keep = np.argpartition(-s, k - 1)[:k] if len(s) > k else np.arange(len(s))
+            best[qi] = (s[keep], i[keep])
+    out_i = np.empty((len(luts), k), dtype=np.int64)
+    out_s = np.empty((len(luts), k), dtype=np.float32)
+    for qi, (s, i) in enumerate(best):
+        order = np.lexsort((i, -s))
+        out_i[qi], out_s[qi] = i[order], s[order]
+    return out_i, out_s
+
+
+def rerank_int8(store, queries, candidates, k=10) -> tuple:
+    """
+    Re-score PQ shortlists (store rows int[q, c], -1 padded) from the int8 store, the usual IVF-PQ refine
+    step: PQ narrows the search cheaply, the 8-bit scores pick the final k. Returns (rows, scores) best first.
+    """
+    q8, qs = quantise_int8(normalise(queries))
+    out_i = np.full((len(q8), k), -1, dtype=np.int64)
+    out_s = np.full((len(q8), k), -np.inf, dtype=np.float32)
+    for qi, cand in enumerate(np.asarray(candidates)):
+        rows = np.unique(cand[cand >= 0])  # ascending, reads the memory mapped store front to back
+        if not rows.size:
+            continue
+        scores = (np.asarray(store["int8"][rows], dtype=np.float32) @ q8[qi].astype(np.float32)) * (qs[qi] * np.asarray(store["scale"][rows]))
+        order = np.lexsort((rows, -scores))[:k]
+        out_i[qi, :len(order)], out_s[qi, :len(order)] = rows[order], scores[order]
+    return out_i, out_s
+
+
+def build_pq(X, m=PQ_M, ksub=PQ_KSUB, iters=PQ_ITERS, seed=0, base=None, stamp=None) -> dict:
+    """
+    Train on X (float32 normalised vectors in store order), encode every row, write when base is given,
+    stamp being the store.py stamp of the store X came from
+    """
+    books = train_pq(X, m, ksub, iters, seed)
+    pq = {"version": PQ_VERSION, "m": m, "ksub": ksub, "dim": books.shape[0] * books.shape[2], "n": len(X),
+          "iters": iters, "seed": seed, "store": stamp, "codebooks": books, "codes": encode(X, books)}
+    if base is not None:
+        save_pq(pq, base)
+    return pq
+
+
+def build_pq_from_parquet(parquet_path=VECTORS_PARQUET, m=PQ_M, ksub=PQ_KSUB, iters=PQ_ITERS, seed=0, base=VECTORS_BASE) -> dict:
+    """
+    Two streamed passes over motw_vectors.parquet: sample up to PQ_TRAIN_MAX rows to train the codebooks,
+    then encode batch by batch straight into the memory mapped codes file. Returns the loaded PQ.
+    """
+    info, stamp = parquet_info(parquet_path), source_stamp(parquet_path)
+    rng = np.random.default_rng(seed)
+    keep_p = min(1.0, PQ_TRAIN_MAX / max(info["n"], 1))
+    sample = [x[rng.random(len(x)) < keep_p] for *_, x in iter_parquet_vectors(parquet_path)]
+    books = train_pq(np.concatenate(sample) if sample else np.zeros((0, info["dim"]), np.float32), m, ksub, iters, seed)
+
+    files = _files(base)
+    Path(base).parent.mkdir(parents=True, exist_ok=True)
+    tmp = files["codes"].with_name(f"{files['codes'].name}.{os.getpid()}.tmp")
+    try:
+        codes = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint8, shape=(info["n"], m))
+        pos = 0
+        for *_, x in iter_parquet_vectors(parquet_path):
+            codes[pos:pos + len(x)] = encode(x, books)
+            pos += len(x)
+        codes.flush()
+        del codes
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    pq = {"version": PQ_VERSION, "m": m, "ksub": ksub, "dim": info["dim"], "n": info["n"],
+          "iters": iters, "seed": seed, "store": stamp, "codebooks": books}
+    save_pq(pq, base, codes_tmp=tmp)
+    return load_pq(base)
+
+
+def _files(base):
+    base = Path(base)
+    return {name: base.with_name(f"{base.name}.pq.{name}.npy") for name in ("codebooks", "codes")}
+
+
+def save_pq(pq, base=VECTORS_BASE, codes_tmp=None):
+    """codes_tmp, an already written codes .npy to move into place instead of pq["codes"]"""
+    files = _files(base)
+    for name, path in files.items():
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        if not (name == "codes" and codes_tmp):
+            with open(tmp, "wb") as f:
+                np.save(f, pq[name])
+        os.replace(codes_tmp if name == "codes" and codes_tmp else tmp, path)
+    head = {k: pq[k] for k in ("version", "m", "ksub", "dim", "n", "iters", "seed", "store")}
+    head["files"] = {k: p.name for k, p in files.items()}
+    Path(base).with_name(f"{Path(base).name}.pq.json").write_text(json.dumps(head, indent=2), encoding="utf-8")
+
+
+def load_pq(base=VECTORS_BASE, mmap=True) -> dict:
+    base = Path(base)
+    head = base.with_name(f"{base.name}.pq.json")
+    if not head.exists():
+        raise FileNotFoundError(f"{head} not found, run vector_search.py pq-build first")
+    pq = json.loads(head.read_text(encoding="utf-8"))
+    if pq.get("version") != PQ_VERSION:
+        raise ValueError(f"{head.name} is PQ version {pq.get('version')}, re-run vector_search.py pq-build")
+    check_stamp(head, pq.get("store"), base, "vector_search.py pq-build")
+    pq["codebooks"] = np.load(base.with_name(pq["files"]["codebooks"]))
+    pq["codes"] = np.load(base.with_name(pq["files"]["codes"]), mmap_mode="r" if mmap else None)
+    return pq
+
+
+def pq_bytes(pq) -> int:
+    """Stored size, codes plus codebooks"""
+    return pq["n"] * pq["m"] + pq["codebooks"].nbytes
@@ -0,0 +1,137 @@
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from .store import normalise, quantise_int8
+from .ivf import KMEANS_ITERS, build_ivf
+
+# Browser ready export of the int8 store, so semantic search can run client side without the parquet:
+# the IVF lists (vectors/ivf.py) become one binary shard each, a client fetches manifest.json and the
+# centroid table once, then per query only the nprobe shards whose centroids score best.
+#   manifest.json    {version, dim, n, nlist, metric, docs: {ids, names}, centroids: {file, bytes},
+#                     shards: [{file, count, bytes}], bytes: {...}}
+#   centroids.bin    float32 scale[nlist] | int8 codes[nlist * dim]
+#   shard_<j>.bin    float32 scale[c] | uint32 doc[c] | uint32 chunk_id[c] | int8 codes[c * dim]
+# All little endian, every block starts on a 4 byte boundary so it maps straight onto a typed array:
+#   new Float32Array(buf, 0, c), new Uint32Array(buf, 4 * c, c), new Int8Array(buf, 12 * c, c * dim)
+# doc is an index into docs.ids, cosine(q, row) = q_scale * scale * (q_int8 . codes), as in store.py.
+# The list count is sized so an average shard is about VECTOR_SHARD_TARGET_KB, not by the 4 sqrt(n) rule
+# search uses, what matters here is the bytes per request.
+SHARDS_DIR = Path("docs/data/vector_shards")
+SHARD_TARGET_KB = int(os.getenv("VECTOR_SHARD_TARGET_KB", "64"))
+SHARDS_VERSION = 1
+
+
+def row_bytes(dim) -> int:
+    return dim + 12
+
+
+def shard_count(n, dim, target_kb=SHARD_TARGET_KB) -> int:
+    return max(1, min(n, math.ceil(n * row_bytes(dim) / (target_kb * 1024))))
+
+
+def _write_bin(path, *arrays):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        for a in arrays:
+            f.write(np.ascontiguousarray(a).tobytes())
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def export_shards(store, out_dir=SHARDS_DIR, nlist=None, iters=KMEANS_ITERS, seed=0, target_kb=SHARD_TARGET_KB) -> dict:
+    """Cluster the store into nlist lists and write the files above into out_dir (swapped in whole), returns the manifest"""
+    n, dim = store["n"], store["dim"]
+    if dim % 4:
+        raise ValueError(f"{dim} dims would misalign the int8 block, shards need dim % 4 == 0")
+    nlist = nlist or shard_count(n, dim, target_kb)
+    ivf = build_ivf(store, nlist, iters, seed)
+    nlist = ivf["nlist"]
+    rows = np.asarray(store["rows"])[ivf["rows"]]  # [doc index, chunk_id] in list order
+
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(f"{out_dir.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    try:
+        c8, cs = quantise_int8(ivf["centroids"])
+        centroid_bytes = _write_bin(tmp_dir / "centroids.bin", cs.astype("<f4"), c8)
+        shards, offsets = [], ivf["offsets"]
+        for j in range(nlist):
+            lo, hi = int(offsets[j]), int(offsets[j + 1])
+            name = f"shard_{j}.bin"
+            size = _write_bin(tmp_dir / name, ivf["scale"][lo:hi].astype("<f4"), rows[lo:hi, 0].astype("<u4"),
+                              rows[lo:hi, 1].astype("<u4"), ivf["int8"][lo:hi])
+            shards.append({"file": name, "count": hi - lo, "bytes": size})
+
+        sizes = np.array([s["bytes"] for s in shards])
+        manifest = {
+            "version": SHARDS_VERSION,
+            "dim": dim,
+            "n": n,
+            "nlist": nlist,
+            "metric": "cosine, int8 codes x scale",
+            "docs": {"ids": list(store["doc_ids"]), "names": list(store["doc_names"])},
+            "centroids": {"file": "centroids.bin", "bytes": centroid_bytes},
+            "shards": shards,
+        }
+        head = len(json.dumps(manifest, separators=(",", ":")))
+        manifest["bytes"] = {
+            "manifest": head,
+            "centroids": centroid_bytes,
+            "shards_total": int(sizes.sum()),
+            "shard_min": int(sizes.min()),
+            "shard_mean": round(float(sizes.mean())),
+            "shard_max": int(sizes.max()),
+            "total": head + centroid_bytes + int(sizes.sum()),
+        }
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+class ShardReader:
+    """
+    Reference client in Python, reads the export the way the browser would (manifest and centroids up front,
+    shards on demand), counts the bytes each query fetches, used to check the format and report sizes.
+    """
+
+    def __init__(self, out_dir=SHARDS_DIR):
+        self.dir = Path(out_dir)
+        self.manifest = json.loads((self.dir / "manifest.json").read_text(encoding="utf-8"))
+        self.dim, self.nlist = self.manifest["dim"], self.manifest["nlist"]
+        raw = (self.dir / self.manifest["centroids"]["file"]).read_bytes()
+        scale = np.frombuffer(raw, "<f4", self.nlist)
+        codes = np.frombuffer(raw, np.int8, self.nlist * self.dim, 4 * self.nlist).reshape(self.nlist, self.dim)
+        self.centroids = codes.astype(np.float32) * scale[:, None]
+        self.startup_bytes = self.manifest["bytes"]["manifest"] + len(raw)
+
+    def shard(self, j) -> tuple:
+        """(scale, doc, chunk_id, codes, bytes) of shard j"""
+        raw = (self.dir / self.manifest["shards"][j]["file"]).read_bytes()
+        c = self.manifest["shards"][j]["count"]
+        return (np.frombuffer(raw, "<f4", c), np.frombuffer(raw, "<u4", c, 4 * c), np.frombuffer(raw, "<u4", c, 8 * c),
+                np.frombuffer(raw, np.int8, c * self.dim, 12 * c).reshape(c, self.dim), len(raw))
+
+    def search(self, query, k=10, nprobe=2) -> tuple:
+        """([(doc_id, chunk_id, score)] best first, bytes fetched) for one query vector"""
+        q = normalise(query)
+        q8, qs = quantise_int8(q)
+        probe = np.argsort(-(self.centroids @ q[0]), kind="stable")[:max(1, min(nprobe, self.nlist))]
+        hits, fetched = [], 0
+        for j in probe:
+            scale, doc, chunk, codes, size = self.shard(int(j))
+            fetched += size
+            scores = (codes.astype(np.float32) @ q8[0].astype(np.float32)) * (qs[0] * scale)
+            hits.extend(zip(doc.tolist(), chunk.tolist(), scores.tolist()))
+        hits.sort(key=lambda h: -h[2])
+        ids = self.manifest["docs"]["ids"]
+        return [(ids[d], c, s) for d, c, s in hits[:k]], fetched
@@ -0,0 +1,248 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Local semantic search over the chunk embeddings in motw_vectors.parquet, no FAISS or model needed.
+# The parquet stores uint8_sym vectors (q = round((x + 1) * 127.5), see docs/dev-data_source_optimisation.md),
+# convert_vectors() turns them into contiguous arrays that np.load can memory map:
+#   <base>.int8.npy     int8[n, dim]     row i = round(x''_i / scale_i), x'' the dequantised, re-normalised vector
+#   <base>.scale.npy    float32[n]       per row scale, x''_i ~= int8_i * scale_i
+#   <base>.rows.npy     int32[n, 2]      row -> (index into manifest doc_ids, chunk_id)
+#   <base>.f32.npy      float32[n, dim]  x'' itself, only with float32=True (exact baseline for benchmarks)
+#   <base>.json         manifest {version, dim, n, storage, source, source_bytes, source_mtime, doc_ids, doc_names, files}
+# Cosine of query q and row i is then scale_q * scale_i * (int8_q . int8_i). The integer dot product is at most
+# dim * 127 * 127 (~6.2M for 384 dims), under 2**24, so running it through a float32 matmul (BLAS) is exact.
+# Indexes derived from the store (ivf.py, pq.py) record its stamp, n and the parquet's size and mtime, and
+# refuse to load once convert has run on a different parquet, their row ids would point into the old store.
+VECTORS_PARQUET = Path("docs/data/csc_artifacts/motw_vectors.parquet")
+VECTORS_BASE = Path(__file__).resolve().parents[1] / ".cache" / "vectors" / "motw_vectors"
+STORE_VERSION = 1
+STAMP_KEYS = ("n", "source_bytes", "source_mtime")
+SEARCH_BLOCK = int(os.getenv("VECTOR_SEARCH_BLOCK", "65536"))  # rows scored per matmul, bounds the score buffer
+
+
+def dequantise_uint8(q) -> np.ndarray:
+    """uint8_sym codes to re-normalised float32 vectors, x = q / 127.5 - 1, then L2 normalise"""
+    x = np.asarray(q, dtype=np.float32) / np.float32(127.5) - np.float32(1.0)
+    return normalise(x)
+
+
+def normalise(x) -> np.ndarray:
+    x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms > 0, norms, 1.0)
+
+
+def quantise_int8(x) -> tuple:
+    """(int8 codes, float32 per row scales) for float vectors, symmetric, scale = max |x| / 127"""
+    x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+    scale = np.abs(x).max(axis=1) / np.float32(127.0)
+    scale = np.where(scale > 0, scale, np.float32(1.0)).astype(np.float32)
+    return np.clip(np.rint(x / scale[:, None]), -127, 127).astype(np.int8), scale
+
+
+def _files(base):
+    base = Path(base)
+    return {name: base.with_name(f"{base.name}.{name}.npy") for name in ("int8", "scale", "rows", "f32")}
+
+
+def parquet_info(parquet_path=VECTORS_PARQUET) -> dict:
+    """{n, dim, storage, column} from the parquet footer and first row"""
+    import pyarrow.parquet as pq  # lazy, only conversion reads parquet
+
+    pf = pq.ParquetFile(parquet_path)
+    meta = {k.decode(): v.decode() for k, v in (pf.schema_arrow.metadata or {}).items()}
+    column = "embedding_q" if "embedding_q" in pf.schema_arrow.names else "embedding"
+    first = next(pf.iter_batches(columns=[column], batch_size=1), None)
+    return {
+        "n": pf.metadata.num_rows,
+        "dim": len(first.column(0)[0]) if first is not None and first.num_rows else 0,
+        "storage": meta.get("motw.embedding.storage", "uint8_sym" if column == "embedding_q" else "float32"),
+        "column": column,
+    }
+
+
+def iter_parquet_vectors(parquet_path=VECTORS_PARQUET, batch_size=4096):
+    """
+    Yields (doc_ids, chunk_ids, source_names, x) one record batch at a time, x the dequantised,
+    re-normalised float32 vectors, so the parquet is never held whole in memory.
+    """
+    import pyarrow.parquet as pq
+
+    info = parquet_info(parquet_path)
+    column, dim = info["column"], info["dim"]
+    pf = pq.ParquetFile(parquet_path)
+    for batch in pf.iter_batches(columns=["doc_id", "chunk_id", "source_name", column], batch_size=batch_size):
+        emb = batch.column(column)
+        if len(emb) and (np.diff(emb.offsets.to_numpy()) != dim).any():
+            raise ValueError(f"{Path(parquet_path).name}: embeddings are not all {dim} long")
+        flat = emb.values.to_numpy(zero_copy_only=False).reshape(-1, dim)
+        x = dequantise_uint8(flat) if column == "embedding_q" else normalise(flat)
+        yield (batch.column("doc_id").to_pylist(), batch.column("chunk_id").to_numpy(zero_copy_only=False),
+               batch.column("source_name").to_pylist(), x)
+
+
+def convert_vectors(parquet_path=VECTORS_PARQUET, base=VECTORS_BASE, float32=False, batch_size=4096) -> dict:
+    """Stream motw_vectors.parquet into the memory mappable arrays above, returns the manifest"""
+    parquet_path, base = Path(parquet_path), Path(base)
+    info = parquet_info(parquet_path)
+    n, dim = info["n"], info["dim"]
+
+    base.parent.mkdir(parents=True, exist_ok=True)
+    files = _files(base)
+    tmp = {k: p.with_name(f"{p.name}.{os.getpid()}.tmp") for k, p in files.items()}
+    wanted = ["int8", "scale", "rows"] + (["f32"] if float32 else [])
+    shapes = {"int8": ((n, dim), np.int8), "scale": ((n,), np.float32), "rows": ((n, 2), np.int32), "f32": ((n, dim), np.float32)}
+    try:
+        out = {k: np.lib.format.open_memmap(tmp[k], mode="w+", dtype=shapes[k][1], shape=shapes[k][0]) for k in wanted}
+        doc_index, doc_names, pos = {}, [], 0
+        for doc_ids, chunk_ids, names, x in iter_parquet_vectors(parquet_path, batch_size):
+            m = len(x)
+            out["int8"][pos:pos + m], out["scale"][pos:pos + m] = quantise_int8(x)
+            if float32:
+                out["f32"][pos:pos + m] = x
+            docs = []
+            for d, name in zip(doc_ids, names):
+                if d not in doc_index:
+                    doc_index[d] = len(doc_index)
+                    doc_names.append(name or "")
+                docs.append(doc_index[d])
+            out["rows"][pos:pos + m, 0] = docs
+            out["rows"][pos:pos + m, 1] = chunk_ids
+            pos += m
+        for arr in out.values():
+            arr.flush()
+        del out
+        for k in wanted:
+            os.replace(tmp[k], files[k])
+    except BaseException:
+        for p in tmp.values():
+            p.unlink(missing_ok=True)
+        raise
+    if not float32:
+        files["f32"].unlink(missing_ok=True)  # a stale baseline from an older parquet must not survive
+
+    stat = parquet_path.stat()
+    manifest = {
+        "version": STORE_VERSION,
+        "dim": dim,
+        "n": n,
+        "storage": info["storage"],
+        "source": parquet_path.as_posix(),
+        "source_bytes": stat.st_size,
+        "source_mtime": int(stat.st_mtime),
+        "doc_ids": list(doc_index),
+        "doc_names": doc_names,
+        "files": {k: files[k].name for k in wanted},
+    }
+    base.with_suffix(".json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def store_stamp(store) -> dict:
+    return {k: store.get(k) for k in STAMP_KEYS}
+
+
+def source_stamp(parquet_path=VECTORS_PARQUET) -> dict:
+    """The stamp convert_vectors() would give a store of this parquet"""
+    stat = Path(parquet_path).stat()
+    return {"n": parquet_info(parquet_path)["n"], "source_bytes": stat.st_size, "source_mtime": int(stat.st_mtime)}
+
+
+def check_stamp(head, stamp, base=VECTORS_BASE, rebuild="vector_search.py"):
+    """Raises when the index described by head was built from another store than the one now at base"""
+    manifest = Path(base).with_suffix(".json")
+    if not manifest.exists():
+        return  # no store to disagree with, loading it fails on its own
+    current = store_stamp(json.loads(manifest.read_text(encoding="utf-8")))
+    if stamp != current:
+        raise ValueError(f"{Path(head).name} was built from another vector store ({stamp}, the store is now "
+                         f"{current}), re-run {rebuild}")
+
+
+def load_vectors(base=VECTORS_BASE, mmap=True) -> dict:
+    """Manifest dict with the arrays attached (memory mapped by default), raises if convert has not run"""
+    base = Path(base)
+    head = base.with_suffix(".json")
+    if not head.exists():
+        raise FileNotFoundError(f"{head} not found, run vector_search.py convert first")
+    store = json.loads(head.read_text(encoding="utf-8"))
+    if store.get("version") != STORE_VERSION:
+        raise ValueError(f"{head.name} is store version {store.get('version')}, re-run vector_search.py convert")
+    for k, name in store["files"].items():
+        store[k] = np.load(base.with_name(name), mmap_mode="r" if mmap else None)
+    return store
+
+
+def chunk_ref(store, row) -> tuple:
+    """(doc_id, chunk_id, source_name) of a matrix row"""
+    d, c = store["rows"][row]
+    return store["doc_ids"][int(d)], int(c), store["doc_names"][int(d)]
+
+
+def _merge_top_k(best_s, best_i, scores, offset, k):
+    # running top k across blocks, per query row
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    s = np.take_along_axis(scores, part, axis=1)
+    if best_s is None:
+        return s, part + offset
+    s = np.concatenate([best_s, s], axis=1)
+    i = np.concatenate([best_i, part + offset], axis=1)
+    keep = np.argpartition(-s, min(k, s.shape[1]) - 1, axis=1)[:, :k]
+    return np.take_along_axis(s, keep, axis=1), np.take_along_axis(i, keep, axis=1)
+
+
+def _sorted_top_k(best_s, best_i):
+    # descending score, ties to the lower row, so results are deterministic
+    order = np.lexsort((best_i, -best_s), axis=1)
+    return np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_s, order, axis=1)
+
+
+def search_int8(store, queries, k=10, block=SEARCH_BLOCK) -> tuple:
+    """
+    Brute force cosine top k over the int8 matrix, queries float[q, dim] (normalised here).
+    Rows are scored block rows at a time, int8 codes widened to float32 for one matmul per block,
+    then rescaled by both scales. Returns (rows int64[q, k], scores float32[q, k]), best first.
+    """
+    q8, qs = quantise_int8(normalise(queries))
+    qf = q8.astype(np.float32).T
+    X, S, n = store["int8"], store["scale"], store["n"]
+    k = min(k, n)
+    best_s = best_i = None
+    for lo in range(0, n, block):
+        hi = min(lo + block, n)
+        scores = (np.asarray(X[lo:hi], dtype=np.float32) @ qf).T  # exact integer dot products
+        scores *= qs[:, None] * np.asarray(S[lo:hi])[None, :]
+        best_s, best_i = _merge_top_k(best_s, best_i, scores, lo, k)
+    if best_s is None:
+        return np.zeros((len(qs), 0), np.int64), np.zeros((len(qs), 0), np.float32)
+    return _sorted_top_k(best_s, best_i.astype(np.int64))
+
+
+def search_float32(store, queries, k=10, block=SEARCH_BLOCK) -> tuple:
+    """Same as search_int8 over the float32 baseline (convert with float32=True), for recall checks"""
+    if "f32" not in store:
+        raise ValueError("No float32 baseline in this store, re-run vector_search.py convert --float32")
+    qf = normalise(queries).T
+    X, n = store["f32"], store["n"]
+    k = min(k, n)
+    best_s = best_i = None
+    for lo in range(0, n, block):
+        hi = min(lo + block, n)
+        scores = (np.asarray(X[lo:hi]) @ qf).T
+        best_s, best_i = _merge_top_k(best_s, best_i, scores, lo, k)
+    if best_s is None:
+        return np.zeros((len(queries), 0), np.int64), np.zeros((len(queries), 0), np.float32)
+    return _sorted_top_k(best_s, best_i.astype(np.int64))
+
+
+def recall_at_k(found, truth) -> float:
+    """Mean share of each query's true top k rows that found also returns"""
+    if not len(truth):
+        return 0.0
+    return float(np.mean([len(set(f.tolist()) & set(t.tolist())) / max(len(t), 1) for f, t in zip(found, truth)]))
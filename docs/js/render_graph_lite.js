@@ -226,7 +226,7 @@ docs/js/render_graph_lite.js
       });
       const edgeEls = edges
         .filter(([s,t]) => visibleIds.has(s) && visibleIds.has(t))
-        .map(([s,t,rel]) => ({ group: 'edges', data: { source: s, target: t, rel: rel || '' } }));
+        .map(([s,t,rel,w]) => ({ group: 'edges', data: { source: s, target: t, rel: rel || '', weight: w || 1 } }));  // merged edges carry weight at [3]
 
       // Bring up Cytoscape
       const cy = window.cy || cytoscape({